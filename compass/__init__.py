@@ -27,6 +27,7 @@ def create_app(config_name=None):
     
     from .config import config
     app.config.from_object(config[config_name])
+    app.config['CONFIG_NAME'] = config_name
     config[config_name].init_app(app)
 
     # Initialize extensions
@@ -53,6 +54,20 @@ def create_app(config_name=None):
     from .tracking import tracking as tracking_blueprint
     app.register_blueprint(tracking_blueprint)
 
+    # Pre-parse the DOCX templates so the first document download doesn't pay for it
+    if app.config.get('TEMPLATE_CACHE_WARMUP'):
+        from .utils.template_cache import warm_template_cache
+        loaded = warm_template_cache()
+        app.logger.info(f"Template cache warmed with {loaded} document templates")
+
+    # LibreOffice converter pool settings (workers are started on first conversion)
+    from .services.pdf_converter import configure_converter_pool
+    configure_converter_pool(
+        workers=app.config.get('PDF_CONVERTER_WORKERS'),
+        binary=app.config.get('LIBREOFFICE_BINARY'),
+        timeout=app.config.get('PDF_CONVERSION_TIMEOUT')
+    )
+
     # User loader callback
     @login_manager.user_loader
     def load_user(user_id):
@@ -29,6 +29,37 @@ class Config:
     # File upload configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Serial number counter configuration
+    COUNTER_BLOCK_SIZE = int(os.environ.get('COUNTER_BLOCK_SIZE') or 1)  # Serial numbers each app worker reserves at once (1 = strictly sequential); above 1 the form preview shows this worker's next reserved serial
+    COUNTER_PREVIEW_TTL = float(os.environ.get('COUNTER_PREVIEW_TTL') or 5)  # Seconds a previewed next serial number is reused
+    
+    # Document generation configuration
+    TEMPLATE_CACHE_WARMUP = os.environ.get('TEMPLATE_CACHE_WARMUP', 'true').lower() in ['true', 'on', '1']  # Parse DOCX templates at startup
+    PDF_CONVERTER_WORKERS = int(os.environ.get('PDF_CONVERTER_WORKERS') or 2)  # Warm LibreOffice processes per app worker
+    PDF_CONVERSION_TIMEOUT = int(os.environ.get('PDF_CONVERSION_TIMEOUT') or 60)  # Seconds per DOCX to PDF conversion
+    LIBREOFFICE_BINARY = os.environ.get('LIBREOFFICE_BINARY')  # Defaults to soffice/libreoffice on PATH
+    DOCUMENT_PDF_BACKEND = os.environ.get('DOCUMENT_PDF_BACKEND', 'libreoffice').lower()  # 'reportlab' draws invoice & packing list PDFs natively
+    DOCUMENT_TIMING_SLOW_MS = float(os.environ.get('DOCUMENT_TIMING_SLOW_MS', 5000))  # Stage timings of slower builds are logged as warnings
+    SIGNING_AUTHORITY_CACHE_TTL = int(os.environ.get('SIGNING_AUTHORITY_CACHE_TTL') or 60)  # Seconds other app workers may show an edited signing authority
+    DOCUMENT_CACHE_ENABLED = os.environ.get('DOCUMENT_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']  # Reuse unchanged generated documents
+    DOCUMENT_CACHE_DIR = os.environ.get('DOCUMENT_CACHE_DIR')  # Defaults to instance/document_cache
+    DOCUMENT_CACHE_MAX_MB = int(os.environ.get('DOCUMENT_CACHE_MAX_MB') or 500)  # LRU eviction above this size
+    DOCUMENT_THUMBNAIL_WIDTH = int(os.environ.get('DOCUMENT_THUMBNAIL_WIDTH') or 320)  # Pixels, first-page previews (PyMuPDF or pdftoppm)
+    
+    # Background job configuration
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)  # Concurrent background jobs per app process
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)  # Tries before a job is marked failed
+    JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY') or 5)  # Seconds, multiplied by the attempt number
+    JOB_RESULT_TTL_HOURS = int(os.environ.get('JOB_RESULT_TTL_HOURS') or 24)  # Finished jobs and files are removed after this
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR')  # Defaults to instance/job_results
+    BULK_EXPORT_WORKERS = int(os.environ.get('BULK_EXPORT_WORKERS') or min(4, os.cpu_count() or 1))  # Processes for ZIP exports, each with one LibreOffice process of its own
+    QR_RENDER_WORKERS = int(os.environ.get('QR_RENDER_WORKERS') or min(4, os.cpu_count() or 1))  # Processes rendering package QR images in bulk
+    QR_REGENERATION_BATCH_SIZE = int(os.environ.get('QR_REGENERATION_BATCH_SIZE') or 200)  # Packages per commit in bulk QR regeneration jobs
+    QR_CACHE_MEMORY_ITEMS = int(os.environ.get('QR_CACHE_MEMORY_ITEMS') or 512)  # Rendered QR images kept in memory per app worker
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')  # Defaults to instance/qr_cache
+    QR_CACHE_MAX_MB = int(os.environ.get('QR_CACHE_MAX_MB') or 100)  # LRU eviction above this size (0 = memory only)
+    QR_CACHE_MAX_AGE = int(os.environ.get('QR_CACHE_MAX_AGE') or 31536000)  # Seconds browsers may cache a QR image
+    
     @staticmethod
     def init_app(app):
         pass
@@ -3,7 +3,6 @@ from flask_login import login_required, current_user
 from datetime import datetime
 import os
 from docx import Document
-from docxtpl import DocxTemplate
 from docx.shared import Cm, Pt
 from docx.enum.table import WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
@@ -11,13 +10,30 @@ from docx.table import _Cell
 from docx.oxml import OxmlElement, parse_xml
 from docx.oxml.ns import qn
 import io
+import csv
 import json
+import shutil
+import tempfile
+from collections import Counter
+from sqlalchemy.orm import joinedload
 from num2words import num2words
-from .models import User, Role, Shipment, CombinedShipmentCounter, SigningAuthority, PackageQRCode, SMTPConfiguration, db
+from .models import User, Role, Shipment, CombinedShipmentCounter, SigningAuthority, PackageQRCode, SMTPConfiguration, BackgroundJob, db
 from werkzeug.security import generate_password_hash, check_password_hash
-from .utils.helpers import generate_file_reference_number
-from .utils.pdf_utils import generate_pdf_with_extras, convert_docx_to_pdf
-from .services.qr_service import QRCodeService
+from .utils.helpers import generate_file_reference_number, build_invoice_number, get_unique_ids
+from .utils.pdf_utils import generate_pdf_with_extras, convert_docx_to_pdf, create_error_pdf_with_extras, get_extra_documents, merge_pdfs
+from .utils.template_cache import get_document_template, resolve_template_path
+from .utils.pdf_renderer import render_invoice_packing_pdf, supports_native_pdf
+from .utils.pdf_thumbnail import render_pdf_thumbnail, THUMBNAIL_FORMATS
+from .utils.qr_label_sheet import write_label_sheet, LABEL_PAGE_SIZES, REPORTLAB_AVAILABLE
+from .utils.shipment_parser import parse_shipment
+from .utils.docx_tables import RowTemplate, set_cant_split
+from .utils.timing import stage_timer, timed_stage
+from .utils.document_data import resolve_package_users, get_invoice_rows, get_packing_list_rows, get_shipper_rows, get_invoice_declarations, PL_DECLARATION
+from .services.document_cache import get_document_cache, document_cache_key, file_digest
+from .services.document_context import get_document_context, invalidate_signing_authority_cache
+from .services.job_queue import get_job_queue, job_handler
+from .services.qr_service import QRCodeService, QR_IMAGE_FORMATS
+from .services.qr_image_cache import package_qr_image_response
 
 main = Blueprint('main', __name__)
 
@@ -26,23 +42,10 @@ def prevent_table_page_break(table):
     Prevent table from being split across pages by setting table properties
     """
     try:
-        # Get table properties
-        tblPr = table._element.xpath("./w:tblPr")[0]
-        
-        # Add table positioning properties to keep table together
-        tblpPr = OxmlElement('w:tblpPr')
-        
-        # Set table to keep together on one page
-        cantSplit = OxmlElement('w:cantSplit')
-        cantSplit.set(qn('w:val'), '1')
-        tblPr.append(cantSplit)
-        
-        # Set all rows to not break across pages
+        # Set all rows to not break across pages (data rows added later get
+        # the flag from their row template)
         for row in table.rows:
-            trPr = row._element.get_or_add_trPr()
-            cantSplit = OxmlElement('w:cantSplit')
-            cantSplit.set(qn('w:val'), '1')
-            trPr.append(cantSplit)
+            set_cant_split(row._tr)
             
     except Exception as e:
         print(f"Warning: Could not set page break prevention: {e}")
@@ -66,29 +69,6 @@ def add_page_break_before_element(doc, target_element):
     except Exception as e:
         print(f"Warning: Could not add page break: {e}")
 
-def get_package_type_display_name(package_type, form_data=None, package_num=None):
-    """Convert package type code to display name, handling 'other' type with custom input"""
-    package_type_mapping = {
-        'cardboard_box': 'Cardboard Box',
-        'plastic_crate': 'Plastic Crate',
-        'metal_trunk': 'Metal Trunk',
-        'zarges': 'Zarges',
-        'pelican_case': 'Pelican Case',
-        'other': 'Other',
-        # Legacy support for old values
-        'box': 'Cardboard Box',
-        'carton': 'Plastic Crate',
-        'crate': 'Metal Trunk'
-    }
-    
-    # If package type is 'other' and we have form_data and package_num, get the custom type
-    if package_type == 'other' and form_data and package_num:
-        other_type = form_data.get(f'package_{package_num}_other_type', '')
-        if other_type:
-            return other_type
-    
-    return package_type_mapping.get(package_type, package_type.title())
-
 def admin_required(f):
     """Decorator to require admin access"""
     def decorated_function(*args, **kwargs):
@@ -402,7 +382,7 @@ def handle_pl_table_placement(doc, form_data):
         print(f"Error in handle_pl_table_placement: {str(e)}")
         raise
 
-def populate_table_data(table, form_data):
+def populate_table_data(table, shipment_data, users=None):
     """
     Populates the table with form data while maintaining precise formatting.
     """
@@ -420,154 +400,23 @@ def populate_table_data(table, form_data):
         # Calculate the total width of columns 3-5 for the nested table
         nested_table_width = sum(columns_width[i] for i in range(3, 6))
 
-        total_amount = 0
-        total_packages = int(form_data.get('total_packages', 0))
-
-        # Process each package (one row per package, combining all items)
-        for package_num in range(1, total_packages + 1):
-            items_count = int(form_data.get(f'package_{package_num}_items_count', 0))
-            
-            if items_count == 0:
-                continue
-                
-            # Combine all items in this package
-            item_descriptions = []
-            total_package_quantity = 0
-            total_package_value = 0
-            
-            for item_num in range(1, items_count + 1):
-                prefix = f'package_{package_num}_item_{item_num}'
-                
-                # Get item details
-                description = form_data.get(f'{prefix}_description', '')
-                hsn_code = form_data.get(f'{prefix}_hsn_code', '')
-                quantity = int(form_data.get(f'{prefix}_quantity', 0))
-                unit_value = float(form_data.get(f'{prefix}_unit_value', 0))
-                
-                # Build item description
-                if description:
-                    item_desc = f"{description}"
-                    if hsn_code:
-                        item_desc += f" (HSN: {hsn_code})"
-                    if quantity > 1:
-                        item_desc += f" - {quantity} nos"
-                    item_descriptions.append(item_desc)
-                
-                # Sum up totals for this package
-                total_package_quantity += quantity
-                total_package_value += (quantity * unit_value)
-            
-            # Skip if no valid items
-            if not item_descriptions:
-                continue
-                
-            # Add new row for this package
-            row = table.add_row()
-            row_cells = row.cells
-            
-            # Apply column widths to the new row
-            for idx, width in columns_width.items():
-                cell = row_cells[idx]
-                cell.width = Cm(width)
-            
-            # Serial number
-            row_cells[0].text = f"{package_num}."
-            row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Box details - Include requester name for combined shipments
-            package_type = form_data.get(f'package_{package_num}_type', '')
-            package_type_display = get_package_type_display_name(package_type, form_data, package_num)
-            
-            # Get package owner information
-            box_text = f"Box-{package_num} ({package_type_display})"
-            
-            # Check if this is a combined shipment with package ownership info
-            package_belongs_to_id = form_data.get(f'package_{package_num}_belongs_to')
-            attn_field_name = f'package_{package_num}_attn'
-            
-            # Collect ownership info to add compactly
-            ownership_info = []
-            
-            if package_belongs_to_id:
-                # Combined shipment - get user by ID for package ownership
-                try:
-                    from .models import User
-                    owner_user = User.query.get(int(package_belongs_to_id))
-                    if owner_user:
-                        owner_name = f"{owner_user.first_name} {owner_user.last_name}"
-                        owner_unique_id = owner_user.unique_id
-                        ownership_info.append(f"Owner: {owner_name} ({owner_unique_id})")
-                except (ValueError, TypeError):
-                    pass
-                    
-            # Check if there's attention field (requester) for items
-            if attn_field_name in form_data and form_data[attn_field_name]:
-                # Get requester unique ID if available
-                requester_name = form_data[attn_field_name]
-                try:
-                    from .models import User
-                    # Try to find user by full name to get their unique ID
-                    name_parts = requester_name.split()
-                    if len(name_parts) >= 2:
-                        first_name = name_parts[0]
-                        last_name = ' '.join(name_parts[1:])  # Handle multi-word last names
-                        requester_user = User.query.filter_by(first_name=first_name, last_name=last_name).first()
-                        if requester_user and requester_user.unique_id:
-                            ownership_info.append(f"Req: {requester_name} ({requester_user.unique_id})")
-                        else:
-                            ownership_info.append(f"Req: {requester_name}")
-                    else:
-                        ownership_info.append(f"Req: {requester_name}")
-                except Exception:
-                    ownership_info.append(f"Req: {requester_name}")
-            
-            # Format the final box text more compactly
-            if ownership_info:
-                # Put ownership info on new line but in a more compact format
-                box_text += f"\n{' | '.join(ownership_info)}"
-            
-            row_cells[1].text = box_text
-            row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Combined description of all items in package
-            combined_description = ", ".join(item_descriptions)
-            row_cells[2].text = combined_description
-            row_cells[2].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Total quantity for package
-            row_cells[3].text = f"{total_package_quantity} SET"
-            row_cells[3].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Average rate for package (total value / total quantity)
-            avg_rate = total_package_value / total_package_quantity if total_package_quantity > 0 else 0
-            row_cells[4].text = f"{avg_rate:.0f}"
-            row_cells[4].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            
-            # Total amount for package
-            row_cells[5].text = f"{total_package_value:.0f}"
-            row_cells[5].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            
-            total_amount += total_package_value
-
-        # Convert number to words and capitalize first letter of each word, and "And"
-        amount_words = num2words(int(total_amount), to='cardinal').split()
-        capitalized_words = []
-        for word in amount_words:
-            if word.lower() == 'and':
-                capitalized_words.append('And')
-            else:
-                capitalized_words.append(word.capitalize())
-        amount_in_words = " ".join(capitalized_words) + " Only"
+        rows, total_amount = get_invoice_rows(shipment_data, users)
+        
+        # Marks, box details (with owner/requester for combined shipments) and the
+        # combined item description on the left, quantity, rate and amount on the right
+        row_template = RowTemplate(
+            table,
+            [columns_width[idx] for idx in range(6)],
+            [WD_ALIGN_PARAGRAPH.LEFT] * 4 + [WD_ALIGN_PARAGRAPH.RIGHT] * 2
+        )
+        
+        # One row per package, combining all items
+        for row_data in rows:
+            row_template.add_row([row_data['marks'], row_data['packages'], row_data['description'],
+                                  row_data['quantity'], row_data['rate'], row_data['amount']])
 
         # Create the declarations text with proper formatting
-        declarations_text = (
-            f"Amount Chargeable (in words): USD {amount_in_words}\n\n"
-            "THE VALUE DECLARED ABOVE IS FOR CUSTOMS PURPOSE ONLY.\n\n"
-            "GOODS ARE FOR RESEARCH AND DEVELOPMENT.\n\n"
-            "Declaration:\n"
-            "We declare that the invoice shows the actual price of goods\n"
-            "Described and that all particulars are true and correct."
-        )
+        declarations_text = get_invoice_declarations(total_amount)
 
         # Add final row for declarations
         final_row = table.add_row()
@@ -733,7 +582,7 @@ def populate_table_data(table, form_data):
         print(f"Error in populate_table_data: {str(e)}")
         raise
 
-def populate_pl_table_data(table, form_data):
+def populate_pl_table_data(table, shipment_data, users=None):
     """
     Populates the packing list table with form data while maintaining precise formatting.
     """
@@ -748,133 +597,18 @@ def populate_pl_table_data(table, form_data):
             5: 2.0    # Weight
         }
 
-        total_packages = int(form_data.get('total_packages', 0))
+        # Marks, box details and item description on the left, quantity and
+        # dimensions centered, total weight on the right
+        row_template = RowTemplate(
+            table,
+            [columns_width[idx] for idx in range(6)],
+            [WD_ALIGN_PARAGRAPH.LEFT] * 3 + [WD_ALIGN_PARAGRAPH.CENTER] * 2 + [WD_ALIGN_PARAGRAPH.RIGHT]
+        )
         
-        # Process each package (one row per package, combining all items)
-        for package_num in range(1, total_packages + 1):
-            items_count = int(form_data.get(f'package_{package_num}_items_count', 0))
-            
-            if items_count == 0:
-                continue
-                
-            # Combine all items in this package
-            item_descriptions = []
-            total_package_quantity = 0
-            total_package_weight = 0
-            
-            for item_num in range(1, items_count + 1):
-                prefix = f'package_{package_num}_item_{item_num}'
-                
-                # Get item details
-                description = form_data.get(f'{prefix}_description', '')
-                hsn_code = form_data.get(f'{prefix}_hsn_code', '')
-                quantity = int(form_data.get(f'{prefix}_quantity', 0))
-                net_weight = float(form_data.get(f'{prefix}_net_weight', 0))
-                
-                # Build item description
-                if description:
-                    item_desc = f"{description}"
-                    if hsn_code:
-                        item_desc += f" (HSN: {hsn_code})"
-                    if quantity > 1:
-                        item_desc += f" - {quantity} nos"
-                    item_descriptions.append(item_desc)
-                
-                # Sum up totals for this package
-                total_package_quantity += quantity
-                total_package_weight += (net_weight * quantity)  # Total weight = unit weight * quantity
-            
-            # Skip if no valid items
-            if not item_descriptions:
-                continue
-                
-            # Add new row for this package
-            row = table.add_row()
-            row_cells = row.cells
-            
-            # Apply column widths to the new row
-            for idx, width in columns_width.items():
-                cell = row_cells[idx]
-                cell.width = Cm(width)
-            
-            # Serial number
-            row_cells[0].text = f"{package_num}."
-            row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Box details
-            package_type = form_data.get(f'package_{package_num}_type', '')
-            package_type_display = get_package_type_display_name(package_type, form_data, package_num)
-            
-            # Get package owner information for packing list
-            box_text = f"Box-{package_num} ({package_type_display})"
-            
-            # Check if this is a combined shipment with package ownership info
-            package_belongs_to_id = form_data.get(f'package_{package_num}_belongs_to')
-            attn_field_name = f'package_{package_num}_attn'
-            
-            # Collect ownership info to add compactly
-            ownership_info = []
-            
-            if package_belongs_to_id:
-                # Combined shipment - get user by ID for package ownership
-                try:
-                    from .models import User
-                    owner_user = User.query.get(int(package_belongs_to_id))
-                    if owner_user:
-                        owner_name = f"{owner_user.first_name} {owner_user.last_name}"
-                        owner_unique_id = owner_user.unique_id
-                        ownership_info.append(f"Owner: {owner_name} ({owner_unique_id})")
-                except (ValueError, TypeError):
-                    pass
-                    
-            # Check if there's attention field (requester) for items
-            if attn_field_name in form_data and form_data[attn_field_name]:
-                # Get requester unique ID if available
-                requester_name = form_data[attn_field_name]
-                try:
-                    from .models import User
-                    # Try to find user by full name to get their unique ID
-                    name_parts = requester_name.split()
-                    if len(name_parts) >= 2:
-                        first_name = name_parts[0]
-                        last_name = ' '.join(name_parts[1:])  # Handle multi-word last names
-                        requester_user = User.query.filter_by(first_name=first_name, last_name=last_name).first()
-                        if requester_user and requester_user.unique_id:
-                            ownership_info.append(f"Req: {requester_name} ({requester_user.unique_id})")
-                        else:
-                            ownership_info.append(f"Req: {requester_name}")
-                    else:
-                        ownership_info.append(f"Req: {requester_name}")
-                except Exception:
-                    ownership_info.append(f"Req: {requester_name}")
-            
-            # Format the final box text more compactly
-            if ownership_info:
-                # Put ownership info on new line but in a more compact format
-                box_text += f"\n{' | '.join(ownership_info)}"
-            
-            row_cells[1].text = box_text
-            row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Combined description of all items in package
-            combined_description = ", ".join(item_descriptions)
-            row_cells[2].text = combined_description
-            row_cells[2].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Total quantity for package
-            row_cells[3].text = f"{total_package_quantity}"
-            row_cells[3].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            # Dimensions
-            length = form_data.get(f'package_{package_num}_length', '')
-            width = form_data.get(f'package_{package_num}_width', '')
-            height = form_data.get(f'package_{package_num}_height', '')
-            row_cells[4].text = f"{length} x {width} x {height}"
-            row_cells[4].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            # Total weight for package
-            row_cells[5].text = f"{total_package_weight:.2f}"
-            row_cells[5].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        # One row per package, combining all items
+        for row_data in get_packing_list_rows(shipment_data, users):
+            row_template.add_row([row_data['marks'], row_data['packages'], row_data['description'],
+                                  row_data['quantity'], row_data['dimensions'], row_data['weight']])
 
         # Add final row for declaration and signature
         final_row = table.add_row()
@@ -894,12 +628,7 @@ def populate_pl_table_data(table, form_data):
         final_cells[3].merge(final_cells[5])
         
         # Add declaration text on the left
-        declaration_text = (
-            "THE ABOVE MENTIONED GOODS ARE FOR RESEARCH AND DEVELOPMENT.\n\n"
-            "Declaration:\n"
-            "We declare that all particulars given above are true and correct."
-        )
-        final_cells[0].text = declaration_text
+        final_cells[0].text = PL_DECLARATION
         final_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
         
         # Add signature text on the right
@@ -979,7 +708,7 @@ def handle_shipper_table_placement(doc, form_data):
         print(f"Error handling shipper table placement: {e}")
         return None
 
-def populate_shipper_table_data(table, form_data):
+def populate_shipper_table_data(table, shipment_data, users=None):
     """
     Populates the shipper table with package and item data.
     """
@@ -987,80 +716,16 @@ def populate_shipper_table_data(table, form_data):
         if not table:
             return
             
-        total_packages = int(form_data.get('total_packages', 0))
+        # "As Address", package and items description, "1 set"
+        row_template = RowTemplate(
+            table,
+            [4.0, 10.0, 3.0],
+            [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.CENTER]
+        )
         
-        # Process each package
-        for package_num in range(1, total_packages + 1):
-            items_count = int(form_data.get(f'package_{package_num}_items_count', 0))
-            
-            # Package details
-            package_type = form_data.get(f'package_{package_num}_type', 'box')
-            package_type_display = get_package_type_display_name(package_type, form_data, package_num)
-            
-            # Package dimensions
-            length = form_data.get(f'package_{package_num}_length', '')
-            width = form_data.get(f'package_{package_num}_width', '')
-            height = form_data.get(f'package_{package_num}_height', '')
-            dimensions = f"({length} x {width} x {height} cm)" if all([length, width, height]) else ""
-            
-            # Get package owner name (without label)
-            owner_name = ""
-            package_belongs_to_id = form_data.get(f'package_{package_num}_belongs_to')
-            if package_belongs_to_id:
-                try:
-                    from .models import User
-                    owner_user = User.query.get(int(package_belongs_to_id))
-                    if owner_user:
-                        owner_name = f" {owner_user.first_name} {owner_user.last_name}"
-                except (ValueError, TypeError):
-                    pass
-            
-            # Check for requester name (combined shipment)
-            requester_info = ""
-            attn_field_name = f'package_{package_num}_attn'
-            if attn_field_name in form_data and form_data[attn_field_name]:
-                requester_info = f" {form_data[attn_field_name]} – "
-            
-            # Create description content
-            description_parts = []
-            description_parts.append(f"Box No.- {package_num:02d} ({package_type_display}){requester_info}{dimensions}{owner_name}")
-            
-            # Add all items in this package
-            for item_num in range(1, items_count + 1):
-                prefix = f'package_{package_num}_item_{item_num}'
-                description = form_data.get(f'{prefix}_description', '')
-                hsn_code = form_data.get(f'{prefix}_hsn_code', '')
-                quantity = form_data.get(f'{prefix}_quantity', '0')
-                
-                if description:
-                    item_text = f"{description}"
-                    if hsn_code:
-                        item_text += f" (HSN: {hsn_code})"
-                    if quantity and quantity != '0':
-                        item_text += f" – {quantity} nos"
-                    description_parts.append(item_text)
-            
-            # Add row for this package
-            row = table.add_row()
-            row_cells = row.cells
-            
-            # Set column widths for the new row
-            col_widths = [Cm(4.0), Cm(10.0), Cm(3.0)]
-            for i, width in enumerate(col_widths):
-                row_cells[i].width = width
-            
-            # Column 1: "As Address"
-            row_cells[0].text = "As Address"
-            row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Column 2: Package and items description
-            description_text = ", ".join(description_parts)
-            row_cells[1].text = description_text
-            row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            
-            # Column 3: "1 set"
-            row_cells[2].text = "1 set"
-            row_cells[2].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+        # One row per package
+        for row_data in get_shipper_rows(shipment_data, users):
+            row_template.add_row([row_data['marks'], row_data['description'], row_data['quantity']])
         
         return table
         
@@ -1098,73 +763,39 @@ def submit_shipment():
         'coldchain_required': request.form.get('coldchain_required') == 'yes'
     }
 
+    # Parse packages and items once for the invoice number and the QR codes
+    shipment_data = parse_shipment(request.form.to_dict())
+    
     # Generate invoice number based on shipment type with user's unique ID and serial number
     year = data['expedition_year']
     month = data['expedition_month']
     
     # Generate next serial number
-    from compass.models import ShipmentSerialCounter, User
+    from compass.models import ShipmentSerialCounter
     serial_number = ShipmentSerialCounter.get_next_serial()
     
     # For admin users creating export shipments, check for combined export
+    admin_unique_id = current_user.unique_id if current_user.unique_id else 'ADMIN'
     if current_user.is_admin() and data['shipment_type'] == 'export':
-        # Get selected requester user ID
-        requester_user_id = request.form.get('requester_user_id')
-        
-        # Extract package user assignments from form data
-        package_user_assignments = {}
-        total_packages = int(request.form.get('total_packages', 0))
-        
-        for i in range(1, total_packages + 1):
-            user_id = request.form.get(f'package_{i}_belongs_to')
-            if user_id:
-                package_user_assignments[str(i)] = int(user_id)
+        # Unique package owner IDs in order of first package assignment
+        unique_user_ids = get_unique_ids(shipment_data.owner_ids)
         
-        # Extract unique user IDs in order of first package assignment
-        unique_user_ids = []
-        seen_users = set()
-        
-        for package_num in sorted(package_user_assignments.keys(), key=int):
-            user_id = package_user_assignments[package_num]
-            if user_id and user_id not in seen_users:
-                user = User.query.get(user_id)
-                if user and user.unique_id:
-                    unique_user_ids.append(user.unique_id)
-                    seen_users.add(user_id)
-        
-        # Generate combined or single export invoice
-        if len(unique_user_ids) > 1:
-            # Combined export
-            unique_ids_str = "/".join(unique_user_ids)
-            invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{data['return_type']}/CMB/{unique_ids_str}/{serial_number}"
-        elif len(unique_user_ids) == 1:
-            # Single user export from package assignments
-            invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{data['return_type']}/{unique_user_ids[0]}/{serial_number}"
-        else:
+        if not unique_user_ids:
             # Use selected requester's unique ID, fallback to current user
+            requester_user_id = request.form.get('requester_user_id')
             if requester_user_id:
-                selected_user = User.query.get(requester_user_id)
-                user_unique_id = selected_user.unique_id if selected_user and selected_user.unique_id else 'XXXXXX'
+                unique_user_ids = get_unique_ids([requester_user_id]) or ['XXXXXX']
             else:
-                user_unique_id = current_user.unique_id if hasattr(current_user, 'unique_id') and current_user.unique_id else 'XXXXXX'
-            invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{data['return_type']}/{user_unique_id}/{serial_number}"
+                unique_user_ids = [current_user.unique_id if current_user.unique_id else 'XXXXXX']
     else:
         # Regular invoice generation for non-admin or non-export types
         user_unique_id = current_user.unique_id if hasattr(current_user, 'unique_id') and current_user.unique_id else 'XXXXXX'
-        
-        if data['shipment_type'] == 'export':
-            invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{data['return_type']}/{user_unique_id}/{serial_number}"
-        elif data['shipment_type'] == 'import':
-            # Use new NCPOR/ARC pattern for import shipments with admin ID and requester ID
-            admin_id = current_user.unique_id if current_user.unique_id else 'ADMIN'
-            requester_unique_id = request.form.get('requester_unique_id', user_unique_id)
-            invoice_number = f"NCPOR/ARC/{year}/{month}/SAM/RT/{admin_id}/{requester_unique_id}/{serial_number}"
-        elif data['shipment_type'] == 'reimport':
-            invoice_number = f"NCPOR/REIMP/{year}/{month}/{data['return_type']}/{user_unique_id}/{serial_number}"
-        elif data['shipment_type'] == 'cold':
-            invoice_number = f"NCPOR/COLD/{year}/{month}/{user_unique_id}/{serial_number}"
-        else:
-            invoice_number = f"NCPOR/UNKNOWN/{year}/{month}/{data['return_type']}/{user_unique_id}/{serial_number}"
+        if data['shipment_type'] == 'import':
+            user_unique_id = request.form.get('requester_unique_id', user_unique_id)
+        unique_user_ids = [user_unique_id]
+    
+    invoice_number = build_invoice_number(data['shipment_type'], year, month, data['return_type'],
+                                          serial_number, unique_user_ids, admin_unique_id)
     
     try:
         # Get form data
@@ -1217,28 +848,25 @@ def submit_shipment():
             qr_service = QRCodeService()
             base_url = request.url_root.rstrip('/')  # Get the base URL without trailing slash
             
-            total_packages = int(form_data.get('total_packages', 0))
+            total_packages = shipment_data.total_packages
             
-            for package_num in range(1, total_packages + 1):
-                # Extract package information from form data
-                package_data = {
-                    'type': form_data.get(f'package_{package_num}_type'),
-                    'description': form_data.get(f'package_{package_num}_description'),
-                    'weight': form_data.get(f'package_{package_num}_weight'),
-                    'dimensions': form_data.get(f'package_{package_num}_dimensions'),
-                    'attention_person_id': form_data.get(f'package_{package_num}_belongs_to')
-                }
-                
-                # Generate QR code for this package
-                package_qr = qr_service.generate_package_qr_code(
-                    shipment=shipment,
-                    package_number=package_num,
-                    package_data=package_data,
-                    base_url=base_url
-                )
-                
-                if not package_qr:
-                    current_app.logger.warning(f"Failed to generate QR code for package {package_num} in shipment {shipment.id}")
+            # Package information for the QR codes
+            packages = [
+                (package.number, {
+                    'type': package.type,
+                    'description': package.description,
+                    'weight': package.weight,
+                    'dimensions': package.dimensions,
+                    'attention_person_id': package.belongs_to
+                })
+                for package in shipment_data.packages
+            ]
+            
+            # All rows in one commit - images are rendered when first requested
+            package_qrs = qr_service.generate_package_qr_codes(shipment, packages, base_url)
+            
+            if len(package_qrs) != len(packages):
+                current_app.logger.warning(f"Failed to generate QR codes for shipment {shipment.id}")
             
             current_app.logger.info(f"Generated QR codes for {total_packages} packages in shipment {shipment.id}")
             
@@ -1271,517 +899,462 @@ def submit_shipment():
             return redirect(url_for('main.cold_shipment'))
         return redirect(url_for('main.shipment_type_selection'))
 
-def get_aggregated_sample_types(form_data):
+def combine_form_item(item, default_requester):
+    """Item fields as shown on the combine/edit form for combined shipments"""
+    return {
+        'description': item.description,
+        'hsn_code': item.hsn_code,
+        'quantity': item.quantity_text if item.quantity_text is not None else '1',
+        'unit_value': item.unit_value_text if item.unit_value_text is not None else '0',
+        'net_weight': item.net_weight_text if item.net_weight_text is not None else '0',
+        'requester': item.attn if item.attn is not None else default_requester
+    }
+
+def render_shipment_docx(template_path, context, shipment_data, output=None):
     """
-    Extract and aggregate sample types from form data.
-    Returns a formatted string of unique sample types.
+    Render a shipment document entirely in memory
+    
+    The docxtpl placeholders are rendered into a private copy of the cached
+    template, the invoice/packing list/shipper tables are built on that same
+    document and the result is serialized once - no temp file round trip.
+    
+    Args:
+        template_path: Path to the DOCX template
+        context: Template context dictionary
+        shipment_data: ParsedShipment from parse_shipment
+        output: Optional file path to save the DOCX to instead of a buffer
+        
+    Returns:
+        BytesIO buffer with the finished DOCX positioned at the start, or
+        the output path when one was given
     """
-    sample_types = set()
-    
-    # Extract sample types from all items
-    for key, value in form_data.items():
-        if key.endswith('_sample_type') and value:
-            if value == 'other':
-                # Look for the corresponding other_sample_type field
-                prefix = key.replace('_sample_type', '')
-                other_key = f"{prefix}_other_sample_type"
-                other_value = form_data.get(other_key, '').strip()
-                if other_value:
-                    sample_types.add(other_value.lower())
-            else:
-                # Map values to display names
-                type_mapping = {
-                    'water': 'water',
-                    'sediment': 'sediment', 
-                    'glass_fiber': 'glass fiber'
-                }
-                display_name = type_mapping.get(value, value)
-                sample_types.add(display_name)
+    # Load a private copy of the cached, pre-parsed template and render it
+    with timed_stage('template_load'):
+        tpl = get_document_template(template_path)
+    with timed_stage('render'):
+        tpl.render(context)
     
-    # Convert to sorted list for consistent output
-    sorted_types = sorted(list(sample_types))
+    # The rendered python-docx document is used directly for table manipulation
+    doc = tpl.docx
     
-    if not sorted_types:
-        return "samples"
-    elif len(sorted_types) == 1:
-        return f"{sorted_types[0]} samples"
-    else:
-        # Join with "and" for the last item
-        if len(sorted_types) == 2:
-            return f"{sorted_types[0]} and {sorted_types[1]} samples"
-        else:
-            return f"{', '.join(sorted_types[:-1])}, and {sorted_types[-1]} samples"
+    with timed_stage('table_build'):
+        total_amount = build_document_tables(doc, shipment_data)
+    
+    with timed_stage('serialize'):
+        if output:
+            tpl.save(output)
+            return output
+        
+        # Serialize to buffer
+        docx_buffer = io.BytesIO()
+        tpl.save(docx_buffer)
+        docx_buffer.seek(0)
+    
+    return docx_buffer
 
-def generate_shipment_document(shipment, form_data, document_type='invoice_packing'):
-    """Generate document for a shipment
+def build_document_tables(doc, shipment_data):
+    """
+    Build the invoice, packing list and shipper tables of a rendered document
+    
+    Returns:
+        Invoice total amount
+    """
+    # Package owners/requesters for all three tables, loaded in one go
+    users = resolve_package_users(shipment_data)
+    form_data = shipment_data.form_data
+    
+    # Handle table placement and population
+    invoice_table = handle_table_placement(doc, form_data)
+    total_amount = populate_table_data(invoice_table, shipment_data, users)
+
+    # Handle packing list table
+    pl_table = handle_pl_table_placement(doc, form_data)
+    populate_pl_table_data(pl_table, shipment_data, users)
+    
+    # Handle shipper table
+    shipper_table = handle_shipper_table_placement(doc, form_data)
+    populate_shipper_table_data(shipper_table, shipment_data, users)
+    
+    # Compute amount in words
+    amount_in_words = f"USD {num2words(int(total_amount))} Only"
+
+    # Update amount in words and total amount
+    for paragraph in doc.paragraphs:
+        if '[AMOUNT_IN_WORDS]' in paragraph.text:
+            paragraph.text = paragraph.text.replace('[AMOUNT_IN_WORDS]', amount_in_words)
+        if '[TOTAL_AMOUNT]' in paragraph.text:
+            paragraph.text = paragraph.text.replace('[TOTAL_AMOUNT]', f"{total_amount:.0f}")
+    
+    return total_amount
+
+def timed_document_build(operation):
+    """Run a document build under a stage timer and log its stage breakdown"""
+    def decorator(build):
+        def decorated_function(shipment, form_data, document_type='invoice_packing', *args):
+            with stage_timer(operation, current_app.logger, slow_ms=current_app.config.get('DOCUMENT_TIMING_SLOW_MS'),
+                             shipment=shipment.id, document_type=document_type):
+                return build(shipment, form_data, document_type, *args)
+        decorated_function.__name__ = build.__name__
+        decorated_function.__doc__ = build.__doc__
+        return decorated_function
+    return decorator
+
+def new_document_work_dir():
+    """Private temp directory for one document build; the caller removes it"""
+    return tempfile.mkdtemp(prefix='compass_doc_')
+
+def send_document(document, mimetype, download_name, etag=None, work_dir=None):
+    """
+    Send a built document, streaming files straight from disk
+    
+    Args:
+        document: Path of the finished file, or its bytes
+        mimetype: Response MIME type
+        download_name: Attachment filename
+        etag: Cache key used as the ETag, None to disable
+        work_dir: Temp directory holding the file, removed once the response is closed
+    """
+    try:
+        response = send_file(
+            document if isinstance(document, str) else io.BytesIO(document),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            etag=etag or False
+        )
+    except Exception:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    
+    if work_dir:
+        # The file is read while the response body is sent, clean up afterwards
+        response.call_on_close(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+    return response
+
+@timed_document_build('document_docx')
+def build_shipment_docx(shipment, form_data, document_type='invoice_packing'):
+    """Build the DOCX document for a shipment
     
     Args:
         shipment: Shipment object
         form_data: Form data dictionary
         document_type: 'invoice_packing' for invoice & packing list only, 
                       'custom_docs' for full customs clearance documents
+    
+    Returns:
+        (docx, filename, etag, work_dir) - docx is the path of the finished file;
+        when work_dir is set the file is a temporary one the caller must remove
+        (together with work_dir) once it is done with it
     """
+    # Determine template based on shipment type and document type
+    # (import shipments use the Room Temperature templates)
+    template_path = resolve_template_path(shipment.shipment_type, document_type)
+    
+    # Parse the flat form data once for the tables and sample types
+    shipment_data = parse_shipment(form_data)
+    
+    # Shared with the PDF build - fetched and assembled once per request
+    context = get_document_context(shipment, form_data, shipment_data)
+    
+    # Generate filename using new format
+    from .utils.helpers import generate_document_filename
+    filename = generate_document_filename(shipment, form_data, document_type)
+    
+    # Serve an unchanged document straight from the cache
+    document_cache = get_document_cache()
+    cache_key = document_cache_key(template_path, context, form_data, document_type, 'docx')
+    cached_path = document_cache.get(cache_key, 'docx') if document_cache else None
+    if cached_path:
+        return cached_path, filename, cache_key, None
+    
+    # Render the template and build the tables in memory, serialize straight to disk
+    work_dir = new_document_work_dir()
     try:
-        # Get the absolute path to our template file based on document type
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        
-        # Determine template based on shipment type and document type
-        if shipment.shipment_type == 'import':
-            if document_type == 'invoice_packing':
-                # For import shipments invoice & packing list, use Room Temperature invoice template
-                template_path = os.path.join(root_dir, 'templates', 'Room Temperature Sample Import', 'invoice_packinglist_room_temperature.docx')
-                doc_type_name = "room_temperature_import_invoice"
-            else:  # custom_docs
-                # For import shipments custom docs, use Room Temperature custom docs template
-                template_path = os.path.join(root_dir, 'templates', 'Room Temperature Sample Import', 'Room_Temperature_Import_Custom_Docs .docx')
-                doc_type_name = "room_temperature_import_custom"
-        elif document_type == 'custom_docs':
-            template_path = os.path.join(root_dir, 'templates', 'export_custom_docs.docx')
-            doc_type_name = "custom_docs"
-        else:  # default to invoice_packing for export/other shipment types
-            template_path = os.path.join(root_dir, 'templates', 'invoice_packinglist.docx')
-            doc_type_name = "invoice_packing"
-        
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"Template file not found: {template_path}")
-        
-        # Load the template with docxtpl for initial replacements
-        tpl = DocxTemplate(template_path)
-        
-        # Get aggregated sample types for this shipment
-        sample_type_aggregated = get_aggregated_sample_types(form_data)
-        
-        # Get signing authority details
-        def get_signing_authority_context():
-            """Get signing authority context for document generation"""
-            signing_authority = None
-            if shipment.signing_authority_id:
-                signing_authority = SigningAuthority.query.get(shipment.signing_authority_id)
-            else:
-                # Get default signing authority if none assigned
-                signing_authority = SigningAuthority.query.filter_by(is_default=True, is_active=True).first()
-            
-            if signing_authority:
-                return {
-                    'signing_authority_name': signing_authority.name,
-                    'signing_authority_designation': signing_authority.designation,
-                    'singing_authority_department': signing_authority.department,  # Note: matches user's typo in placeholder
-                    'signing_authority_organisation': signing_authority.organisation,
-                    'signing_authority_contact_number': signing_authority.contact_number or '',
-                    'signing_authority_contact_fax': signing_authority.contact_fax or '',
-                    'signing_authority_email': signing_authority.email or '',
-                    # Hindi placeholders
-                    'signing_authority_name_hindi': signing_authority.name_hindi or '',
-                    'signing_authority_designation_hindi': signing_authority.designation_hindi or '',
-                    'signing_authority_department_hindi': signing_authority.department_hindi or ''
-                }
-            else:
-                # Default empty values if no signing authority found
-                return {
-                    'signing_authority_name': '',
-                    'signing_authority_designation': '',
-                    'singing_authority_department': '',
-                    'signing_authority_organisation': '',
-                    'signing_authority_contact_number': '',
-                    'signing_authority_contact_fax': '',
-                    'signing_authority_email': '',
-                    # Hindi placeholders
-                    'signing_authority_name_hindi': '',
-                    'signing_authority_designation_hindi': '',
-                    'signing_authority_department_hindi': ''
-                }
-        
-        # Get signing authority context
-        signing_authority_context = get_signing_authority_context()
-        
-        # Prepare context based on shipment type
-        if shipment.shipment_type == 'export':
-            # Check if "other" consignee was selected
-            consignee_selection = form_data.get('consignee', 'himadri')  # Default to himadri
-            
-            if consignee_selection == 'other':
-                # Use other consignee details
-                consignee_name = form_data.get('other_consignee_org', 'Other Organization')
-                consignee_address = form_data.get('other_consignee_address', 'Other Address')
-                consignee_contact = form_data.get('other_consignee_contact', 'Other Contact')
-                consignee_phone = form_data.get('other_consignee_phone', 'Other Phone')
-            else:
-                # Use default Himadri details
-                consignee_name = "Himadri - Indian Arctic Research Station C/O Kingsbay AS"
-                consignee_address = "N-9173 Ny-Alesund, Norway"
-                consignee_contact = "Kingsbay AS, Longyearbyen"
-                consignee_phone = "+47 79 027200"
-            
-            # Set exporter details based on shipment type
-            if shipment.shipment_type == 'import':
-                # For import shipments, Himadri is the exporter (sending samples from Norway to India)
-                exporter_name = "Himadri - Indian Arctic Research Station"
-                exporter_ministry = ""  # Not applicable for Himadri
-                exporter_address = "Ny-Alesund, c/o Kings Bay AS"
-                exporter_country = "Norway"
-                exporter_location = "N-9173, Ny-Alesund, Norway"
-                exporter_phone = "+47 79 02 72 00"
-                exporter_gst = ""  # Not applicable for Norwegian station
-                exporter_lut = ""  # Not applicable for Norwegian station
-            else:
-                # For export/other shipments, NCPOR is the exporter (sending samples from India to Norway)
-                exporter_name = "National Center for Polar and Ocean Research (NCPOR) [erstwhite NCAOR]"
-                exporter_ministry = "Ministry of Earth Sciences (Govt. of India)"
-                exporter_address = "Headland Sada, Vasco da Gama, Goa - 403804"
-                exporter_country = "India"
-                exporter_location = "India"
-                exporter_phone = "+91 832 2525501"
-                exporter_gst = "30AACFN4991P1ZN"
-                exporter_lut = "AD300618000016R"
-            
-            context = {
-                'invoice_no': shipment.invoice_number,
-                'invoice_date': datetime.now().strftime('%d-%m-%Y'),
-                'file_reference_number': shipment.file_reference_number or '',
-                'Sample_Type': sample_type_aggregated,
-                'ncpor_gst': "30AACFN4991P1ZN",
-                'ncpor_lut': "AD300618000016R",
-                'exporter_name': exporter_name,
-                'exporter_ministry': exporter_ministry,
-                'exporter_address': exporter_address,
-                'exporter_country': exporter_country,
-                'exporter_location': exporter_location,
-                'exporter_phone': exporter_phone,
-                'exporter_gst': exporter_gst,
-                'exporter_lut': exporter_lut,
-                'consignee_name': consignee_name,
-                'consignee_address': consignee_address,
-                'consignee_contact': consignee_contact,
-                'consignee_phone': consignee_phone,
-                'destination_country': form_data.get('destination_country', 'NORWAY'),
-                'country_of_origin_goods': form_data.get('country_of_origin', 'India'),
-                'country_of_final_destination': form_data.get('country_of_final_destination', 'Norway'),
-                'airport_of_loading': form_data.get('airport_loading', 'MUMBAI'),
-                'mode_of_transport': form_data.get('mode_of_transport', 'Air'),
-                'transport_facility_type': 'Air Port' if form_data.get('mode_of_transport', 'Air') == 'Air' else 'Port',
-                'port_of_loading': form_data.get('port_of_loading', ''),
-                'port_of_discharge': form_data.get('port_of_discharge', ''),
-                'requester_name': form_data.get('requester_name', ''),
-                'expedition_year': form_data.get('expedition_year', ''),
-                'batch_number': form_data.get('batch_number', ''),
-                'return_type': form_data.get('return_type', ''),
-                'purpose': "RESEARCH AND DEVELOPMENT",
-                'declaration': "We declare that the invoice shows the actual price of goods described and that all particulars are true and correct.",
-                **signing_authority_context  # Add signing authority details
-            }
-        elif shipment.shipment_type in ['import', 'reimport']:
-            # Check if "other" consignee was selected
-            consignee_selection = form_data.get('consignee', 'ncpor')  # Default to ncpor for import/reimport
-            
-            # Standard consignee placeholders ALWAYS contain NCPOR details for imports
-            consignee_name = "National Center for Polar and Ocean Research (NCPOR) [erstwhite NCAOR]"
-            consignee_address = "Headland Sada, Vasco da Gama, Goa - 403804"
-            consignee_phone = "9274584406"
-            consignee_gst = "30AACFN4991P1ZN"
-            consignee_lut = "AD300618000016R"
-            consignee_ministry = "Ministry of Earth Sciences (Govt. of India)"
-            consignee_location = "India"
-            
-            context = {
-                'invoice_no': shipment.invoice_number,
-                'invoice_date': datetime.now().strftime('%d-%m-%Y'),
-                'file_reference_number': shipment.file_reference_number or '',
-                'Sample_Type': sample_type_aggregated,
-                'ncpor_gst': "30AACFN4991P1ZN",
-                'ncpor_lut': "AD300618000016R",
-                'exporter_name': "Himadri - Indian Arctic Research Station",
-                'exporter_org': "HIMADRI-Indian Arctic Research Station",
-                'exporter_address': "Ny-Alesund, c/o Kings Bay AS",
-                'exporter_location': "N-9173, Ny-Alesund, Norway",
-                'exporter_phone': "+47 79 02 72 00",
-                'consignee_name': consignee_name,
-                'consignee_ministry': consignee_ministry,
-                'consignee_address': consignee_address,
-                'consignee_location': consignee_location,
-                'consignee_phone': consignee_phone,
-                'consignee_gst': consignee_gst,
-                'consignee_lut': consignee_lut,
-                'consignee_contact': "Dr. Rohit Srivastava",
-                'consigner_name': "Himadri - Indian Arctic Research Station C/O Kingsbay AS",
-                'consigner_address': "N-9173 Ny-Alesund, Norway",
-                'consigner_contact': "Kingsbay AS, Longyearbyen",
-                'consigner_phone': "+47 79 027200",
-                'destination_country': 'INDIA',
-                'country_of_origin_goods': form_data.get('country_of_origin', 'Norway'),
-                'country_of_final_destination': form_data.get('country_of_final_destination', 'India'),
-                'final_destination': form_data.get('final_destination', ''),
-                'airport_of_loading': form_data.get('import_mode', 'AIR').upper(),
-                'mode_of_transport': form_data.get('mode_of_transport', 'Air'),
-                'transport_facility_type': 'Air Port' if form_data.get('mode_of_transport', 'Air') == 'Air' else 'Port',
-                'port_of_loading': form_data.get('port_of_loading', ''),
-                'port_of_discharge': form_data.get('port_of_discharge', ''),
-                'requester_name': form_data.get('requester_name', ''),
-                'expedition_year': form_data.get('expedition_year', ''),
-                'batch_number': form_data.get('batch_number', ''),
-                'import_purpose': form_data.get('import_purpose', 'RESEARCH'),
-                'purpose': "RESEARCH AND DEVELOPMENT",
-                'declaration': "We declare that the invoice shows the actual price of goods described and that all particulars are true and correct.",
-                
-                # Other Organization Details (populated when "other" consignee is selected)
-                'other_org_name': form_data.get('other_consignee_org', '') if consignee_selection == 'other' else "",
-                'other_org_ministry': form_data.get('other_consignee_ministry', '') if consignee_selection == 'other' else "",
-                'other_org_address': form_data.get('other_consignee_address', '') if consignee_selection == 'other' else "",
-                'other_org_location': form_data.get('other_consignee_country', '') if consignee_selection == 'other' else "",
-                'other_org_phone': form_data.get('other_consignee_phone', '') if consignee_selection == 'other' else "",
-                'other_org_gst': form_data.get('other_consignee_gst', '') if consignee_selection == 'other' else "",
-                'other_org_lut': form_data.get('other_consignee_lut', '') if consignee_selection == 'other' else "",
-                'other_org_contact': form_data.get('other_consignee_contact', '') if consignee_selection == 'other' else "",
-                'other_org_designation': form_data.get('other_consignee_designation', '') if consignee_selection == 'other' else "",
-                'other_org_email': form_data.get('other_consignee_email', '') if consignee_selection == 'other' else "",
-                
-                **signing_authority_context  # Add signing authority details
-            }
-        else:  # cold
-            context = {
-                'invoice_no': shipment.invoice_number,
-                'invoice_date': datetime.now().strftime('%d-%m-%Y'),
-                'file_reference_number': shipment.file_reference_number or '',
-                'Sample_Type': sample_type_aggregated,
-                'requester_name': form_data.get('requester_name', ''),
-                'expedition_year': form_data.get('expedition_year', ''),
-                'batch_number': form_data.get('batch_number', ''),
-                'total_boxes': form_data.get('total_boxes', '0'),
-                'purpose': "RESEARCH AND DEVELOPMENT",
-                'declaration': "We declare that the invoice shows the actual price of goods described and that all particulars are true and correct.",
-                **signing_authority_context  # Add signing authority details
-            }
-        
-        # Render the template with docxtpl
-        tpl.render(context)
-        
-        # Save the docxtpl output to a temporary file
-        if shipment.shipment_type == 'import':
-            temp_path = os.path.join(root_dir, 'templates', 'temp_room_temperature_import.docx')
-        else:
-            temp_path = os.path.join(root_dir, 'templates', f'temp_{shipment.shipment_type}_{doc_type_name}.docx')
-        tpl.save(temp_path)
-        
-        # Load the temporary file with python-docx for table manipulation
-        doc = Document(temp_path)
-        
-        # Handle table placement and population
-        invoice_table = handle_table_placement(doc, form_data)
-        total_amount = populate_table_data(invoice_table, form_data)
+        docx_path = render_shipment_docx(template_path, context, shipment_data,
+                                         output=os.path.join(work_dir, 'document.docx'))
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    
+    cached_path = document_cache.put_file(cache_key, 'docx', docx_path) if document_cache else None
+    if cached_path:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return cached_path, filename, cache_key, None
+    
+    return docx_path, filename, cache_key, work_dir
 
-        # Handle packing list table
-        pl_table = handle_pl_table_placement(doc, form_data)
-        populate_pl_table_data(pl_table, form_data)
-        
-        # Handle shipper table
-        shipper_table = handle_shipper_table_placement(doc, form_data)
-        populate_shipper_table_data(shipper_table, form_data)
-        
-        # Compute amount in words
-        amount_in_words = f"USD {num2words(int(total_amount))} Only"
+def generate_shipment_document(shipment, form_data, document_type='invoice_packing'):
+    """Generate document for a shipment and return it as a download"""
+    docx, filename, etag, work_dir = build_shipment_docx(shipment, form_data, document_type)
+    
+    return send_document(
+        docx,
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        filename,
+        etag=etag,
+        work_dir=work_dir
+    )
 
-        # Update amount in words and total amount
-        for paragraph in doc.paragraphs:
-            if '[AMOUNT_IN_WORDS]' in paragraph.text:
-                paragraph.text = paragraph.text.replace('[AMOUNT_IN_WORDS]', amount_in_words)
-            if '[TOTAL_AMOUNT]' in paragraph.text:
-                paragraph.text = paragraph.text.replace('[TOTAL_AMOUNT]', f"{total_amount:.0f}")
-        
-        # Save to buffer
-        docx_buffer = io.BytesIO()
-        doc.save(docx_buffer)
-        docx_buffer.seek(0)
-        
-        # Remove the temporary file
-        os.remove(temp_path)
-        
-        # Generate filename using new format
-        from .utils.helpers import generate_document_filename
-        filename = generate_document_filename(shipment, form_data, document_type)
-        
-        # Return the generated document
-        return send_file(
-            docx_buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            as_attachment=True,
-            download_name=filename
-        )
-        
-    except Exception as e:
-        raise e
+def plan_shipment_pdf(shipment, form_data, document_type='invoice_packing'):
+    """Work out how a shipment PDF is built and the cache key of the result
+    
+    Shared by the PDF build and the thumbnail, which needs the key to find a
+    cached thumbnail without building the PDF.
+    
+    Returns:
+        (template_path, shipment_data, context, should_add_extras, use_native_renderer, cache_key)
+    """
+    # Determine template based on shipment type and document type
+    template_path = resolve_template_path(shipment.shipment_type, document_type)
+    
+    # Parse the flat form data once for the tables and sample types
+    shipment_data = parse_shipment(form_data)
+    
+    # Same context as the DOCX build (shared within the request)
+    context = get_document_context(shipment, form_data, shipment_data)
+    
+    # Only add extra documents for Normal Sample Import Custom Documents
+    should_add_extras = (
+        shipment.shipment_type == 'import' and 
+        document_type == 'custom_docs'
+    )
+    
+    # The appended documents are part of the key so replacing them invalidates it
+    appendices = [file_digest(path) for path in get_extra_documents(shipment.shipment_type, 'normal')] \
+        if should_add_extras else []
+    use_native_renderer = (
+        current_app.config.get('DOCUMENT_PDF_BACKEND') == 'reportlab' and
+        supports_native_pdf(document_type) and
+        not should_add_extras
+    )
+    cache_key = document_cache_key(template_path, context, form_data, document_type, 'pdf', appendices=appendices,
+                                   backend='reportlab' if use_native_renderer else 'libreoffice')
+    
+    return template_path, shipment_data, context, should_add_extras, use_native_renderer, cache_key
 
-def generate_shipment_document_pdf(shipment, form_data, document_type='invoice_packing'):
-    """Generate PDF document for a shipment with extra documents appended
+@timed_document_build('document_pdf')
+def build_shipment_pdf(shipment, form_data, document_type='invoice_packing'):
+    """Build the PDF document for a shipment with extra documents appended
     
     Args:
         shipment: Shipment object
         form_data: Form data dictionary
         document_type: 'invoice_packing' for invoice & packing list only, 
                       'custom_docs' for full customs clearance documents
+    
+    Returns:
+        (pdf, filename, etag, work_dir) - pdf is the path of the finished file
+        (or the PDF bytes), etag is None when the result must not be cached;
+        when work_dir is set the file is a temporary one the caller must
+        remove (together with work_dir) once it is done with it
     """
     try:
-        import tempfile
-        
-        # First, generate the DOCX document to a temporary file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        
-        # Determine template based on shipment type and document type
-        if shipment.shipment_type == 'import':
-            if document_type == 'invoice_packing':
-                template_path = os.path.join(root_dir, 'templates', 'Room Temperature Sample Import', 'invoice_packinglist_room_temperature.docx')
-                doc_type_name = "room_temperature_import_invoice"
-            else:  # custom_docs
-                template_path = os.path.join(root_dir, 'templates', 'Room Temperature Sample Import', 'Room_Temperature_Import_Custom_Docs .docx')
-                doc_type_name = "room_temperature_import_custom"
-        elif document_type == 'custom_docs':
-            template_path = os.path.join(root_dir, 'templates', 'export_custom_docs.docx')
-            doc_type_name = "custom_docs"
-        else:  # default to invoice_packing for export/other shipment types
-            template_path = os.path.join(root_dir, 'templates', 'invoice_packinglist.docx')
-            doc_type_name = "invoice_packing"
-        
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"Template file not found: {template_path}")
-        
-        # Load the template with docxtpl for initial replacements
-        tpl = DocxTemplate(template_path)
-        
-        # Get aggregated sample types for this shipment
-        sample_type_aggregated = get_aggregated_sample_types(form_data)
-        
-        # Get signing authority details (reuse the same logic as DOCX generation)
-        def get_signing_authority_context():
-            signing_authority = None
-            if shipment.signing_authority_id:
-                signing_authority = SigningAuthority.query.get(shipment.signing_authority_id)
-            else:
-                signing_authority = SigningAuthority.query.filter_by(is_default=True, is_active=True).first()
-            
-            if signing_authority:
-                return {
-                    'signing_authority_name': signing_authority.name,
-                    'signing_authority_designation': signing_authority.designation,
-                    'singing_authority_department': signing_authority.department,  # Note: matches user's typo in placeholder
-                    'signing_authority_organisation': signing_authority.organisation,
-                    'signing_authority_contact_number': signing_authority.contact_number or '',
-                    'signing_authority_contact_fax': signing_authority.contact_fax or '',
-                    'signing_authority_email': signing_authority.email or '',
-                    # Hindi placeholders
-                    'signing_authority_name_hindi': signing_authority.name_hindi or '',
-                    'signing_authority_designation_hindi': signing_authority.designation_hindi or '',
-                    'signing_authority_department_hindi': signing_authority.department_hindi or ''
-                }
-            else:
-                return {
-                    'signing_authority_name': 'Not Assigned',
-                    'signing_authority_designation': '',
-                    'singing_authority_department': '',
-                    'signing_authority_organisation': '',
-                    'signing_authority_contact_number': '',
-                    'signing_authority_contact_fax': '',
-                    'signing_authority_email': '',
-                    'signing_authority_name_hindi': '',
-                    'signing_authority_designation_hindi': '',
-                    'signing_authority_department_hindi': ''
-                }
-        
-        signing_auth_context = get_signing_authority_context()
-        
-        # Build context (reuse same logic as DOCX generation)
-        context = {
-            'invoice_number': shipment.invoice_number,
-            'serial_number': shipment.serial_number,
-            'shipment_date': shipment.created_at.strftime('%d/%m/%Y'),
-            'shipment_type': shipment.shipment_type.title(),
-            'requester_name': form_data.get('requester_name', ''),
-            'requester_email': shipment.created_by_user.email if shipment.created_by_user else '',
-            'requester_phone': shipment.created_by_user.phone or 'Not provided' if shipment.created_by_user else 'Not provided',
-            'requester_organization': shipment.created_by_user.organization if shipment.created_by_user else '',
-            'requester_unique_id': shipment.created_by_user.unique_id if shipment.created_by_user else '',
-            'sample_types': sample_type_aggregated,
-            'ncpor_gst': '08AAAGN3682G1ZU',
-            'ncpor_lut': 'AD3309230005592',
-            **signing_auth_context
-        }
-        
-        # Add shipment-specific context
-        if shipment.shipment_type in ['import', 'reimport']:
-            context.update({
-                'exporter_name': 'Himadri - Indian Arctic Research Station',
-                'exporter_address': 'Himadri Station, Ny-Ålesund, Svalbard, Norway',
-                'consignee_name': 'National Center for Polar and Ocean Research (NCPOR)',
-                'consignee_address': 'Headland Sada, Vasco-da-Gama, Goa 403804, India',
-                'consignee_contact': 'Dr. Rohit Srivastava',
-                'consignee_phone': '9274584406',
-                'port_of_loading': form_data.get('port_of_loading', 'Longyearbyen, Svalbard'),
-                'port_of_discharge': 'JNPT, Mumbai',
-                'final_destination': form_data.get('final_destination', 'NCPOR, Goa'),
-                'country_of_final_destination': 'India',
-                'country_of_origin': 'Norway'
-            })
-        
-        # Create temporary DOCX file
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as temp_docx:
-            temp_docx_path = temp_docx.name
+        template_path, shipment_data, context, should_add_extras, use_native_renderer, cache_key = \
+            plan_shipment_pdf(shipment, form_data, document_type)
         
-        # Render and save DOCX
-        tpl.render(context)
-        tpl.save(temp_docx_path)
+        # Generate filename
+        from .utils.helpers import generate_document_filename
+        docx_filename = generate_document_filename(shipment, form_data, document_type)
+        pdf_filename = docx_filename.replace('.docx', '.pdf')
         
-        # Only add extra documents for Normal Sample Import Custom Documents
-        should_add_extras = (
-            shipment.shipment_type == 'import' and 
-            document_type == 'custom_docs'
-        )
+        # Serve an unchanged document straight from the cache
+        document_cache = get_document_cache()
+        cached_path = document_cache.get(cache_key, 'pdf') if document_cache else None
+        if cached_path:
+            return cached_path, pdf_filename, cache_key, None
+        
+        if use_native_renderer:
+            # Draw the invoice & packing list straight to PDF - no DOCX, no LibreOffice
+            pdf_bytes = render_invoice_packing_pdf(template_path, context, shipment_data)
+            cached_path = document_cache.put(cache_key, 'pdf', pdf_bytes) if document_cache else None
+            if cached_path:
+                return cached_path, pdf_filename, cache_key, None
+            return pdf_bytes, pdf_filename, cache_key, None
+        
+        # Render the DOCX in memory and save it to a private working directory -
+        # LibreOffice is the only step that needs a file on disk
+        work_dir = new_document_work_dir()
+        try:
+            temp_docx_path = render_shipment_docx(template_path, context, shipment_data,
+                                                  output=os.path.join(work_dir, 'document.docx'))
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
         
         if should_add_extras:
             # Generate PDF with extra documents for Normal Sample Import Custom Docs
             pdf_path = generate_pdf_with_extras(
                 temp_docx_path, 
                 shipment.shipment_type, 
-                'normal'  # Normal temperature import
+                'normal',  # Normal temperature import
+                error_pdf_fallback=False
             )
         else:
             # Simple DOCX to PDF conversion without extras
-            pdf_path = convert_docx_to_pdf(temp_docx_path)
-        
-        if not pdf_path or not os.path.exists(pdf_path):
-            # Fallback to simple DOCX to PDF conversion
-            pdf_path = convert_docx_to_pdf(temp_docx_path)
+            pdf_path = convert_docx_to_pdf(temp_docx_path, error_pdf_fallback=False)
+        
+        # Only a real conversion is worth caching, never the error placeholder
+        cacheable = bool(pdf_path and os.path.exists(pdf_path))
+        
+        if not cacheable and supports_native_pdf(document_type):
+            # LibreOffice failed or is missing - the native renderer still gives a real document
+            current_app.logger.warning("LibreOffice conversion unavailable, using the native PDF renderer")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return render_invoice_packing_pdf(template_path, context, shipment_data), pdf_filename, None, None
+        
+        if not cacheable:
+            # Conversion failed - write the error placeholder (never cached)
+            # directly instead of running the converter a second time
+            pdf_path = create_error_pdf_with_extras(
+                os.path.join(work_dir, 'document.pdf'),
+                shipment.shipment_type if should_add_extras else None,
+                'normal'
+            )
         
         if not pdf_path or not os.path.exists(pdf_path):
+            shutil.rmtree(work_dir, ignore_errors=True)
             raise Exception("Failed to generate PDF document")
         
-        # Generate filename
-        from .utils.helpers import generate_document_filename
-        docx_filename = generate_document_filename(shipment, form_data, document_type)
-        pdf_filename = docx_filename.replace('.docx', '.pdf')
-        
-        # Read PDF into memory
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_buffer = io.BytesIO(pdf_file.read())
-        
-        # Clean up temporary files
-        try:
-            os.remove(temp_docx_path)
-            os.remove(pdf_path)
-        except:
-            pass
+        if not cacheable:
+            return pdf_path, pdf_filename, None, work_dir
         
-        pdf_buffer.seek(0)
+        # Move the PDF into the cache and drop the rest of the working directory
+        cached_path = document_cache.put_file(cache_key, 'pdf', pdf_path) if document_cache else None
+        if cached_path:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return cached_path, pdf_filename, cache_key, None
         
-        # Return the PDF
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=pdf_filename
-        )
+        return pdf_path, pdf_filename, cache_key, work_dir
         
     except Exception as e:
         current_app.logger.error(f"PDF generation error: {str(e)}")
-        raise e
+        raise
+
+def generate_shipment_document_pdf(shipment, form_data, document_type='invoice_packing'):
+    """Generate PDF document for a shipment and return it as a download"""
+    pdf, pdf_filename, etag, work_dir = build_shipment_pdf(shipment, form_data, document_type)
+    
+    return send_document(pdf, 'application/pdf', pdf_filename, etag=etag, work_dir=work_dir)
+
+@timed_document_build('document_thumbnail')
+def build_shipment_thumbnail(shipment, form_data, document_type='invoice_packing', image_format='png'):
+    """Build a first-page thumbnail of a shipment's PDF document
+    
+    The thumbnail is cached next to the PDF under a key derived from the
+    PDF's cache key, so editing the shipment invalidates both. A cached
+    thumbnail is served without building (or even reading) the PDF.
+    
+    Returns:
+        (image, etag) - image is the path of the cached thumbnail or its bytes,
+        or None if the page could not be rasterized
+    """
+    width = int(current_app.config.get('DOCUMENT_THUMBNAIL_WIDTH', 320))
+    
+    document_cache = get_document_cache()
+    if document_cache:
+        pdf_key = plan_shipment_pdf(shipment, form_data, document_type)[-1]
+        thumbnail_key = f"{pdf_key}_thumb{width}"
+        cached_path = document_cache.get(thumbnail_key, image_format)
+        if cached_path:
+            return cached_path, thumbnail_key
+    
+    pdf, _, pdf_etag, work_dir = build_shipment_pdf(shipment, form_data, document_type)
+    
+    try:
+        # An uncacheable PDF (error placeholder, fallback render) gets an uncached thumbnail
+        thumbnail_key = f"{pdf_etag}_thumb{width}" if pdf_etag else None
+        
+        if not isinstance(pdf, str):
+            # Natively rendered PDF that could not be cached - rasterize a temp copy
+            work_dir = work_dir or new_document_work_dir()
+            pdf_path = os.path.join(work_dir, 'thumbnail_source.pdf')
+            with open(pdf_path, 'wb') as pdf_file:
+                pdf_file.write(pdf)
+            pdf = pdf_path
+        
+        with timed_stage('thumbnail'):
+            image = render_pdf_thumbnail(pdf, width, image_format)
+        if image is None:
+            return None, None
+        
+        cached_path = document_cache.put(thumbnail_key, image_format, image) \
+            if document_cache and thumbnail_key else None
+        return cached_path or image, thumbnail_key
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+@job_handler('shipment_pdf')
+def run_shipment_pdf_job(job):
+    """Background job: build a shipment PDF and store it as the job artifact"""
+    payload = job.get_payload()
+    shipment = Shipment.query.get(payload['shipment_id'])
+    if not shipment:
+        raise ValueError(f"Shipment {payload['shipment_id']} no longer exists")
+    
+    form_data = json.loads(shipment.form_data)
+    pdf, pdf_filename, _, work_dir = build_shipment_pdf(shipment, form_data, payload.get('document_type', 'custom_docs'))
+    
+    result_path = get_job_queue().result_path(job, 'pdf')
+    try:
+        if work_dir:
+            # Temporary file - move it rather than copy it
+            shutil.move(pdf, result_path)
+        elif isinstance(pdf, str):
+            shutil.copyfile(pdf, result_path)
+        else:
+            with open(result_path, 'wb') as result_file:
+                result_file.write(pdf)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return result_path, pdf_filename, 'application/pdf'
+
+@job_handler('qr_regeneration')
+def run_qr_regeneration_job(job):
+    """Background job: regenerate package QR codes and store a CSV report as the job artifact"""
+    payload = job.get_payload()
+    queue = get_job_queue()
+    
+    results = QRCodeService().regenerate_qr_codes(
+        payload['package_ids'],
+        base_url=payload.get('base_url'),
+        progress=lambda percent: queue.set_progress(job, min(percent, 99))
+    )
+    
+    result_path = queue.result_path(job, 'csv')
+    columns = ['package_id', 'tracking_code', 'invoice_number', 'package_number', 'tracking_url', 'status']
+    with open(result_path, 'w', newline='', encoding='utf-8') as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+    
+    regenerated = sum(1 for row in results if row['status'] == 'ok')
+    current_app.logger.info(f"Regenerated {regenerated} of {len(results)} QR codes in job {job.id}")
+    return result_path, f"qr_regeneration_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", 'text/csv'
+
+def enqueue_shipment_pdf(shipment, document_type):
+    """Queue PDF generation for a shipment and point the client at the job
+    
+    AJAX callers get a 202 with the polling and download URLs, browsers are
+    redirected to the job status page which downloads the file when ready.
+    """
+    job = get_job_queue().enqueue('shipment_pdf', {
+        'shipment_id': shipment.id,
+        'document_type': document_type
+    }, user_id=current_user.id)
+    
+    if request.headers.get('Content-Type') == 'application/json' or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('main.document_job_api', job_id=job.id),
+            'download_url': url_for('main.download_document_job', job_id=job.id)
+        }), 202
+    
+    return redirect(url_for('main.document_job_status', job_id=job.id))
 
 @main.route('/dashboard')
 @login_required
@@ -2087,21 +1660,17 @@ def regenerate_qr_code(package_id):
 @login_required
 @admin_required
 def download_qr_code(package_id):
-    """Download QR code image for a specific package"""
+    """Download QR code image for a specific package (?format=png|svg)"""
     package_qr = PackageQRCode.query.get_or_404(package_id)
     
-    if not package_qr.qr_image_path:
-        flash('QR code image not found. Try regenerating the QR code.', 'error')
+    image_format = request.args.get('format', 'png').lower()
+    if image_format not in QR_IMAGE_FORMATS:
+        flash('Unsupported QR code format.', 'error')
         return redirect(url_for('main.qr_codes_management'))
     
     try:
-        qr_file_path = os.path.join(current_app.root_path, package_qr.qr_image_path)
-        
-        if os.path.exists(qr_file_path):
-            filename = f"qr_code_{package_qr.shipment.invoice_number.replace('/', '_')}_pkg_{package_qr.package_number}.png"
-            return send_file(qr_file_path, as_attachment=True, download_name=filename)
-        else:
-            flash('QR code file not found. Try regenerating the QR code.', 'error')
+        filename = f"qr_code_{package_qr.shipment.invoice_number.replace('/', '_')}_pkg_{package_qr.package_number}.{image_format}"
+        return package_qr_image_response(package_qr, image_format, download_name=filename)
             
     except Exception as e:
         current_app.logger.error(f"Error downloading QR code for package {package_id}: {str(e)}")
@@ -2109,6 +1678,68 @@ def download_qr_code(package_id):
     
     return redirect(url_for('main.qr_codes_management'))
 
+@main.route('/admin/qr-label-sheet')
+@main.route('/admin/qr-label-sheet/<int:shipment_id>')
+@login_required
+@admin_required
+def qr_label_sheet(shipment_id=None):
+    """Printable PDF label sheet of all package QR codes of one or more shipments
+    
+    Query parameters: shipment_ids=1,2,3 (instead of a shipment in the path),
+    page_size=a4|letter.
+    """
+    if shipment_id:
+        shipment_ids = [shipment_id]
+    else:
+        shipment_ids = [int(sid) for value in request.args.getlist('shipment_ids')
+                        for sid in value.split(',') if sid.strip().isdigit()]
+    page_size = request.args.get('page_size', 'a4').lower()
+    
+    if not shipment_ids or page_size not in LABEL_PAGE_SIZES:
+        flash('Select at least one shipment and a page size of A4 or Letter.', 'error')
+        return redirect(url_for('main.qr_codes_management'))
+    if not REPORTLAB_AVAILABLE:
+        flash('Label sheets need reportlab, which is not installed.', 'error')
+        return redirect(url_for('main.qr_codes_management'))
+    
+    # All packages with their shipment and attention person in one query
+    package_qrs = PackageQRCode.query.options(
+        joinedload(PackageQRCode.shipment), joinedload(PackageQRCode.attention_person)
+    ).filter(
+        PackageQRCode.shipment_id.in_(shipment_ids)
+    ).order_by(PackageQRCode.shipment_id, PackageQRCode.package_number).all()
+    
+    if not package_qrs:
+        flash('The selected shipments have no package QR codes.', 'error')
+        return redirect(url_for('main.qr_codes_management'))
+    
+    package_counts = Counter(package_qr.shipment_id for package_qr in package_qrs)
+    labels = [{
+        'tracking_url': package_qr.qr_code_url,
+        'tracking_code': package_qr.unique_code,
+        'package_number': package_qr.package_number,
+        'package_count': package_counts[package_qr.shipment_id],
+        'package_type': package_qr.get_package_type_display() if package_qr.package_type else '',
+        'attention_person': package_qr.attention_person.get_full_name() if package_qr.attention_person else '',
+        'invoice_number': package_qr.shipment.invoice_number,
+    } for package_qr in package_qrs]
+    
+    try:
+        output = io.BytesIO()
+        with stage_timer('qr_label_sheet', current_app.logger, labels=len(labels)):
+            write_label_sheet(labels, output, page_size)
+        output.seek(0)
+    except Exception as e:
+        current_app.logger.error(f"Error building QR label sheet for shipments {shipment_ids}: {str(e)}")
+        flash('Error occurred while building the label sheet.', 'error')
+        return redirect(url_for('main.qr_codes_management'))
+    
+    if len(shipment_ids) == 1:
+        filename = f"qr_labels_{package_qrs[0].shipment.invoice_number.replace('/', '_')}.pdf"
+    else:
+        filename = f"qr_labels_{len(package_counts)}_shipments.pdf"
+    return send_file(output, mimetype='application/pdf', as_attachment=True, download_name=filename)
+
 @main.route('/admin/qr-bulk-actions', methods=['POST'])
 @login_required
 @admin_required
@@ -2125,18 +1756,12 @@ def qr_bulk_actions():
     
     if action == 'regenerate':
         try:
-            qr_service = QRCodeService()
-            base_url = request.url_root.rstrip('/')
-            success_count = 0
-            
-            for package_id in package_ids:
-                package_qr = PackageQRCode.query.get(package_id)
-                if package_qr:
-                    updated = qr_service.regenerate_qr_code(package_qr, base_url)
-                    if updated:
-                        success_count += 1
-            
-            flash(f'Successfully regenerated {success_count} out of {len(package_ids)} QR codes.', 'success')
+            # Regenerate in the background - the status page reports progress
+            job = get_job_queue().enqueue('qr_regeneration', {
+                'package_ids': package_ids,
+                'base_url': request.url_root.rstrip('/')
+            }, user_id=current_user.id)
+            return redirect(url_for('main.document_job_status', job_id=job.id))
             
         except Exception as e:
             current_app.logger.error(f"Error in bulk QR regeneration: {str(e)}")
@@ -2258,6 +1883,7 @@ def admin_create_signing_authority():
     try:
         db.session.add(new_authority)
         db.session.commit()
+        invalidate_signing_authority_cache()
         flash(f'Signing Authority "{name}" created successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -2320,6 +1946,7 @@ def admin_update_signing_authority(authority_id):
 
     try:
         db.session.commit()
+        invalidate_signing_authority_cache()
         flash(f'Signing Authority "{authority.name}" updated successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -2341,6 +1968,7 @@ def admin_toggle_signing_authority(authority_id):
         authority.is_default = False
     
     db.session.commit()
+    invalidate_signing_authority_cache()
     
     status = 'activated' if authority.is_active else 'deactivated'
     flash(f'Signing Authority "{authority.name}" has been {status}', 'success')
@@ -2367,6 +1995,7 @@ def admin_delete_signing_authority(authority_id):
         # Delete the authority completely from database
         db.session.delete(authority)
         db.session.commit()
+        invalidate_signing_authority_cache()
         
         flash(f'Signing Authority "{authority_name}" has been permanently deleted!', 'success')
     except Exception as e:
@@ -2431,6 +2060,23 @@ def admin_acknowledge_shipment(shipment_id):
     flash(f'Shipment {shipment.invoice_number} acknowledged successfully! File Reference: {shipment.file_reference_number}', 'success')
     return redirect(url_for('main.dashboard'))
 
+def mark_documents_generated(shipment, commit=True):
+    """Admin document generation: set the status and auto-acknowledge the shipment"""
+    # Update status to document generated (or keep if already delivered)
+    if shipment.status != 'Delivered':
+        shipment.status = 'Document_Generated'
+    
+    # Auto-acknowledge if not already acknowledged
+    if not shipment.acknowledged_by:
+        shipment.acknowledged_by = current_user.id
+        shipment.acknowledged_at = datetime.now()
+        # Generate file reference number if not already generated
+        if not shipment.file_reference_number:
+            shipment.file_reference_number = generate_file_reference_number(shipment, current_user)
+    
+    if commit:
+        db.session.commit()
+
 @main.route('/admin/generate-document/<int:shipment_id>')
 @main.route('/admin/generate-document/<int:shipment_id>/<document_type>')
 @login_required
@@ -2448,19 +2094,7 @@ def admin_generate_document(shipment_id, document_type='invoice_packing'):
         # Parse the stored form data
         form_data = json.loads(shipment.form_data)
         
-        # Update status to document generated (or keep if already delivered)
-        if shipment.status != 'Delivered':
-            shipment.status = 'Document_Generated'
-        
-        # Auto-acknowledge if not already acknowledged
-        if not shipment.acknowledged_by:
-            shipment.acknowledged_by = current_user.id
-            shipment.acknowledged_at = datetime.now()
-            # Generate file reference number if not already generated
-            if not shipment.file_reference_number:
-                shipment.file_reference_number = generate_file_reference_number(shipment, current_user)
-        
-        db.session.commit()
+        mark_documents_generated(shipment)
         
         # Generate and return the document with specified type
         return generate_shipment_document(shipment, form_data, document_type)
@@ -2484,32 +2118,159 @@ def admin_generate_pdf(shipment_id, document_type):
         return redirect(url_for('main.dashboard'))
     
     try:
-        # Parse the stored form data
-        form_data = json.loads(shipment.form_data)
-        
-        # Update status to document generated (or keep if already delivered)
-        if shipment.status != 'Delivered':
-            shipment.status = 'Document_Generated'
+        mark_documents_generated(shipment)
         
-        # Auto-acknowledge if not already acknowledged
-        if not shipment.acknowledged_by:
-            shipment.acknowledged_by = current_user.id
-            shipment.acknowledged_at = datetime.now()
-            # Generate file reference number if not already generated
-            if not shipment.file_reference_number:
-                shipment.file_reference_number = generate_file_reference_number(shipment, current_user)
+        # Generate the PDF in the background - the client polls for the result
+        return enqueue_shipment_pdf(shipment, document_type)
         
+    except Exception as e:
+        shipment.status = 'Failed'
         db.session.commit()
+        flash(f'Error generating PDF: {str(e)}', 'error')
+        return redirect(url_for('main.dashboard'))
+
+@main.route('/admin/document-preview/<int:shipment_id>/<document_type>')
+@login_required
+@admin_required
+def admin_document_preview(shipment_id, document_type):
+    """Admin endpoint for a small image of the first page of a shipment document
+    
+    Lets the dashboard show what a document looks like without downloading it.
+    Query parameter format=png|webp (default webp).
+    """
+    shipment = Shipment.query.get_or_404(shipment_id)
+    
+    if document_type not in ['invoice_packing', 'custom_docs']:
+        return jsonify({'success': False, 'error': 'Unknown document type'}), 404
+    image_format = request.args.get('format', 'webp')
+    if image_format not in THUMBNAIL_FORMATS:
+        return jsonify({'success': False, 'error': 'Unsupported image format'}), 400
+    
+    try:
+        form_data = json.loads(shipment.form_data)
+        image, etag = build_shipment_thumbnail(shipment, form_data, document_type, image_format)
+    except Exception as e:
+        current_app.logger.error(f"Error generating preview for shipment {shipment_id}: {e}")
+        return jsonify({'success': False, 'error': 'Error generating preview'}), 500
+    
+    if image is None:
+        return jsonify({'success': False, 'error': 'Preview rendering is not available on this server'}), 503
+    
+    response = send_file(
+        image if isinstance(image, str) else io.BytesIO(image),
+        mimetype=THUMBNAIL_FORMATS[image_format][1],
+        etag=etag or False,
+        conditional=True
+    )
+    # Browsers revalidate with the ETag; unchanged previews come back as 304
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@main.route('/admin/generate-document-set/<int:shipment_id>')
+@login_required
+@admin_required
+def admin_generate_document_set(shipment_id):
+    """Admin endpoint to generate the invoice & packing list and the custom documents together
+    
+    Both documents are built in parallel worker processes. Query parameters:
+    format=docx|pdf, bundle=zip|merged (merged returns one PDF with both documents).
+    """
+    from .services.bulk_export import build_document_set, zip_documents
+    
+    shipment = Shipment.query.get_or_404(shipment_id)
+    output_format = 'pdf' if request.args.get('format') == 'pdf' else 'docx'
+    merge = output_format == 'pdf' and request.args.get('bundle') == 'merged'
+    
+    try:
+        mark_documents_generated(shipment)
         
-        # Generate and return the PDF document
-        return generate_shipment_document_pdf(shipment, form_data, document_type)
+        documents = build_document_set(
+            shipment.id,
+            output_format,
+            config_name=current_app.config.get('CONFIG_NAME'),
+            workers=current_app.config.get('BULK_EXPORT_WORKERS', 2)
+        )
+        base_name = documents[0][1].split('/')[0]
+        
+        if not merge:
+            return send_document(zip_documents(documents), 'application/zip', f"{base_name}_Documents.zip")
+        
+        # Invoice & packing list first, then the custom documents
+        work_dir = new_document_work_dir()
+        try:
+            pdf_paths = []
+            for document_type, _, data in documents:
+                pdf_path = os.path.join(work_dir, f'{document_type}.pdf')
+                with open(pdf_path, 'wb') as pdf_file:
+                    pdf_file.write(data)
+                pdf_paths.append(pdf_path)
+            
+            merged_path = os.path.join(work_dir, 'documents.pdf')
+            if not merge_pdfs(pdf_paths, merged_path):
+                raise RuntimeError('Could not merge the PDF documents')
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        
+        return send_document(merged_path, 'application/pdf', f"{base_name}_Documents.pdf", work_dir=work_dir)
         
     except Exception as e:
         shipment.status = 'Failed'
         db.session.commit()
-        flash(f'Error generating PDF: {str(e)}', 'error')
+        flash(f'Error generating documents: {str(e)}', 'error')
         return redirect(url_for('main.dashboard'))
 
+@main.route('/admin/bulk-export', methods=['POST'])
+@login_required
+@admin_required
+def admin_bulk_export():
+    """Admin endpoint to download the documents of several shipments as one ZIP"""
+    from .services.bulk_export import stream_documents_zip
+    
+    try:
+        shipment_ids = [int(sid) for sid in request.form.getlist('shipment_ids') if sid]
+    except (ValueError, TypeError):
+        flash('Invalid shipment IDs provided', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    if not shipment_ids:
+        flash('No shipments selected for export', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    document_type = request.form.get('document_type', 'all')
+    if document_type in ['invoice_packing', 'custom_docs']:
+        document_types = [document_type]
+    else:
+        document_types = ['invoice_packing', 'custom_docs']
+    
+    output_format = 'pdf' if request.form.get('format') == 'pdf' else 'docx'
+    
+    shipments = Shipment.query.filter(Shipment.id.in_(shipment_ids)).all()
+    if not shipments:
+        flash('No shipments found for export', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    # Same bookkeeping as generating each document individually
+    for shipment in shipments:
+        mark_documents_generated(shipment, commit=False)
+    db.session.commit()
+    
+    archive = stream_documents_zip(
+        [shipment.id for shipment in shipments],
+        document_types,
+        output_format,
+        config_name=current_app.config.get('CONFIG_NAME'),
+        workers=current_app.config.get('BULK_EXPORT_WORKERS', 2)
+    )
+    
+    filename = f"COMPASS_Documents_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return current_app.response_class(
+        archive,
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @main.route('/admin/add-comment', methods=['POST'])
 @login_required
 @admin_required
@@ -2765,43 +2526,31 @@ def admin_combine_form():
             print(f"DEBUG: Processing shipment {i+1}: {shipment.invoice_number}")
             
             form_data = json.loads(shipment.form_data) if shipment.form_data else {}
-            current_packages = int(form_data.get('total_packages', 0))
+            shipment_data = parse_shipment(form_data)
+            current_packages = shipment_data.total_packages
             print(f"DEBUG: Shipment {i+1} has {current_packages} packages")
             
             # Extract package and item data
-            for pkg_num in range(1, current_packages + 1):
-                new_pkg_num = total_packages + pkg_num
+            for package in shipment_data.packages:
+                new_pkg_num = total_packages + package.number
                 package_data = {
                     'package_number': new_pkg_num,
-                    'type': get_package_type_display_name(form_data.get(f'package_{pkg_num}_type', ''), form_data, pkg_num),
-                    'length': form_data.get(f'package_{pkg_num}_length', ''),
-                    'width': form_data.get(f'package_{pkg_num}_width', ''),
-                    'height': form_data.get(f'package_{pkg_num}_height', ''),
+                    'type': package.type_display,
+                    'length': package.length,
+                    'width': package.width,
+                    'height': package.height,
                     'item_list': [],  # Changed from 'items' to avoid conflict with dict.items()
                     'items_count': 0,  # Pre-calculated count
                     'source_shipment': shipment.invoice_number,
                     'source_user': f"{shipment.created_by_user.first_name} {shipment.created_by_user.last_name}"
                 }
                 
-                # Get items for this package
-                items_count = int(form_data.get(f'package_{pkg_num}_items_count', 0))
-                print(f"DEBUG: Package {pkg_num} has {items_count} items")
+                print(f"DEBUG: Package {package.number} has {len(package.items)} items")
                 
-                # Create items list
-                items_list = []
-                for item_num in range(1, items_count + 1):
-                    prefix = f'package_{pkg_num}_item_{item_num}'
-                    # Use original shipment's requester name as default for attn field
-                    original_requester = shipment.requester_name or 'Unknown'
-                    item_data = {
-                        'description': form_data.get(f'{prefix}_description', ''),
-                        'hsn_code': form_data.get(f'{prefix}_hsn_code', ''),
-                        'quantity': form_data.get(f'{prefix}_quantity', '1'),
-                        'unit_value': form_data.get(f'{prefix}_unit_value', '0'),
-                        'net_weight': form_data.get(f'{prefix}_net_weight', '0'),
-                        'requester': form_data.get(f'{prefix}_attn', original_requester)
-                    }
-                    items_list.append(item_data)
+                # Use original shipment's requester name as default for attn field
+                original_requester = shipment.requester_name or 'Unknown'
+                items_list = [combine_form_item(item, original_requester)
+                              for item in package.items]
                 
                 # Explicitly set the items as a list and count
                 package_data['item_list'] = items_list
@@ -3101,33 +2850,23 @@ def edit_shipment(shipment_id):
     if shipment.is_combined:
         # Prepare data structure similar to combine form
         combined_packages = []
-        total_packages = int(form_data.get('total_packages', 0))
+        shipment_data = parse_shipment(form_data)
+        total_packages = shipment_data.total_packages
         
-        for pkg_num in range(1, total_packages + 1):
+        for package in shipment_data.packages:
             package_data = {
-                'package_number': pkg_num,
-                'type': get_package_type_display_name(form_data.get(f'package_{pkg_num}_type', ''), form_data, pkg_num),
-                'length': form_data.get(f'package_{pkg_num}_length', ''),
-                'width': form_data.get(f'package_{pkg_num}_width', ''),
-                'height': form_data.get(f'package_{pkg_num}_height', ''),
+                'package_number': package.number,
+                'type': package.type_display,
+                'length': package.length,
+                'width': package.width,
+                'height': package.height,
                 'item_list': [],
                 'items_count': 0
             }
             
             # Get items for this package
-            items_count = int(form_data.get(f'package_{pkg_num}_items_count', 0))
-            items_list = []
-            for item_num in range(1, items_count + 1):
-                prefix = f'package_{pkg_num}_item_{item_num}'
-                item_data = {
-                    'description': form_data.get(f'{prefix}_description', ''),
-                    'hsn_code': form_data.get(f'{prefix}_hsn_code', ''),
-                    'quantity': form_data.get(f'{prefix}_quantity', '1'),
-                    'unit_value': form_data.get(f'{prefix}_unit_value', '0'),
-                    'net_weight': form_data.get(f'{prefix}_net_weight', '0'),
-                    'requester': form_data.get(f'{prefix}_attn', 'Unknown')
-                }
-                items_list.append(item_data)
+            items_list = [combine_form_item(item, 'Unknown')
+                          for item in package.items]
             
             package_data['item_list'] = items_list
             package_data['items_count'] = len(items_list)
@@ -3363,9 +3102,6 @@ def user_generate_pdf(shipment_id, document_type):
         return redirect(url_for('main.dashboard'))
     
     try:
-        # Parse the stored form data
-        form_data = json.loads(shipment.form_data)
-        
         # Update status to document generated if it's not already
         if shipment.status in ['Submitted', 'Acknowledged']:
             original_status = shipment.status
@@ -3376,13 +3112,70 @@ def user_generate_pdf(shipment_id, document_type):
                 shipment.acknowledged_at = datetime.now()
             db.session.commit()
         
-        # Generate and return the PDF document
-        return generate_shipment_document_pdf(shipment, form_data, document_type)
+        # Generate the PDF in the background - the client polls for the result
+        return enqueue_shipment_pdf(shipment, document_type)
         
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('main.dashboard'))
 
+def get_accessible_job(job_id):
+    """Get a background job if the current user may see it (its creator or an admin)"""
+    job = BackgroundJob.query.get(job_id)
+    if not job:
+        return None
+    if job.created_by != current_user.id and not current_user.is_admin():
+        return None
+    return job
+
+@main.route('/jobs/<job_id>')
+@login_required
+def document_job_status(job_id):
+    """Status page for a queued document; starts the download when it is ready"""
+    job = get_accessible_job(job_id)
+    if not job:
+        flash('Document job not found', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    return render_template('shipments/document_job.html', job=job)
+
+@main.route('/api/jobs/<job_id>')
+@login_required
+def document_job_api(job_id):
+    """Polling endpoint for a queued document"""
+    job = get_accessible_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = {'success': True, 'job': job.to_dict()}
+    if job.status == 'completed':
+        response['download_url'] = url_for('main.download_document_job', job_id=job.id)
+    return jsonify(response)
+
+@main.route('/jobs/<job_id>/download')
+@login_required
+def download_document_job(job_id):
+    """Download the artifact of a finished job"""
+    job = get_accessible_job(job_id)
+    if not job:
+        flash('Document job not found', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    if job.status != 'completed':
+        flash('The document is not ready yet', 'info')
+        return redirect(url_for('main.document_job_status', job_id=job.id))
+    
+    if job.is_expired() or not job.result_path or not os.path.exists(job.result_path):
+        flash('This document has expired, please generate it again', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    return send_file(
+        job.result_path,
+        mimetype=job.result_mimetype or 'application/octet-stream',
+        as_attachment=True,
+        download_name=job.result_filename
+    )
+
 @main.route('/admin/update-status/<int:shipment_id>/<new_status>')
 @login_required
 @admin_required
@@ -3503,33 +3296,14 @@ def weather_proxy():
 def get_next_serial_preview():
     """
     Get the next serial number for preview without consuming it.
-    Auto-optimizes counters if they're out of sync.
+    Read-only - use 'flask optimize-counters' to resync the counters.
     """
     try:
-        from compass.models import ShipmentSerialCounter, Shipment
-        
-        # Auto-optimize counter if needed
-        shipment_count = Shipment.query.count()
-        counter_record = ShipmentSerialCounter.query.first()
-        
-        if not counter_record:
-            # Initialize counter based on actual shipments
-            counter_record = ShipmentSerialCounter(counter=shipment_count)
-            db.session.add(counter_record)
-            db.session.commit()
-            next_serial = f"{shipment_count + 1:04d}"
-        elif counter_record.counter != shipment_count:
-            # Counter is out of sync - optimize it
-            counter_record.counter = shipment_count
-            db.session.commit()
-            next_serial = f"{shipment_count + 1:04d}"
-        else:
-            # Counter is in sync
-            next_serial = f"{counter_record.counter + 1:04d}"
+        from compass.models import ShipmentSerialCounter
         
         return jsonify({
             'success': True,
-            'next_serial': next_serial
+            'next_serial': ShipmentSerialCounter.peek_next_serial()
         })
         
     except Exception as e:
@@ -3561,29 +3335,21 @@ def generate_invoice_preview():
         
         # Get next serial number - this is a preview, so we show the next available number
         from compass.models import ShipmentSerialCounter, User
-        current_counter = ShipmentSerialCounter.query.first()
-        next_serial = f"{(current_counter.counter + 1) if current_counter else 1:04d}"
+        next_serial = ShipmentSerialCounter.peek_next_serial()
+        admin_unique_id = current_user.unique_id if current_user.unique_id else 'ADMIN'
         
         # Handle combined export for admin users
         if current_user.is_admin() and shipment_type == 'export' and package_user_assignments:
-            # Extract unique user IDs in order of first package assignment
-            unique_user_ids = []
-            seen_users = set()
-            
-            # Sort by package number to maintain order of first assignment
-            for package_num in sorted(package_user_assignments.keys(), key=int):
-                user_id = package_user_assignments[package_num]
-                if user_id and user_id not in seen_users:
-                    user = User.query.get(user_id)
-                    if user and user.unique_id:
-                        unique_user_ids.append(user.unique_id)
-                        seen_users.add(user_id)
+            # Unique user IDs in order of first package assignment
+            unique_user_ids = get_unique_ids(
+                package_user_assignments[package_num]
+                for package_num in sorted(package_user_assignments.keys(), key=int)
+            )
+            invoice_number = build_invoice_number(shipment_type, year, month, return_type,
+                                                  next_serial, unique_user_ids, admin_unique_id)
             
             # If multiple users detected, create combined export
             if len(unique_user_ids) > 1:
-                unique_ids_str = "/".join(unique_user_ids)
-                invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{return_type}/CMB/{unique_ids_str}/{next_serial}"
-                
                 return jsonify({
                     'success': True,
                     'invoice_number': invoice_number,
@@ -3594,14 +3360,11 @@ def generate_invoice_preview():
                 })
             elif len(unique_user_ids) == 1:
                 # Single user from package assignments
-                user_unique_id = unique_user_ids[0]
-                invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{return_type}/{user_unique_id}/{next_serial}"
-                
                 return jsonify({
                     'success': True,
                     'invoice_number': invoice_number,
                     'export_type': 'SINGLE',
-                    'unique_id': user_unique_id,
+                    'unique_id': unique_user_ids[0],
                     'serial_number': next_serial
                 })
         
@@ -3616,18 +3379,8 @@ def generate_invoice_preview():
             user_name = f"{current_user.first_name} {current_user.last_name}"
         
         # Generate invoice number based on shipment type with serial number
-        if shipment_type == 'export':
-            invoice_number = f"NCPOR/ARC/{year}/{month}/EXP/{return_type}/{user_unique_id}/{next_serial}"
-        elif shipment_type == 'import':
-            # Use new NCPOR/ARC pattern for import shipments with admin ID and requester ID
-            admin_id = current_user.unique_id if current_user.unique_id else 'ADMIN'
-            invoice_number = f"NCPOR/ARC/{year}/{month}/SAM/RT/{admin_id}/{user_unique_id}/{next_serial}"
-        elif shipment_type == 'reimport':
-            invoice_number = f"NCPOR/REIMP/{year}/{month}/{return_type}/{user_unique_id}/{next_serial}"
-        elif shipment_type == 'cold':
-            invoice_number = f"NCPOR/COLD/{year}/{month}/{user_unique_id}/{next_serial}"
-        else:
-            invoice_number = f"NCPOR/UNKNOWN/{year}/{month}/{return_type}/{user_unique_id}/{next_serial}"
+        invoice_number = build_invoice_number(shipment_type, year, month, return_type,
+                                              next_serial, [user_unique_id], admin_unique_id)
         
         return jsonify({
             'success': True,
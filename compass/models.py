@@ -1,9 +1,13 @@
+from flask import current_app, has_app_context
 from flask_login import UserMixin
 from datetime import datetime, timedelta
 import secrets
 import string
+import threading
+import time
 import pyotp
 import hashlib
+from sqlalchemy.exc import IntegrityError
 from . import db
 
 # Association table for many-to-many relationship between users and roles
@@ -462,6 +466,93 @@ class Shipment(db.Model):
     def __repr__(self):
         return f'<Shipment {self.invoice_number}>'
 
+# Counter values reserved in blocks by this process: model -> (next value, last reserved value)
+_counter_blocks = {}
+_counter_blocks_lock = threading.Lock()
+
+# Recently read counter values for previews: model -> (read at, next value)
+_counter_snapshots = {}
+
+def _reserve_counter_values(model, count, initial_value):
+    """
+    Atomically add count to a counter table and return its new value
+
+    The increment is a single UPDATE (with RETURNING where the database
+    supports it), so the database serializes concurrent callers on the row
+    lock and no two callers ever see the same value.
+
+    Args:
+        model: Counter model with an integer 'counter' column
+        count: How many values to reserve
+        initial_value: Callable giving the starting value if the counter row does not exist yet
+
+    Returns:
+        The last reserved value (the reserved values are new_value - count + 1 .. new_value)
+    """
+    table = model.__table__
+    for attempt in range(3):
+        row_id = db.session.query(db.func.min(table.c.id)).scalar()
+        if row_id is None:
+            # First use - create the row; a concurrent creator makes this insert fail
+            value = initial_value() + count
+            try:
+                db.session.execute(table.insert().values(id=1, counter=value))
+                db.session.commit()
+                _counter_snapshots.pop(model, None)
+                return value
+            except IntegrityError:
+                db.session.rollback()
+                continue
+
+        increment = table.update().where(table.c.id == row_id).values(counter=table.c.counter + count)
+        if db.engine.dialect.update_returning:
+            value = db.session.execute(increment.returning(table.c.counter)).scalar_one()
+        else:
+            # The UPDATE holds the row lock until the commit, so this read sees our own increment
+            db.session.execute(increment)
+            value = db.session.execute(db.select(table.c.counter).where(table.c.id == row_id)).scalar_one()
+        db.session.commit()
+        _counter_snapshots.pop(model, None)
+        return value
+
+    raise RuntimeError(f"Could not allocate a value from {model.__name__}")
+
+def _next_counter_value(model, initial_value=lambda: 0):
+    """
+    Get the next unique value of a counter
+
+    With COUNTER_BLOCK_SIZE above 1 each process reserves that many values at
+    once and hands them out locally, so most allocations need no database
+    write. Values are then unique but not strictly in creation order across
+    processes, and a restarted process leaves the rest of its block unused.
+    """
+    block_size = int(current_app.config.get('COUNTER_BLOCK_SIZE', 1)) if has_app_context() else 1
+    if block_size <= 1:
+        return _reserve_counter_values(model, 1, initial_value)
+
+    with _counter_blocks_lock:
+        next_value, last_value = _counter_blocks.get(model, (1, 0))
+        if next_value > last_value:
+            last_value = _reserve_counter_values(model, block_size, initial_value)
+            next_value = last_value - block_size + 1
+        _counter_blocks[model] = (next_value + 1, last_value)
+        return next_value
+
+def _set_counter_value(model, value):
+    """Set a counter to value, dropping any block this process still holds"""
+    counter_record = model.query.first()
+    if not counter_record:
+        counter_record = model(counter=value)
+        db.session.add(counter_record)
+    else:
+        counter_record.counter = value
+
+    db.session.commit()
+    _counter_snapshots.pop(model, None)
+    with _counter_blocks_lock:
+        _counter_blocks.pop(model, None)
+    return counter_record.counter
+
 class CombinedShipmentCounter(db.Model):
     """Model to track unique combined shipment numbers"""
     id = db.Column(db.Integer, primary_key=True)
@@ -470,32 +561,14 @@ class CombinedShipmentCounter(db.Model):
     @classmethod
     def get_next_number(cls):
         """Get the next unique combined shipment number"""
-        counter_record = cls.query.first()
-        if not counter_record:
-            counter_record = cls(counter=1)
-            db.session.add(counter_record)
-        else:
-            counter_record.counter += 1
-        
-        db.session.commit()
-        return counter_record.counter
+        return _next_counter_value(cls)
     
     @classmethod
     def reset_counter(cls):
         """Reset counter based on actual combined shipments in database"""
-        from . import db
         # Count actual combined shipments
         actual_count = db.session.query(Shipment).filter(Shipment.is_combined == True).count()
-        
-        counter_record = cls.query.first()
-        if not counter_record:
-            counter_record = cls(counter=actual_count)
-            db.session.add(counter_record)
-        else:
-            counter_record.counter = actual_count
-        
-        db.session.commit()
-        return counter_record.counter
+        return _set_counter_value(cls, actual_count)
 
 class ShipmentSerialCounter(db.Model):
     """Model to track unique shipment serial numbers"""
@@ -504,43 +577,51 @@ class ShipmentSerialCounter(db.Model):
     
     @classmethod
     def get_next_serial(cls):
-        """Get the next unique shipment serial number (4-digit format) with auto-optimization"""
-        from . import db
+        """Get the next unique shipment serial number (4-digit format)"""
+        # A new counter starts after the existing shipments; 'flask optimize-counters' resyncs it
+        serial = _next_counter_value(cls, initial_value=lambda: db.session.query(Shipment).count())
+        return f"{serial:04d}"  # Returns 4-digit format like 0001, 0002, etc.
+    
+    @classmethod
+    def peek_next_serial(cls):
+        """
+        Preview the next shipment serial number without allocating it
         
-        # Auto-optimize counter if needed
-        shipment_count = db.session.query(Shipment).count()
-        counter_record = cls.query.first()
+        Read-only: the value is read at most once per COUNTER_PREVIEW_TTL seconds
+        per process, so form previews never write to (or lock) the database.
+        The submitted shipment may get a later serial if others submit first.
         
-        if not counter_record:
-            # Initialize counter based on actual shipments
-            counter_record = cls(counter=shipment_count + 1)
-            db.session.add(counter_record)
-        elif counter_record.counter < shipment_count:
-            # Counter is behind - sync it
-            counter_record.counter = shipment_count + 1
-        else:
-            # Normal increment
-            counter_record.counter += 1
+        With COUNTER_BLOCK_SIZE above 1 the preview is the next value of the
+        block this process holds; once that block is used up it is the next
+        value of the shared counter. A submission handled by another process
+        gets a serial from that process's block instead.
+        """
+        with _counter_blocks_lock:
+            next_value, last_value = _counter_blocks.get(cls, (1, 0))
+        if next_value <= last_value:
+            return f"{next_value:04d}"
         
-        db.session.commit()
-        return f"{counter_record.counter:04d}"  # Returns 4-digit format like 0001, 0002, etc.
+        ttl = float(current_app.config.get('COUNTER_PREVIEW_TTL', 5)) if has_app_context() else 0
+        now = time.monotonic()
+        snapshot = _counter_snapshots.get(cls)
+        if snapshot and now - snapshot[0] < ttl:
+            return snapshot[1]
+        
+        current = db.session.query(cls.counter).order_by(cls.id).limit(1).scalar()
+        if current is None:
+            # No counter yet - the first allocation continues after the existing shipments
+            current = db.session.query(Shipment).count()
+        next_serial = f"{current + 1:04d}"
+        
+        _counter_snapshots[cls] = (now, next_serial)
+        return next_serial
     
     @classmethod
     def reset_counter(cls):
         """Reset counter based on actual shipments in database"""
-        from . import db
         # Count actual shipments
         actual_count = db.session.query(Shipment).count()
-        
-        counter_record = cls.query.first()
-        if not counter_record:
-            counter_record = cls(counter=actual_count)
-            db.session.add(counter_record)
-        else:
-            counter_record.counter = actual_count
-        
-        db.session.commit()
-        return counter_record.counter
+        return _set_counter_value(cls, actual_count)
 
 class FileReferenceCounter(db.Model):
     """Model to track unique file reference numbers"""
@@ -550,32 +631,15 @@ class FileReferenceCounter(db.Model):
     @classmethod
     def get_next_file_reference_serial(cls):
         """Get the next unique file reference serial number (4-digit format)"""
-        counter_record = cls.query.first()
-        if not counter_record:
-            counter_record = cls(counter=1)
-            db.session.add(counter_record)
-        else:
-            counter_record.counter += 1
-        
-        db.session.commit()
-        return f"{counter_record.counter:04d}"  # Returns 4-digit format like 0001, 0002, etc.
+        serial = _next_counter_value(cls)
+        return f"{serial:04d}"  # Returns 4-digit format like 0001, 0002, etc.
     
     @classmethod
     def reset_counter(cls):
         """Reset counter based on actual file references in database"""
-        from . import db
         # Count actual shipments with file reference numbers
         actual_count = db.session.query(Shipment).filter(Shipment.file_reference_number.isnot(None)).count()
-        
-        counter_record = cls.query.first()
-        if not counter_record:
-            counter_record = cls(counter=actual_count)
-            db.session.add(counter_record)
-        else:
-            counter_record.counter = actual_count
-        
-        db.session.commit()
-        return counter_record.counter
+        return _set_counter_value(cls, actual_count)
 
 class SigningAuthority(db.Model):
     """Model to store signing authority details for documents"""
@@ -800,14 +864,38 @@ class PackageQRCode(db.Model):
     @staticmethod
     def generate_unique_code():
         """Generate a unique 12-character alphanumeric tracking code"""
-        while True:
-            # Generate a 12-character code using letters and numbers for better uniqueness
-            chars = string.ascii_uppercase + string.digits
-            unique_code = ''.join(secrets.choice(chars) for _ in range(12))
+        return PackageQRCode.generate_unique_codes(1)[0]
+    
+    @staticmethod
+    def generate_unique_codes(count):
+        """
+        Generate several unique 12-character alphanumeric tracking codes at once
+        
+        All candidates are checked against the database with one IN query;
+        only the (astronomically rare) collisions are redrawn.
+        
+        Args:
+            count: Number of codes needed
             
-            # Check if this code already exists
-            if not PackageQRCode.query.filter_by(unique_code=unique_code).first():
-                return unique_code
+        Returns:
+            list: count distinct codes not used by any package yet
+        """
+        # Generate 12-character codes using letters and numbers for better uniqueness
+        chars = string.ascii_uppercase + string.digits
+        codes = []
+        while len(codes) < count:
+            candidates = set()
+            while len(candidates) < count - len(codes):
+                candidate = ''.join(secrets.choice(chars) for _ in range(12))
+                if candidate not in codes:
+                    candidates.add(candidate)
+            
+            # Check which of these codes already exist
+            taken = {code for (code,) in db.session.query(PackageQRCode.unique_code).filter(
+                PackageQRCode.unique_code.in_(candidates)
+            )}
+            codes.extend(candidates - taken)
+        return codes
     
     def get_tracking_url(self, base_url):
         """Generate the full tracking URL for this package"""
@@ -1052,4 +1140,58 @@ class SMTPConfiguration(db.Model):
             return False, f"Failed to send test email: {str(e)}"
     
     def __repr__(self):
-        return f'<SMTPConfiguration {self.name}>'
\ No newline at end of file
+        return f'<SMTPConfiguration {self.name}>'
+
+class BackgroundJob(db.Model):
+    """Model to track long-running work (e.g. PDF generation) handed to the job queue"""
+    id = db.Column(db.String(32), primary_key=True, default=lambda: secrets.token_hex(16))
+    job_type = db.Column(db.String(50), nullable=False)  # Registered handler name, e.g. shipment_pdf
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON encoded handler arguments
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    
+    # Result artifact
+    result_path = db.Column(db.String(500), nullable=True)  # File on local disk
+    result_filename = db.Column(db.String(255), nullable=True)  # Download name
+    result_mimetype = db.Column(db.String(100), nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # Job and artifact are removed after this
+    
+    # Relationship
+    creator = db.relationship('User', backref='background_jobs')
+    
+    def get_payload(self):
+        """Decode the JSON payload"""
+        import json
+        return json.loads(self.payload or '{}')
+    
+    def is_finished(self):
+        return self.status in ['completed', 'failed']
+    
+    def is_expired(self):
+        return self.expires_at is not None and datetime.utcnow() > self.expires_at
+    
+    def to_dict(self):
+        """Status information for the polling endpoint"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'error': self.error_message,
+            'filename': self.result_filename,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type} {self.status}>'
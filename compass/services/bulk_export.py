@@ -0,0 +1,248 @@
+"""
+Bulk document export for COMPASS
+
+Generates the documents for many shipments on a pool of worker processes and
+streams them back as one ZIP archive in the order they finish. Each worker
+process builds its own app once (so templates are parsed once per process)
+and the archive is written to a non-seekable stream, so only the documents
+that have not been sent yet are ever held in memory. The same workers build
+the document set of a single shipment (both document types side by side).
+
+Each worker converts one document at a time, so it keeps a single warm
+LibreOffice process: an app worker runs at most BULK_EXPORT_WORKERS +
+PDF_CONVERTER_WORKERS soffice processes. A pool whose worker process died
+(crash, OOM kill) is replaced and the unfinished documents are resubmitted
+once.
+"""
+import io
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, List, Tuple
+
+DOCUMENT_TYPE_LABELS = {
+    'invoice_packing': 'Invoice_Packing_List',
+    'custom_docs': 'Custom_Docs',
+}
+
+# App used by the current worker process (set by the pool initializer)
+_worker_app = None
+
+def _init_export_worker(config_name):
+    """Process pool initializer: build the app once per worker process"""
+    global _worker_app
+    from .. import create_app
+    from .pdf_converter import configure_converter_pool
+    _worker_app = create_app(config_name)
+    # One document at a time per worker - more warm LibreOffice processes would sit idle
+    configure_converter_pool(workers=1)
+
+def _export_document(shipment_id: int, document_type: str, output_format: str):
+    """
+    Build one document in a worker process
+
+    Returns:
+        (shipment_id, document_type, archive_name, data, error)
+    """
+    from ..models import Shipment, db
+    from ..main import build_shipment_docx, build_shipment_pdf
+
+    with _worker_app.app_context():
+        try:
+            shipment = Shipment.query.get(shipment_id)
+            if not shipment:
+                return shipment_id, document_type, None, None, 'Shipment not found'
+
+            form_data = json.loads(shipment.form_data)
+            build = build_shipment_pdf if output_format == 'pdf' else build_shipment_docx
+            document, filename, _, work_dir = build(shipment, form_data, document_type)
+
+            if isinstance(document, str):
+                try:
+                    with open(document, 'rb') as f:
+                        document = f.read()
+                finally:
+                    if work_dir:
+                        shutil.rmtree(work_dir, ignore_errors=True)
+
+            # One folder per shipment; both document types share a base filename
+            folder = re.sub(r'[^A-Za-z0-9_-]+', '_', shipment.invoice_number or f'shipment_{shipment.id}')
+            archive_name = f"{folder}/{DOCUMENT_TYPE_LABELS[document_type]}_{filename}"
+            return shipment_id, document_type, archive_name, document, None
+
+        except Exception as e:
+            logging.error(f"Bulk export failed for shipment {shipment_id} ({document_type}): {e}")
+            return shipment_id, document_type, None, None, str(e)
+        finally:
+            db.session.remove()
+
+class _ZipStream:
+    """Write-only, non-seekable file object that hands out what was written so far"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_export_pool(config_name, workers) -> ProcessPoolExecutor:
+    """Get the process-wide export pool, creating it on first use (and after a fork or a worker crash)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or getattr(_pool, '_broken', False):
+            # Spawn rather than fork: the web process runs threads (job queue,
+            # converter watchdogs) that must not be copied mid-operation
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_export_worker,
+                initargs=(config_name,)
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def _discard_export_pool(pool: ProcessPoolExecutor):
+    """Shut down a broken pool so the next get_export_pool() starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _run_export_tasks(tasks: List[Tuple[int, str]], output_format: str, config_name: str,
+                      workers: int) -> Iterator[Tuple]:
+    """
+    Run export tasks on the pool and yield their results as they finish
+
+    If a worker process dies the pool is replaced and the tasks without a
+    result are submitted once more; tasks that still fail are reported as
+    errors rather than raising.
+    """
+    pending = list(tasks)
+    for attempt in range(2):
+        pool = get_export_pool(config_name, workers)
+        futures = {pool.submit(_export_document, shipment_id, document_type, output_format): (shipment_id, document_type)
+                   for shipment_id, document_type in pending}
+        finished = set()
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                finished.add(futures[future])
+                yield result
+            return
+        except BrokenProcessPool:
+            logging.error("A bulk export worker process died, restarting the export pool")
+            _discard_export_pool(pool)
+            pending = [task for task in pending if task not in finished]
+        finally:
+            # Client went away (or the pool broke) - don't keep generating documents nobody will receive
+            for future in futures:
+                future.cancel()
+
+    for shipment_id, document_type in pending:
+        yield shipment_id, document_type, None, None, 'Export worker process died'
+
+def stream_documents_zip(shipment_ids: Iterable[int], document_types: Iterable[str], output_format: str = 'docx',
+                         config_name: str = None, workers: int = 2) -> Iterator[bytes]:
+    """
+    Generate documents for several shipments in parallel and stream them as a ZIP
+
+    Args:
+        shipment_ids: Shipments to export
+        document_types: Any of 'invoice_packing' and 'custom_docs'
+        output_format: 'docx' or 'pdf'
+        config_name: App configuration the worker processes are built with
+        workers: Size of the worker process pool
+
+    Yields:
+        Chunks of the ZIP archive
+    """
+    tasks: List[Tuple[int, str]] = [(shipment_id, document_type)
+                                    for shipment_id in shipment_ids
+                                    for document_type in document_types]
+
+    stream = _ZipStream()
+    errors = []
+    results = _run_export_tasks(tasks, output_format, config_name, workers)
+    try:
+        # DOCX and PDF files are already compressed, storing them is much cheaper
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for shipment_id, document_type, archive_name, data, error in results:
+                if error:
+                    errors.append(f"Shipment {shipment_id} ({document_type}): {error}")
+                    continue
+
+                archive.writestr(archive_name, data)
+                yield stream.pop()
+
+            if errors:
+                archive.writestr('ERRORS.txt', '\n'.join(errors) + '\n')
+        yield stream.pop()
+    finally:
+        results.close()
+
+def build_document_set(shipment_id: int, output_format: str = 'docx', config_name: str = None,
+                       workers: int = 2) -> List[Tuple[str, str, bytes]]:
+    """
+    Generate both document types of one shipment in parallel
+
+    The invoice & packing list and the custom documents are rendered (and,
+    for PDFs, converted) on separate worker processes at the same time.
+
+    Args:
+        shipment_id: Shipment to generate the documents for
+        output_format: 'docx' or 'pdf'
+        config_name: App configuration the worker processes are built with
+        workers: Size of the worker process pool
+
+    Returns:
+        List of (document_type, archive_name, data) in DOCUMENT_TYPE_LABELS order
+
+    Raises:
+        RuntimeError: If any of the documents could not be generated
+    """
+    tasks = [(shipment_id, document_type) for document_type in DOCUMENT_TYPE_LABELS]
+    results = {document_type: (archive_name, data, error)
+               for _, document_type, archive_name, data, error
+               in _run_export_tasks(tasks, output_format, config_name, workers)}
+
+    documents = []
+    errors = []
+    for document_type in DOCUMENT_TYPE_LABELS:
+        archive_name, data, error = results[document_type]
+        if error:
+            errors.append(f"{DOCUMENT_TYPE_LABELS[document_type]}: {error}")
+        else:
+            documents.append((document_type, archive_name, data))
+
+    if errors:
+        raise RuntimeError('; '.join(errors))
+    return documents
+
+def zip_documents(documents: List[Tuple[str, str, bytes]]) -> bytes:
+    """Pack (document_type, archive_name, data) entries into one ZIP archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for _, archive_name, data in documents:
+            archive.writestr(archive_name, data)
+    return buffer.getvalue()
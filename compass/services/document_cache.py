@@ -0,0 +1,190 @@
+"""
+Content-addressed cache of generated shipment documents
+
+Generated DOCX/PDF bytes are stored on local disk under a key that hashes
+everything that goes into the document (template file, rendered context,
+form data, document type and output format). Editing a shipment or its
+signing authority changes the key, so stale entries are simply never hit
+again and age out through size-bounded LRU eviction.
+"""
+import os
+import json
+import hashlib
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+from flask import current_app
+
+from ..utils.timing import timed_stage
+
+# Bump when the rendering pipeline changes in a way that alters output
+CACHE_VERSION = 1
+
+# (path, mtime, size) -> sha256 of the template file
+_file_digests = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file, memoized on its mtime and size"""
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime, stat.st_size)
+
+    with _digest_lock:
+        digest = _file_digests.get(memo_key)
+    if digest:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _digest_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+def document_cache_key(template_path, context, form_data, document_type, output_format, **extra) -> str:
+    """
+    Build the cache key for a generated document
+
+    Args:
+        template_path: DOCX template the document is rendered from
+        context: Full template context (invoice number, file reference number,
+                 signing authority fields, dates, ...)
+        form_data: Shipment form data dictionary
+        document_type: 'invoice_packing' or 'custom_docs'
+        output_format: 'docx' or 'pdf'
+        **extra: Any other inputs that change the output (e.g. appendices)
+
+    Returns:
+        Hex digest identifying the document content
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'template': file_digest(template_path),
+        'context': context,
+        'form_data': form_data,
+        'document_type': document_type,
+        'format': output_format,
+        'extra': extra,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class DocumentCache:
+    """Size-bounded LRU cache of document files on local disk"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get(self, key: str, extension: str) -> Optional[str]:
+        """
+        Look up a cached document
+
+        Returns:
+            Path to the cached file, or None on a miss
+        """
+        path = self.path_for(key, extension)
+        try:
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+            return path
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"Document cache lookup failed for {path}: {e}")
+            return None
+
+    def put(self, key: str, extension: str, data: bytes) -> Optional[str]:
+        """
+        Store a document; the write is atomic so readers never see partial files
+
+        Returns:
+            Path to the cached file, or None if it could not be written
+        """
+        def write(temp_path):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+        return self._store(key, extension, write)
+
+    def put_file(self, key: str, extension: str, source_path: str) -> Optional[str]:
+        """
+        Move a finished document file into the cache without reading it into memory
+
+        Returns:
+            Path to the cached file, or None if it could not be stored (the
+            source file is left in place in that case)
+        """
+        return self._store(key, extension, lambda temp_path: shutil.move(source_path, temp_path))
+
+    def _store(self, key: str, extension: str, write) -> Optional[str]:
+        path = self.path_for(key, extension)
+        temp_path = None
+        try:
+            with timed_stage('cache_store'):
+                fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                os.close(fd)
+                write(temp_path)
+                os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"Could not write document cache entry {path}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: str = None):
+        """Remove least recently used entries until the cache fits in max_bytes
+
+        Args:
+            keep: Entry that must survive (the one just written and about to be served)
+        """
+        try:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.name.endswith('.tmp') or entry.path == keep:
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                if total <= self.max_bytes:
+                    break
+        except OSError as e:
+            logging.error(f"Document cache eviction failed: {e}")
+
+def get_document_cache() -> Optional[DocumentCache]:
+    """Get the document cache for the current app, or None if caching is disabled"""
+    if not current_app.config.get('DOCUMENT_CACHE_ENABLED', True):
+        return None
+
+    cache = current_app.extensions.get('document_cache')
+    if cache is None:
+        cache_dir = current_app.config.get('DOCUMENT_CACHE_DIR') or \
+            os.path.join(current_app.instance_path, 'document_cache')
+        max_bytes = int(current_app.config.get('DOCUMENT_CACHE_MAX_MB', 500)) * 1024 * 1024
+        cache = DocumentCache(cache_dir, max_bytes)
+        current_app.extensions['document_cache'] = cache
+    return cache
@@ -0,0 +1,267 @@
+"""
+Template context for generated shipment documents
+
+The DOCX and PDF builds fill the same templates, so they share one context
+builder. The signing authority part of the context changes only when an
+admin edits the authorities, so it is memoized per process (and dropped by
+the signing authority admin routes); the finished context is memoized for
+the rest of the request, so building both document types of a shipment
+queries and assembles it only once.
+"""
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from flask import current_app, g, has_app_context
+
+from ..models import SigningAuthority
+from ..utils.timing import timed_stage
+
+DECLARATION = "We declare that the invoice shows the actual price of goods described and that all particulars are true and correct."
+
+# Signing authority ID (or 'default') -> (loaded at, context)
+_signing_authority_contexts = {}
+_signing_authority_lock = threading.Lock()
+
+def _signing_authority_fields(signing_authority):
+    """Template placeholders for a signing authority (empty values if None)"""
+    if not signing_authority:
+        return {
+            'signing_authority_name': '',
+            'signing_authority_designation': '',
+            'singing_authority_department': '',
+            'signing_authority_organisation': '',
+            'signing_authority_contact_number': '',
+            'signing_authority_contact_fax': '',
+            'signing_authority_email': '',
+            # Hindi placeholders
+            'signing_authority_name_hindi': '',
+            'signing_authority_designation_hindi': '',
+            'signing_authority_department_hindi': ''
+        }
+
+    return {
+        'signing_authority_name': signing_authority.name,
+        'signing_authority_designation': signing_authority.designation,
+        'singing_authority_department': signing_authority.department,  # Note: matches user's typo in placeholder
+        'signing_authority_organisation': signing_authority.organisation,
+        'signing_authority_contact_number': signing_authority.contact_number or '',
+        'signing_authority_contact_fax': signing_authority.contact_fax or '',
+        'signing_authority_email': signing_authority.email or '',
+        # Hindi placeholders
+        'signing_authority_name_hindi': signing_authority.name_hindi or '',
+        'signing_authority_designation_hindi': signing_authority.designation_hindi or '',
+        'signing_authority_department_hindi': signing_authority.department_hindi or ''
+    }
+
+def get_signing_authority_context(signing_authority_id=None):
+    """
+    Get the signing authority placeholders for document generation
+
+    Args:
+        signing_authority_id: Authority assigned to the shipment, or None for the
+                              default active authority
+
+    Returns:
+        Dictionary of signing authority placeholders (a copy the caller may modify)
+    """
+    cache_key = signing_authority_id or 'default'
+    # Other worker processes only see an admin change once their entry expires
+    ttl = float(current_app.config.get('SIGNING_AUTHORITY_CACHE_TTL', 60))
+
+    with _signing_authority_lock:
+        cached = _signing_authority_contexts.get(cache_key)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return dict(cached[1])
+
+    if signing_authority_id:
+        signing_authority = SigningAuthority.query.get(signing_authority_id)
+    else:
+        # Get default signing authority if none assigned
+        signing_authority = SigningAuthority.query.filter_by(is_default=True, is_active=True).first()
+
+    context = _signing_authority_fields(signing_authority)
+    with _signing_authority_lock:
+        _signing_authority_contexts[cache_key] = (time.monotonic(), context)
+    return dict(context)
+
+def invalidate_signing_authority_cache():
+    """Forget the memoized signing authority placeholders (after an admin change)"""
+    with _signing_authority_lock:
+        _signing_authority_contexts.clear()
+
+def get_aggregated_sample_types(shipment_data):
+    """
+    Extract and aggregate sample types from the parsed shipment.
+    Returns a formatted string of unique sample types.
+    """
+    # Sorted list for consistent output
+    sorted_types = shipment_data.sample_types
+    
+    if not sorted_types:
+        return "samples"
+    elif len(sorted_types) == 1:
+        return f"{sorted_types[0]} samples"
+    else:
+        # Join with "and" for the last item
+        if len(sorted_types) == 2:
+            return f"{sorted_types[0]} and {sorted_types[1]} samples"
+        else:
+            return f"{', '.join(sorted_types[:-1])}, and {sorted_types[-1]} samples"
+
+def _export_context(shipment, form_data):
+    # Check if "other" consignee was selected
+    consignee_selection = form_data.get('consignee', 'himadri')  # Default to himadri
+
+    if consignee_selection == 'other':
+        # Use other consignee details
+        consignee_name = form_data.get('other_consignee_org', 'Other Organization')
+        consignee_address = form_data.get('other_consignee_address', 'Other Address')
+        consignee_contact = form_data.get('other_consignee_contact', 'Other Contact')
+        consignee_phone = form_data.get('other_consignee_phone', 'Other Phone')
+    else:
+        # Use default Himadri details
+        consignee_name = "Himadri - Indian Arctic Research Station C/O Kingsbay AS"
+        consignee_address = "N-9173 Ny-Alesund, Norway"
+        consignee_contact = "Kingsbay AS, Longyearbyen"
+        consignee_phone = "+47 79 027200"
+
+    # For export shipments NCPOR is the exporter (sending samples from India to Norway)
+    return {
+        'ncpor_gst': "30AACFN4991P1ZN",
+        'ncpor_lut': "AD300618000016R",
+        'exporter_name': "National Center for Polar and Ocean Research (NCPOR) [erstwhite NCAOR]",
+        'exporter_ministry': "Ministry of Earth Sciences (Govt. of India)",
+        'exporter_address': "Headland Sada, Vasco da Gama, Goa - 403804",
+        'exporter_country': "India",
+        'exporter_location': "India",
+        'exporter_phone': "+91 832 2525501",
+        'exporter_gst': "30AACFN4991P1ZN",
+        'exporter_lut': "AD300618000016R",
+        'consignee_name': consignee_name,
+        'consignee_address': consignee_address,
+        'consignee_contact': consignee_contact,
+        'consignee_phone': consignee_phone,
+        'destination_country': form_data.get('destination_country', 'NORWAY'),
+        'country_of_origin_goods': form_data.get('country_of_origin', 'India'),
+        'country_of_final_destination': form_data.get('country_of_final_destination', 'Norway'),
+        'airport_of_loading': form_data.get('airport_loading', 'MUMBAI'),
+        'mode_of_transport': form_data.get('mode_of_transport', 'Air'),
+        'transport_facility_type': 'Air Port' if form_data.get('mode_of_transport', 'Air') == 'Air' else 'Port',
+        'port_of_loading': form_data.get('port_of_loading', ''),
+        'port_of_discharge': form_data.get('port_of_discharge', ''),
+        'return_type': form_data.get('return_type', ''),
+    }
+
+def _import_context(shipment, form_data):
+    # Check if "other" consignee was selected
+    consignee_selection = form_data.get('consignee', 'ncpor')  # Default to ncpor for import/reimport
+    other = lambda key: form_data.get(key, '') if consignee_selection == 'other' else ""
+
+    # Standard consignee placeholders ALWAYS contain NCPOR details for imports
+    return {
+        'ncpor_gst': "30AACFN4991P1ZN",
+        'ncpor_lut': "AD300618000016R",
+        'exporter_name': "Himadri - Indian Arctic Research Station",
+        'exporter_org': "HIMADRI-Indian Arctic Research Station",
+        'exporter_address': "Ny-Alesund, c/o Kings Bay AS",
+        'exporter_location': "N-9173, Ny-Alesund, Norway",
+        'exporter_phone': "+47 79 02 72 00",
+        'consignee_name': "National Center for Polar and Ocean Research (NCPOR) [erstwhite NCAOR]",
+        'consignee_ministry': "Ministry of Earth Sciences (Govt. of India)",
+        'consignee_address': "Headland Sada, Vasco da Gama, Goa - 403804",
+        'consignee_location': "India",
+        'consignee_phone': "9274584406",
+        'consignee_gst': "30AACFN4991P1ZN",
+        'consignee_lut': "AD300618000016R",
+        'consignee_contact': "Dr. Rohit Srivastava",
+        'consigner_name': "Himadri - Indian Arctic Research Station C/O Kingsbay AS",
+        'consigner_address': "N-9173 Ny-Alesund, Norway",
+        'consigner_contact': "Kingsbay AS, Longyearbyen",
+        'consigner_phone': "+47 79 027200",
+        'destination_country': 'INDIA',
+        'country_of_origin_goods': form_data.get('country_of_origin', 'Norway'),
+        'country_of_final_destination': form_data.get('country_of_final_destination', 'India'),
+        'final_destination': form_data.get('final_destination', ''),
+        'airport_of_loading': form_data.get('import_mode', 'AIR').upper(),
+        'mode_of_transport': form_data.get('mode_of_transport', 'Air'),
+        'transport_facility_type': 'Air Port' if form_data.get('mode_of_transport', 'Air') == 'Air' else 'Port',
+        'port_of_loading': form_data.get('port_of_loading', ''),
+        'port_of_discharge': form_data.get('port_of_discharge', ''),
+        'import_purpose': form_data.get('import_purpose', 'RESEARCH'),
+
+        # Other Organization Details (populated when "other" consignee is selected)
+        'other_org_name': other('other_consignee_org'),
+        'other_org_ministry': other('other_consignee_ministry'),
+        'other_org_address': other('other_consignee_address'),
+        'other_org_location': other('other_consignee_country'),
+        'other_org_phone': other('other_consignee_phone'),
+        'other_org_gst': other('other_consignee_gst'),
+        'other_org_lut': other('other_consignee_lut'),
+        'other_org_contact': other('other_consignee_contact'),
+        'other_org_designation': other('other_consignee_designation'),
+        'other_org_email': other('other_consignee_email'),
+    }
+
+def _cold_context(shipment, form_data):
+    return {
+        'total_boxes': form_data.get('total_boxes', '0'),
+    }
+
+def _build_document_context(shipment, form_data, shipment_data):
+    context = {
+        'invoice_no': shipment.invoice_number,
+        'invoice_date': datetime.now().strftime('%d-%m-%Y'),
+        'file_reference_number': shipment.file_reference_number or '',
+        'Sample_Type': get_aggregated_sample_types(shipment_data),
+        'requester_name': form_data.get('requester_name', ''),
+        'expedition_year': form_data.get('expedition_year', ''),
+        'batch_number': form_data.get('batch_number', ''),
+        'purpose': "RESEARCH AND DEVELOPMENT",
+        'declaration': DECLARATION,
+    }
+
+    # Add shipment type specific details
+    if shipment.shipment_type == 'export':
+        context.update(_export_context(shipment, form_data))
+    elif shipment.shipment_type in ['import', 'reimport']:
+        context.update(_import_context(shipment, form_data))
+    else:  # cold
+        context.update(_cold_context(shipment, form_data))
+
+    # Add signing authority details
+    context.update(get_signing_authority_context(shipment.signing_authority_id))
+    return context
+
+def get_document_context(shipment, form_data, shipment_data):
+    """
+    Get the template context for a shipment's documents
+
+    The context is memoized for the current request/app context, keyed on the
+    shipment, its signing authority and the form data, so the DOCX and PDF
+    builds of the same shipment share it.
+
+    Args:
+        shipment: Shipment object
+        form_data: Form data dictionary
+        shipment_data: ParsedShipment of form_data
+
+    Returns:
+        Context dictionary for the document templates (a copy the caller may modify)
+    """
+    if not has_app_context():
+        return _build_document_context(shipment, form_data, shipment_data)
+
+    form_digest = hashlib.sha256(json.dumps(form_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    memo_key = (shipment.id, shipment.shipment_type, shipment.invoice_number,
+                shipment.signing_authority_id, form_digest)
+
+    contexts = g.setdefault('document_contexts', {})
+    context = contexts.get(memo_key)
+    if context is None:
+        with timed_stage('context'):
+            context = _build_document_context(shipment, form_data, shipment_data)
+        contexts[memo_key] = context
+    return dict(context)
@@ -0,0 +1,238 @@
+"""
+Background job queue for COMPASS
+
+Slow work such as PDF generation is recorded as a BackgroundJob row and run on
+a small bounded thread pool inside an app context, so HTTP workers can return
+immediately. Jobs are claimed with a conditional UPDATE, which keeps a job from
+running twice when it is resubmitted (retries, recovery after a restart).
+Failed jobs are retried with a growing delay up to ``max_attempts``; finished
+jobs and their artifacts are deleted once they expire.
+"""
+import os
+import json
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from flask import current_app
+
+from ..models import BackgroundJob, db
+
+# job_type -> handler(job) returning (result_path, download_name, mimetype)
+_handlers: Dict[str, Callable] = {}
+_queue_lock = threading.Lock()
+
+def job_handler(job_type: str):
+    """Register a function as the handler for a job type"""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+class JobQueue:
+    """Bounded thread pool running BackgroundJob rows for one app"""
+
+    def __init__(self, app, workers=2, max_attempts=3, retry_delay=5, result_ttl_hours=24, results_dir=None):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay = retry_delay
+        self.result_ttl = timedelta(hours=result_ttl_hours)
+        self.results_dir = results_dir or os.path.join(app.instance_path, 'job_results')
+        self.pid = os.getpid()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='compass-job')
+        self._last_cleanup = None
+        self._cleanup_lock = threading.Lock()
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    def enqueue(self, job_type: str, payload: dict, user_id: Optional[int] = None) -> BackgroundJob:
+        """
+        Record a new job and hand it to the pool
+
+        Args:
+            job_type: Registered handler name
+            payload: JSON serializable handler arguments
+            user_id: User the job belongs to (only they and admins may see it)
+
+        Returns:
+            The queued BackgroundJob
+        """
+        if job_type not in _handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+
+        job = BackgroundJob(
+            job_type=job_type,
+            payload=json.dumps(payload),
+            max_attempts=self.max_attempts,
+            created_by=user_id,
+            expires_at=datetime.utcnow() + self.result_ttl
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.submit(job.id)
+        self.cleanup_expired()
+        return job
+
+    def submit(self, job_id: str, delay: float = 0):
+        """Schedule a queued job on the pool, optionally after a delay"""
+        if delay:
+            timer = threading.Timer(delay, self.submit, args=[job_id])
+            timer.daemon = True
+            timer.start()
+            return
+        self.executor.submit(self._run, job_id)
+
+    def result_path(self, job: BackgroundJob, extension: str) -> str:
+        """Where a handler should write the artifact for a job"""
+        return os.path.join(self.results_dir, f"{job.id}.{extension}")
+
+    def set_progress(self, job: BackgroundJob, progress: int):
+        """Record handler progress (0-100) so pollers can show it"""
+        job.progress = max(0, min(100, int(progress)))
+        db.session.commit()
+
+    def _claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running; False if someone else has it"""
+        claimed = BackgroundJob.query.filter_by(id=job_id, status='queued').update({
+            'status': 'running',
+            'attempts': BackgroundJob.attempts + 1,
+            'started_at': datetime.utcnow(),
+            'error_message': None
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_id: str):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+
+                job = BackgroundJob.query.get(job_id)
+                handler = _handlers[job.job_type]
+
+                try:
+                    result_path, filename, mimetype = handler(job)
+                except Exception as e:
+                    db.session.rollback()
+                    self._handle_failure(job_id, e)
+                    return
+
+                job.status = 'completed'
+                job.progress = 100
+                job.result_path = result_path
+                job.result_filename = filename
+                job.result_mimetype = mimetype
+                job.finished_at = datetime.utcnow()
+                job.expires_at = job.finished_at + self.result_ttl
+                db.session.commit()
+                logging.info(f"Background job {job_id} ({job.job_type}) completed")
+
+            except Exception as e:
+                # Problems talking to the database itself - nothing more we can do here
+                logging.error(f"Background job {job_id} crashed: {e}")
+                db.session.rollback()
+
+    def _handle_failure(self, job_id: str, error: Exception):
+        job = BackgroundJob.query.get(job_id)
+        logging.error(f"Background job {job_id} ({job.job_type}) failed on attempt {job.attempts}: {error}")
+        logging.debug(traceback.format_exc())
+
+        job.error_message = str(error)
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            db.session.commit()
+            self.submit(job_id, delay=self.retry_delay * job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + self.result_ttl
+            db.session.commit()
+
+    def recover_jobs(self, stale_after_minutes: int = 30) -> int:
+        """
+        Resubmit jobs left behind by a previous process (e.g. after a restart)
+
+        Returns:
+            Number of jobs resubmitted
+        """
+        stale_before = datetime.utcnow() - timedelta(minutes=stale_after_minutes)
+        BackgroundJob.query.filter(
+            BackgroundJob.status == 'running',
+            BackgroundJob.started_at < stale_before
+        ).update({'status': 'queued'}, synchronize_session=False)
+        db.session.commit()
+
+        job_ids = [job_id for (job_id,) in db.session.query(BackgroundJob.id).filter_by(status='queued').all()]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def cleanup_expired(self, min_interval_minutes: int = 10) -> int:
+        """
+        Delete expired jobs and their artifacts (at most once per interval)
+
+        Returns:
+            Number of jobs removed
+        """
+        now = datetime.utcnow()
+        with self._cleanup_lock:
+            if self._last_cleanup and now - self._last_cleanup < timedelta(minutes=min_interval_minutes):
+                return 0
+            self._last_cleanup = now
+
+        try:
+            expired = BackgroundJob.query.filter(
+                BackgroundJob.expires_at < now,
+                BackgroundJob.status != 'running'
+            ).all()
+            for job in expired:
+                if job.result_path and os.path.exists(job.result_path):
+                    os.remove(job.result_path)
+                db.session.delete(job)
+            db.session.commit()
+            if expired:
+                logging.info(f"Removed {len(expired)} expired background jobs")
+            return len(expired)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error cleaning up expired background jobs: {e}")
+            return 0
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
+
+def get_job_queue() -> JobQueue:
+    """Get the job queue for the current app, starting it on first use (and after a fork)"""
+    queue = current_app.extensions.get('job_queue')
+    if queue is not None and queue.pid == os.getpid():
+        return queue
+
+    with _queue_lock:
+        queue = current_app.extensions.get('job_queue')
+        if queue is not None and queue.pid == os.getpid():
+            return queue
+
+        app = current_app._get_current_object()
+        queue = JobQueue(
+            app,
+            workers=app.config.get('JOB_WORKERS', 2),
+            max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 3),
+            retry_delay=app.config.get('JOB_RETRY_DELAY', 5),
+            result_ttl_hours=app.config.get('JOB_RESULT_TTL_HOURS', 24),
+            results_dir=app.config.get('JOB_RESULTS_DIR')
+        )
+        current_app.extensions['job_queue'] = queue
+
+    try:
+        recovered = queue.recover_jobs()
+        if recovered:
+            logging.info(f"Resubmitted {recovered} unfinished background jobs")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error recovering background jobs: {e}")
+    return queue
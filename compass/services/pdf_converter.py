@@ -0,0 +1,267 @@
+"""
+LibreOffice conversion service for COMPASS DOCX to PDF generation
+
+Keeps a small pool of warm headless soffice listeners, each with its own user
+profile, and feeds conversion jobs to them over a local UNO pipe. Workers that
+crash or hang are restarted. When the Python UNO bridge is not installed the
+pool falls back to one-shot ``soffice --convert-to`` runs, still using a
+separate profile per worker so parallel conversions don't fight over the
+default profile lock.
+"""
+import os
+import time
+import queue
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+    UNO_AVAILABLE = True
+except ImportError:
+    UNO_AVAILABLE = False
+
+def find_libreoffice_binary(preferred: str = None) -> Optional[str]:
+    """Locate the LibreOffice executable (soffice/libreoffice)"""
+    candidates = [preferred] if preferred else []
+    candidates += ['soffice', 'libreoffice',
+                   '/usr/lib/libreoffice/program/soffice',
+                   '/Applications/LibreOffice.app/Contents/MacOS/soffice']
+    for candidate in candidates:
+        if not candidate:
+            continue
+        found = shutil.which(candidate)
+        if found:
+            return found
+    return None
+
+def _uno_property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+class _SofficeWorker:
+    """One headless soffice process with a private user profile"""
+
+    def __init__(self, index, binary, base_dir, startup_timeout=30):
+        self.index = index
+        self.binary = binary
+        self.profile_dir = os.path.join(base_dir, f'profile_{index}')
+        self.pipe_name = f'compass_soffice_{os.getpid()}_{index}'
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    @property
+    def profile_url(self):
+        return Path(self.profile_dir).as_uri()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the soffice listener and connect to it over the UNO pipe"""
+        cmd = [
+            self.binary, '--headless', '--invisible', '--nologo', '--nodefault',
+            '--norestore', '--nolockcheck',
+            f'-env:UserInstallation={self.profile_url}',
+            f'--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext',
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.desktop = self._connect()
+        logging.info(f"Started LibreOffice worker {self.index} (pid {self.process.pid})")
+
+    def _connect(self):
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+        url = f'uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext'
+
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                context = resolver.resolve(url)
+                return context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+            except NoConnectException:
+                if not self.is_alive():
+                    raise RuntimeError(f"LibreOffice worker {self.index} exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"LibreOffice worker {self.index} did not start within {self.startup_timeout}s")
+                time.sleep(0.25)
+
+    def stop(self):
+        self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.terminate()
+                self.process.wait(timeout=10)
+            except Exception:
+                self.process.kill()
+            self.process = None
+
+    def restart(self):
+        logging.warning(f"Restarting LibreOffice worker {self.index}")
+        self.stop()
+        self.start()
+
+    def ensure_running(self):
+        if not self.is_alive() or self.desktop is None:
+            if self.process is not None:
+                self.stop()
+            self.start()
+
+    def convert(self, docx_path, pdf_path, timeout):
+        """Convert one document on the warm listener; kills the process if it hangs"""
+        self.ensure_running()
+
+        process = self.process
+        watchdog = threading.Timer(timeout, process.kill)
+        watchdog.start()
+        try:
+            document = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(docx_path)), '_blank', 0,
+                (_uno_property('Hidden', True),))
+            try:
+                document.storeToURL(
+                    uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                    (_uno_property('FilterName', 'writer_pdf_Export'),))
+            finally:
+                document.close(True)
+        finally:
+            watchdog.cancel()
+
+    def convert_oneshot(self, docx_path, pdf_path, timeout):
+        """Convert with a short-lived soffice process using this worker's profile"""
+        out_dir = os.path.dirname(os.path.abspath(pdf_path))
+        cmd = [
+            self.binary, '--headless', '--norestore', '--nolockcheck',
+            f'-env:UserInstallation={self.profile_url}',
+            '--convert-to', 'pdf', '--outdir', out_dir, docx_path,
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"soffice exited with {result.returncode}")
+
+        # LibreOffice names the PDF after the DOCX
+        produced = os.path.join(out_dir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+        if os.path.exists(produced) and produced != os.path.abspath(pdf_path):
+            os.replace(produced, pdf_path)
+
+class LibreOfficeConverterPool:
+    """Bounded pool of LibreOffice workers for DOCX to PDF conversion"""
+
+    def __init__(self, workers=2, binary=None, timeout=60, base_dir=None):
+        self.binary = find_libreoffice_binary(binary)
+        self.timeout = timeout
+        self.size = max(1, int(workers))
+        self.base_dir = base_dir or tempfile.mkdtemp(prefix='compass_soffice_')
+        self.pid = os.getpid()
+        self.use_listeners = UNO_AVAILABLE
+        self._idle = queue.Queue()
+        self._workers = []
+
+        if self.binary:
+            for index in range(self.size):
+                worker = _SofficeWorker(index, self.binary, self.base_dir)
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    @property
+    def available(self):
+        return self.binary is not None
+
+    def convert(self, docx_path: str, output_path: str) -> bool:
+        """
+        Convert a DOCX file to PDF on the next free worker
+
+        Args:
+            docx_path: Path to the DOCX file
+            output_path: Path for the generated PDF
+
+        Returns:
+            True if the PDF was written, False otherwise
+        """
+        if not self.available:
+            return False
+
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            logging.error("No LibreOffice worker became free in time")
+            return False
+
+        try:
+            for attempt in range(2):
+                try:
+                    if self.use_listeners:
+                        worker.convert(docx_path, output_path, self.timeout)
+                    else:
+                        worker.convert_oneshot(docx_path, output_path, self.timeout)
+                    break
+                except subprocess.TimeoutExpired:
+                    logging.error(f"LibreOffice worker {worker.index} timed out converting {docx_path}")
+                    return False
+                except Exception as e:
+                    logging.error(f"LibreOffice worker {worker.index} failed (attempt {attempt + 1}): {e}")
+                    if not self.use_listeners:
+                        return False
+                    # A crashed or hung listener is restarted and the job retried once
+                    try:
+                        worker.restart()
+                    except Exception as restart_error:
+                        logging.error(f"Could not restart LibreOffice worker {worker.index}: {restart_error}")
+                        return False
+
+            return os.path.exists(output_path)
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        """Stop all soffice processes and remove the worker profiles"""
+        for worker in self._workers:
+            try:
+                worker.stop()
+            except Exception:
+                pass
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_settings = {
+    'workers': int(os.environ.get('PDF_CONVERTER_WORKERS', 2)),
+    'binary': os.environ.get('LIBREOFFICE_BINARY'),
+    'timeout': int(os.environ.get('PDF_CONVERSION_TIMEOUT', 60)),
+}
+
+def configure_converter_pool(workers=None, binary=None, timeout=None):
+    """Set the pool settings (from app config); takes effect on the next pool creation"""
+    if workers is not None:
+        _pool_settings['workers'] = workers
+    if binary is not None:
+        _pool_settings['binary'] = binary
+    if timeout is not None:
+        _pool_settings['timeout'] = timeout
+
+def get_converter_pool() -> LibreOfficeConverterPool:
+    """Get the process-wide converter pool, creating it on first use (and after a fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = LibreOfficeConverterPool(**_pool_settings)
+            if not _pool.available:
+                logging.warning("LibreOffice not found - DOCX to PDF conversion is unavailable")
+        return _pool
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.shutdown()
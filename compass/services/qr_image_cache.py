@@ -0,0 +1,274 @@
+"""
+On-demand package QR images
+
+Package QR codes are no longer written to static/qr_codes when a shipment is
+submitted. The /qr/<code>.<format> route renders an image the first time it
+is requested and keeps it in a small in-memory LRU in front of a size-bounded
+disk cache. Entries are keyed on everything that goes into the image (code,
+tracking URL, format, logo files), so a changed base URL or logo simply misses
+and the old entries age out. The key doubles as a strong ETag, so
+revalidation never needs a render.
+"""
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from flask import Response, current_app, request, send_file, url_for
+
+from .document_cache import DocumentCache, file_digest
+from .qr_service import QR_IMAGE_FORMATS, get_logo_path, get_vector_logo_path, render_package_qr
+from ..utils.timing import timed_stage
+
+# Bump when the QR drawing code changes in a way that alters output
+QR_CACHE_VERSION = 2
+
+def _logo_digest(logo_path: str) -> str:
+    try:
+        return file_digest(logo_path)
+    except OSError:
+        return 'fallback'
+
+def qr_image_key(package_qr, image_format: str, logo_path: str = None) -> str:
+    """
+    Build the cache key (and ETag) of a package QR image
+
+    Args:
+        package_qr: PackageQRCode instance
+        image_format: 'png' or 'svg'
+        logo_path: Logo embedded in the image (defaults to the NCPOR logo)
+
+    Returns:
+        Hex digest identifying the image content
+    """
+    logo_path = logo_path or get_logo_path()
+    payload = {
+        'version': QR_CACHE_VERSION,
+        'code': package_qr.unique_code,
+        'url': package_qr.qr_code_url,
+        'format': image_format,
+        'logo': _logo_digest(logo_path),
+    }
+    if image_format == 'svg':
+        payload['vector_logo'] = _logo_digest(get_vector_logo_path(logo_path))
+    encoded = json.dumps(payload, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class QRImageCache:
+    """In-memory LRU of rendered QR images in front of a disk cache"""
+
+    def __init__(self, disk_cache: Optional[DocumentCache], memory_items: int):
+        self.disk_cache = disk_cache
+        self.memory_items = max(0, int(memory_items))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, image_format: str) -> Optional[bytes]:
+        """
+        Look up a rendered image
+
+        Returns:
+            Image bytes, or None on a miss
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        path = self.disk_cache.get(key, image_format) if self.disk_cache else None
+        if not path:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            # Evicted by another worker between the lookup and the read
+            logging.warning(f"QR image cache read failed for {path}: {e}")
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, image_format: str, data: bytes):
+        """Store a rendered image in memory and on disk"""
+        self._remember(key, data)
+        if self.disk_cache:
+            self.disk_cache.put(key, image_format, data)
+
+    def _remember(self, key: str, data: bytes):
+        if not self.memory_items:
+            return
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+def get_qr_image_cache() -> QRImageCache:
+    """Get the QR image cache for the current app, creating it on first use"""
+    cache = current_app.extensions.get('qr_image_cache')
+    if cache is None:
+        cache_dir = current_app.config.get('QR_CACHE_DIR') or \
+            os.path.join(current_app.instance_path, 'qr_cache')
+        max_bytes = int(current_app.config.get('QR_CACHE_MAX_MB', 100)) * 1024 * 1024
+        disk_cache = DocumentCache(cache_dir, max_bytes) if max_bytes > 0 else None
+        cache = QRImageCache(disk_cache, current_app.config.get('QR_CACHE_MEMORY_ITEMS', 512))
+        current_app.extensions['qr_image_cache'] = cache
+    return cache
+
+def get_package_qr_image(package_qr, image_format: str = 'png') -> Tuple[bytes, str]:
+    """
+    Get a package QR image, rendering it if it is not cached yet
+
+    Args:
+        package_qr: PackageQRCode instance
+        image_format: 'png' or 'svg'
+
+    Returns:
+        (image bytes, etag)
+    """
+    logo_path = get_logo_path()
+    key = qr_image_key(package_qr, image_format, logo_path)
+    cache = get_qr_image_cache()
+
+    data = cache.get(key, image_format)
+    if data is None:
+        with timed_stage('qr_render'):
+            data = render_package_qr(package_qr.qr_code_url, package_qr.unique_code, logo_path, image_format)
+        cache.put(key, image_format, data)
+    return data, key
+
+def package_qr_image_url(package_qr, image_format: str = 'png', **kwargs) -> str:
+    """
+    URL of a package QR image
+
+    The URL carries a short version of the image key, so a long browser cache
+    lifetime is safe: a changed tracking URL or logo yields a new URL.
+    """
+    version = qr_image_key(package_qr, image_format)[:12]
+    return url_for('tracking.package_qr_image', unique_code=package_qr.unique_code,
+                   image_format=image_format, v=version, **kwargs)
+
+def package_qr_image_response(package_qr, image_format: str = 'png', download_name: str = None):
+    """
+    Response serving a package QR image with a strong ETag
+
+    Conditional requests are answered with 304 before anything is rendered.
+    Inline responses may be cached publicly for QR_CACHE_MAX_AGE seconds;
+    downloads (download_name given) are sent as attachments.
+    """
+    mimetype = QR_IMAGE_FORMATS[image_format]
+
+    if download_name:
+        data, etag = get_package_qr_image(package_qr, image_format)
+        return send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=True,
+                         download_name=download_name, etag=etag)
+
+    etag = qr_image_key(package_qr, image_format)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        data, etag = get_package_qr_image(package_qr, image_format)
+        response = Response(data, mimetype=mimetype)
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = int(current_app.config.get('QR_CACHE_MAX_AGE', 31536000))
+    return response
+
+_render_pool = None
+_render_pool_pid = None
+_render_pool_lock = threading.Lock()
+
+def get_qr_render_pool(workers) -> ProcessPoolExecutor:
+    """Get the process-wide pool for bulk pre-rendering, creating it on first use (and after a fork or a worker crash)"""
+    global _render_pool, _render_pool_pid
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_pid != os.getpid() or getattr(_render_pool, '_broken', False):
+            # Spawn rather than fork: the web process runs background threads
+            _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _render_pool_pid = os.getpid()
+        return _render_pool
+
+def _write_cache_entries(entries, logo_path, cache_dir) -> List[bool]:
+    """
+    Worker task: render (key, tracking_url, unique_code, image_format) entries
+    into the disk cache
+
+    Files are named as DocumentCache names them and written under a temporary
+    name first, so readers never see a partial image. Eviction is left to the
+    caller (once per batch rather than per file).
+    """
+    results = []
+    for key, tracking_url, unique_code, image_format in entries:
+        temp_path = None
+        try:
+            data = render_package_qr(tracking_url, unique_code, logo_path, image_format)
+            fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, os.path.join(cache_dir, f"{key}.{image_format}"))
+            temp_path = None
+            results.append(True)
+        except Exception as e:
+            logging.error(f"Error rendering QR code image for {unique_code}: {str(e)}")
+            results.append(False)
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    return results
+
+def prerender_package_qr_images(package_qrs, workers: int = 1) -> List[bool]:
+    """
+    Render the images of many packages into the disk cache ahead of requests
+
+    Used after a bulk regeneration so the first scans after e.g. a base URL
+    change don't all render on demand. Work is split into one contiguous chunk
+    per worker on the QR render pool (in process if workers <= 1 or the pool
+    is unavailable).
+
+    Args:
+        package_qrs: PackageQRCode instances
+        workers: Render processes to use
+
+    Returns:
+        Per package, whether all of its formats were rendered (all True when
+        the disk cache is disabled - the images are then rendered on request)
+    """
+    disk_cache = get_qr_image_cache().disk_cache
+    if not disk_cache or not package_qrs:
+        return [True] * len(package_qrs)
+
+    logo_path = get_logo_path()
+    entries = [
+        (qr_image_key(package_qr, image_format, logo_path), package_qr.qr_code_url, package_qr.unique_code, image_format)
+        for package_qr in package_qrs
+        for image_format in QR_IMAGE_FORMATS
+    ]
+
+    with timed_stage('qr_render'):
+        if workers <= 1 or len(package_qrs) <= 1:
+            results = _write_cache_entries(entries, logo_path, disk_cache.cache_dir)
+        else:
+            chunk_size = -(-len(entries) // workers)
+            chunks = [entries[start:start + chunk_size] for start in range(0, len(entries), chunk_size)]
+            try:
+                pool = get_qr_render_pool(workers)
+                futures = [pool.submit(_write_cache_entries, chunk, logo_path, disk_cache.cache_dir) for chunk in chunks]
+                results = [ok for future in futures for ok in future.result()]
+            except Exception as e:
+                current_app.logger.warning(f"QR render pool unavailable, rendering in process: {str(e)}")
+                results = _write_cache_entries(entries, logo_path, disk_cache.cache_dir)
+
+    disk_cache.evict()
+
+    formats = len(QR_IMAGE_FORMATS)
+    return [all(results[index * formats:(index + 1) * formats]) for index in range(len(package_qrs))]
@@ -1,42 +1,426 @@
 """
 QR Code generation service with logo embedding for COMPASS shipment tracking
+
+Package QR images are drawn by module-level functions that need no app
+context, so they can be rendered on a pool of worker processes. Submitting a
+shipment only inserts the PackageQRCode rows; the images are rendered when
+first requested and kept in the QR image cache (see qr_image_cache).
 """
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 import os
 import io
+import base64
 import secrets
+import logging
+import threading
 from flask import current_app
+from sqlalchemy.orm import joinedload
 from ..models import PackageQRCode, db
 
+QR_FILL_COLOR = (30, 63, 102)  # NCPOR dark blue
+QR_BACK_COLOR = (255, 255, 255)  # White background
+
+# Output format -> mimetype of the package QR images
+QR_IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Decoded and scaled drawing assets, filled once per process: the logo is
+# reloaded when its file changes, scaled copies are kept per logo size
+_asset_lock = threading.Lock()
+_logo_source = {'signature': None, 'image': None}
+_scaled_logos = {}
+_logo_masks = {}
+_fonts = {}
+_svg_logos = {}
+
+# Pixel size of the raster logo embedded in SVG output
+SVG_LOGO_PIXELS = 96
+
+def _get_font(size):
+    """Arial at the given size if available, else PIL's default font (loaded once)"""
+    font = _fonts.get(size)
+    if font is None:
+        try:
+            # Use a system font if available
+            font = ImageFont.truetype("arial.ttf", size)
+        except:
+            font = ImageFont.load_default()
+        _fonts[size] = font
+    return font
+
+def _create_fallback_logo():
+    """
+    Create a simple fallback logo if NCPOR logo file is not available
+    
+    Returns:
+        PIL Image of fallback logo
+    """
+    # Create a 100x100 image with NCPOR colors
+    size = 100
+    logo = Image.new('RGBA', (size, size), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(logo)
+    
+    # Draw a circle with NCPOR blue
+    draw.ellipse([0, 0, size, size], fill=(30, 63, 102, 255), outline=(255, 255, 255, 255), width=3)
+    
+    # Add NCPOR text (default font if Arial is not available)
+    font = _get_font(16)
+    
+    # Calculate text position
+    text = "NCPOR"
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    text_x = (size - text_width) // 2
+    text_y = (size - text_height) // 2
+    
+    # Draw text
+    draw.text((text_x, text_y), text, fill=(255, 255, 255, 255), font=font)
+    
+    return logo
+
+def _get_scaled_logo(logo_path, logo_size):
+    """
+    The logo (or the fallback logo) converted to RGBA and scaled to fit logo_size
+    
+    Decoded and resampled once per size; a changed logo file (mtime or size)
+    drops all scaled copies.
+    """
+    try:
+        stat = os.stat(logo_path)
+        signature = (logo_path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None  # Create a simple circular logo with NCPOR text if logo file doesn't exist
+    
+    with _asset_lock:
+        if _logo_source['signature'] != signature or _logo_source['image'] is None:
+            if signature:
+                with Image.open(logo_path) as source:
+                    image = source.convert('RGBA')
+            else:
+                image = _create_fallback_logo()
+            _logo_source.update(signature=signature, image=image)
+            _scaled_logos.clear()
+        
+        logo = _scaled_logos.get(logo_size)
+        if logo is None:
+            # Resize logo while maintaining aspect ratio
+            logo = _logo_source['image'].copy()
+            logo.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
+            _scaled_logos[logo_size] = logo
+        return logo
+
+def _get_logo_mask(mask_size):
+    """White circle the logo is placed on"""
+    with _asset_lock:
+        mask = _logo_masks.get(mask_size)
+        if mask is None:
+            mask = Image.new('RGBA', (mask_size, mask_size), (255, 255, 255, 0))
+            mask_draw = ImageDraw.Draw(mask)
+            mask_draw.ellipse([0, 0, mask_size, mask_size], fill=(255, 255, 255, 255))
+            _logo_masks[mask_size] = mask
+        return mask
+
+def embed_logo(qr_image, logo_path):
+    """
+    Embed NCPOR logo in the center of QR code
+    
+    Args:
+        qr_image: PIL Image of QR code
+        logo_path: Path to the logo file (a drawn fallback is used if it is missing)
+        
+    Returns:
+        PIL Image with embedded logo
+    """
+    try:
+        # Calculate logo size (should be about 1/5 of QR code size)
+        qr_width, qr_height = qr_image.size
+        logo_size = min(qr_width, qr_height) // 5
+        
+        # Load the NCPOR logo at that size
+        logo = _get_scaled_logo(logo_path, logo_size)
+        
+        # A white circular background for the logo
+        mask_size = logo_size + 20  # Add padding
+        mask = _get_logo_mask(mask_size)
+        
+        # Calculate position to center the logo
+        logo_pos = (
+            (qr_width - logo.size[0]) // 2,
+            (qr_height - logo.size[1]) // 2
+        )
+        
+        mask_pos = (
+            (qr_width - mask_size) // 2,
+            (qr_height - mask_size) // 2
+        )
+        
+        # Create a copy of QR image to modify
+        qr_with_logo = qr_image.copy()
+        
+        # Paste white circular background first
+        qr_with_logo.paste(mask, mask_pos, mask)
+        
+        # Paste logo on top
+        qr_with_logo.paste(logo, logo_pos, logo)
+        
+        return qr_with_logo
+        
+    except Exception as e:
+        logging.error(f"Error embedding logo: {str(e)}")
+        return qr_image  # Return original QR code if logo embedding fails
+
+def add_tracking_text(qr_image, unique_code):
+    """
+    Add tracking code text below the QR code
+    
+    Args:
+        qr_image: PIL Image of QR code with logo
+        unique_code: Tracking code to display
+        
+    Returns:
+        PIL Image with tracking text added
+    """
+    try:
+        # Calculate new image size with space for text
+        qr_width, qr_height = qr_image.size
+        text_height = 40
+        new_height = qr_height + text_height
+        
+        # Create new image with extra space
+        final_image = Image.new('RGB', (qr_width, new_height), (255, 255, 255))
+        
+        # Paste QR code at the top
+        final_image.paste(qr_image, (0, 0))
+        
+        # Add tracking code text
+        draw = ImageDraw.Draw(final_image)
+        
+        font = _get_font(12)
+        
+        # Format tracking code for display
+        display_text = f"Track: {unique_code}"
+        
+        # Calculate text position (centered)
+        bbox = draw.textbbox((0, 0), display_text, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_x = (qr_width - text_width) // 2
+        text_y = qr_height + 10
+        
+        # Draw text
+        draw.text((text_x, text_y), display_text, fill=(30, 63, 102), font=font)
+        
+        return final_image
+        
+    except Exception as e:
+        logging.error(f"Error adding tracking text: {str(e)}")
+        return qr_image  # Return QR image without text if adding text fails
+
+def get_logo_path():
+    """Path of the NCPOR logo embedded in package QR codes"""
+    return os.path.join(current_app.static_folder, 'images', 'ncpor_logo.png')
+
+def _make_package_qr(tracking_url):
+    # Create QR code instance with optimal settings
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,  # High error correction for logo embedding
+        box_size=10,
+        border=4,
+    )
+    
+    qr.add_data(tracking_url)
+    qr.make(fit=True)
+    return qr
+
+def render_package_qr_image(tracking_url, unique_code, logo_path):
+    """
+    Draw a package QR code with the embedded logo and the tracking code below it
+    
+    Returns:
+        PIL Image (RGB)
+    """
+    qr = _make_package_qr(tracking_url)
+    
+    # Generate QR code image with NCPOR colors (blue theme)
+    qr_image = qr.make_image(fill_color=QR_FILL_COLOR, back_color=QR_BACK_COLOR)
+    
+    # Convert to RGB if needed
+    qr_image = qr_image.convert('RGB')
+    
+    # Embed NCPOR logo in the center
+    qr_with_logo = embed_logo(qr_image, logo_path)
+    
+    # Add tracking code text below QR code
+    return add_tracking_text(qr_with_logo, unique_code)
+
+def get_vector_logo_path(logo_path):
+    """Vector version of a logo (same name, .svg), used by SVG output when present"""
+    return os.path.splitext(logo_path)[0] + '.svg'
+
+def _encode_svg_logo(logo_path):
+    """
+    Data URI of the logo for SVG output
+    
+    A vector logo is embedded as is; the raster logo is embedded once as a
+    small palette PNG (it only covers a fifth of the code, so this keeps the
+    SVG compact while staying sharp at label sizes).
+    """
+    vector_path = get_vector_logo_path(logo_path)
+    if os.path.exists(vector_path):
+        with open(vector_path, 'rb') as f:
+            return 'data:image/svg+xml;base64,' + base64.b64encode(f.read()).decode('ascii')
+    
+    logo = _get_scaled_logo(logo_path, SVG_LOGO_PIXELS).quantize(64, method=Image.Quantize.FASTOCTREE)
+    output = io.BytesIO()
+    logo.save(output, 'PNG', optimize=True)
+    return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+def _get_svg_logo(logo_path):
+    """
+    The <image> href of the logo for SVG output, or None to draw the fallback logo
+    
+    Encoded once per process and logo file version.
+    """
+    signature = []
+    for path in (logo_path, get_vector_logo_path(logo_path)):
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    signature = tuple(signature)
+    
+    cached = _svg_logos.get('logo')
+    if cached and cached[0] == signature:
+        return cached[1]
+    
+    href = _encode_svg_logo(logo_path) if any(signature) else None
+    _svg_logos['logo'] = (signature, href)
+    return href
+
+def _svg_color(color):
+    return '#%02x%02x%02x' % color
+
+def render_package_qr_svg(tracking_url, unique_code, logo_path) -> bytes:
+    """
+    Draw a package QR code as an SVG document
+    
+    The same layout as the PNG, in units of one module: the modules are a
+    single path, the white circle behind the logo and the "Track: CODE"
+    caption are vector elements, so the code prints sharply at any label
+    size and no PIL compositing is needed.
+    
+    Returns:
+        UTF-8 encoded SVG
+    """
+    matrix = _make_package_qr(tracking_url).get_matrix()  # Includes the quiet zone
+    size = len(matrix)
+    caption_height = 4  # 40px in the PNG
+    height = size + caption_height
+    center = size / 2
+    
+    # Logo about 1/5 of the code on a padded white circle, as in embed_logo
+    logo_size = size / 5
+    mask_radius = (logo_size + 2) / 2
+    
+    # Modules as horizontal runs, skipping those hidden under the logo circle
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x] or (x + 0.5 - center) ** 2 + (y + 0.5 - center) ** 2 < mask_radius ** 2:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x] and (x + 0.5 - center) ** 2 + (y + 0.5 - center) ** 2 >= mask_radius ** 2:
+                x += 1
+            runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+    
+    fill = _svg_color(QR_FILL_COLOR)
+    back = _svg_color(QR_BACK_COLOR)
+    logo_x = center - logo_size / 2
+    
+    logo_href = _get_svg_logo(logo_path)
+    if logo_href:
+        logo = (f'<image x="{logo_x:g}" y="{logo_x:g}" width="{logo_size:g}" height="{logo_size:g}" '
+                f'href="{logo_href}"/>')
+    else:
+        # Vector version of the fallback logo
+        logo = (f'<circle cx="{center:g}" cy="{center:g}" r="{logo_size / 2:g}" fill="{fill}" '
+                f'stroke="{back}" stroke-width="0.3"/>'
+                f'<text x="{center:g}" y="{center:g}" font-family="Arial, Helvetica, sans-serif" '
+                f'font-size="{logo_size / 6:g}" font-weight="bold" fill="{back}" text-anchor="middle" '
+                f'dominant-baseline="central">NCPOR</text>')
+    
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {height}" '
+        f'width="{size * 10}" height="{height * 10}">'
+        f'<title>Track: {unique_code}</title>'
+        f'<rect width="{size}" height="{height}" fill="{back}"/>'
+        f'<path fill="{fill}" shape-rendering="crispEdges" d="{"".join(runs)}"/>'
+        f'<circle cx="{center:g}" cy="{center:g}" r="{mask_radius:g}" fill="{back}"/>'
+        f'{logo}'
+        f'<text x="{center:g}" y="{size + 2:g}" font-family="Arial, Helvetica, sans-serif" font-size="1.4" '
+        f'fill="{fill}" text-anchor="middle" dominant-baseline="central">Track: {unique_code}</text>'
+        f'</svg>'
+    )
+    return svg.encode('utf-8')
+
+def render_package_qr(tracking_url, unique_code, logo_path, image_format='png') -> bytes:
+    """
+    Render a package QR code in one of QR_IMAGE_FORMATS
+    
+    Args:
+        tracking_url: URL to embed in the QR code
+        unique_code: Tracking code shown with the QR code
+        logo_path: Path to the logo file (a drawn fallback is used if it is missing)
+        image_format: 'png' or 'svg'
+        
+    Returns:
+        Encoded image bytes
+    """
+    if image_format == 'svg':
+        return render_package_qr_svg(tracking_url, unique_code, logo_path)
+    
+    output = io.BytesIO()
+    render_package_qr_image(tracking_url, unique_code, logo_path).save(output, 'PNG', quality=95)
+    return output.getvalue()
+
 class QRCodeService:
     """Service class for generating QR codes with NCPOR logo embedding"""
     
     def __init__(self):
         self.qr_storage_dir = os.path.join(current_app.static_folder, 'qr_codes')
         self.qr_codes_dir = os.path.join(current_app.static_folder, 'qrcodes')  # Alternative directory
-        self.logo_path = os.path.join(current_app.static_folder, 'images', 'ncpor_logo.png')
+        self.logo_path = get_logo_path()
         
         # Ensure both QR codes directories exist
         os.makedirs(self.qr_storage_dir, exist_ok=True)
         os.makedirs(self.qr_codes_dir, exist_ok=True)
     
-    def generate_package_qr_code(self, shipment, package_number, package_data, base_url):
+    def generate_package_qr_code(self, shipment, package_number, package_data, base_url, unique_code=None):
         """
-        Generate a QR code for a specific package with embedded NCPOR logo
+        Create the QR code record for a specific package
         
         Args:
             shipment: Shipment model instance
             package_number: Package number within the shipment (1, 2, 3, etc.)
             package_data: Dictionary containing package information
             base_url: Base URL for the application
+            unique_code: Tracking code reserved with PackageQRCode.generate_unique_codes,
+                         generated here if not given
             
         Returns:
-            PackageQRCode instance with generated QR code
+            PackageQRCode instance, or None if it could not be saved
         """
         try:
             # Generate unique tracking code
-            unique_code = PackageQRCode.generate_unique_code()
+            if not unique_code:
+                unique_code = PackageQRCode.generate_unique_code()
             tracking_url = f"{base_url}/track/{unique_code}"
             
             # Create PackageQRCode record
@@ -52,11 +436,7 @@ class QRCodeService:
                 attention_person_id=package_data.get('attention_person_id')
             )
             
-            # Generate QR code image
-            qr_image_path = self._create_qr_code_image(tracking_url, unique_code)
-            package_qr.qr_image_path = qr_image_path
-            
-            # Save to database
+            # Save to database (the image is rendered on first request)
             db.session.add(package_qr)
             db.session.commit()
             
@@ -66,230 +446,184 @@ class QRCodeService:
             current_app.logger.error(f"Error generating QR code for shipment {shipment.id}: {str(e)}")
             return None
     
-    def _create_qr_code_image(self, tracking_url, unique_code):
+    def generate_package_qr_codes(self, shipment, packages, base_url):
         """
-        Create QR code image with embedded NCPOR logo
+        Create the QR code records of several packages of a shipment at once
+        
+        The tracking codes are reserved with one query and all PackageQRCode
+        rows are inserted with one commit - either every package gets its row
+        or none does. No images are drawn here: they are rendered on first
+        request by the /qr/<code>.<format> route and kept in the QR image cache.
         
         Args:
-            tracking_url: URL to embed in QR code
-            unique_code: Unique tracking code for filename
+            shipment: Shipment model instance
+            packages: List of (package_number, package_data) tuples, package_data
+                      as for generate_package_qr_code
+            base_url: Base URL for the application
             
         Returns:
-            Relative path to saved QR code image
+            List of PackageQRCode instances (empty if the rows could not be saved)
         """
-        try:
-            # Create QR code instance with optimal settings
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_H,  # High error correction for logo embedding
-                box_size=10,
-                border=4,
-            )
-            
-            qr.add_data(tracking_url)
-            qr.make(fit=True)
-            
-            # Generate QR code image with NCPOR colors (blue theme)
-            qr_image = qr.make_image(
-                fill_color=(30, 63, 102),  # NCPOR dark blue
-                back_color=(255, 255, 255)  # White background
+        unique_codes = PackageQRCode.generate_unique_codes(len(packages))
+        
+        package_qrs = [
+            PackageQRCode(
+                shipment_id=shipment.id,
+                package_number=package_number,
+                unique_code=unique_code,
+                qr_code_url=f"{base_url}/track/{unique_code}",
+                package_type=package_data.get('type'),
+                package_description=package_data.get('description'),
+                package_weight=package_data.get('weight'),
+                package_dimensions=package_data.get('dimensions'),
+                attention_person_id=package_data.get('attention_person_id')
             )
-            
-            # Convert to RGB if needed
-            qr_image = qr_image.convert('RGB')
-            
-            # Embed NCPOR logo in the center
-            qr_with_logo = self._embed_logo(qr_image)
-            
-            # Add tracking code text below QR code
-            final_image = self._add_tracking_text(qr_with_logo, unique_code)
-            
-            # Save image
-            filename = f"package_{unique_code}.png"
-            file_path = os.path.join(self.qr_storage_dir, filename)
-            final_image.save(file_path, 'PNG', quality=95)
-            
-            # Return relative path for web access
-            return f"static/qr_codes/{filename}"
-            
-        except Exception as e:
-            current_app.logger.error(f"Error creating QR code image: {str(e)}")
-            # Return a fallback image path or None
-            return None
-    
-    def _embed_logo(self, qr_image):
-        """
-        Embed NCPOR logo in the center of QR code
+            for (package_number, package_data), unique_code in zip(packages, unique_codes)
+        ]
         
-        Args:
-            qr_image: PIL Image of QR code
-            
-        Returns:
-            PIL Image with embedded logo
-        """
         try:
-            # Load NCPOR logo
-            if os.path.exists(self.logo_path):
-                logo = Image.open(self.logo_path)
-            else:
-                # Create a simple circular logo with NCPOR text if logo file doesn't exist
-                logo = self._create_fallback_logo()
-            
-            # Calculate logo size (should be about 1/5 of QR code size)
-            qr_width, qr_height = qr_image.size
-            logo_size = min(qr_width, qr_height) // 5
-            
-            # Resize logo while maintaining aspect ratio
-            logo = logo.convert('RGBA')
-            logo.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
-            
-            # Create a white circular background for the logo
-            mask_size = logo_size + 20  # Add padding
-            mask = Image.new('RGBA', (mask_size, mask_size), (255, 255, 255, 0))
-            mask_draw = ImageDraw.Draw(mask)
-            mask_draw.ellipse([0, 0, mask_size, mask_size], fill=(255, 255, 255, 255))
-            
-            # Calculate position to center the logo
-            logo_pos = (
-                (qr_width - logo.size[0]) // 2,
-                (qr_height - logo.size[1]) // 2
-            )
-            
-            mask_pos = (
-                (qr_width - mask_size) // 2,
-                (qr_height - mask_size) // 2
-            )
-            
-            # Create a copy of QR image to modify
-            qr_with_logo = qr_image.copy()
-            
-            # Paste white circular background first
-            qr_with_logo.paste(mask, mask_pos, mask)
-            
-            # Paste logo on top
-            qr_with_logo.paste(logo, logo_pos, logo)
-            
-            return qr_with_logo
-            
+            db.session.add_all(package_qrs)
+            db.session.commit()
         except Exception as e:
-            current_app.logger.error(f"Error embedding logo: {str(e)}")
-            return qr_image  # Return original QR code if logo embedding fails
+            db.session.rollback()
+            current_app.logger.error(f"Error saving QR codes for shipment {shipment.id}: {str(e)}")
+            return []
+        
+        return package_qrs
+    
+    def _embed_logo(self, qr_image):
+        """Embed NCPOR logo in the center of QR code"""
+        return embed_logo(qr_image, self.logo_path)
     
     def _create_fallback_logo(self):
-        """
-        Create a simple fallback logo if NCPOR logo file is not available
-        
-        Returns:
-            PIL Image of fallback logo
-        """
-        # Create a 100x100 image with NCPOR colors
-        size = 100
-        logo = Image.new('RGBA', (size, size), (255, 255, 255, 0))
-        draw = ImageDraw.Draw(logo)
-        
-        # Draw a circle with NCPOR blue
-        draw.ellipse([0, 0, size, size], fill=(30, 63, 102, 255), outline=(255, 255, 255, 255), width=3)
-        
-        # Try to add NCPOR text (fallback if font loading fails)
-        try:
-            # Use a system font if available
-            font = ImageFont.truetype("arial.ttf", 16)
-        except:
-            font = ImageFont.load_default()
-        
-        # Calculate text position
-        text = "NCPOR"
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        text_x = (size - text_width) // 2
-        text_y = (size - text_height) // 2
-        
-        # Draw text
-        draw.text((text_x, text_y), text, fill=(255, 255, 255, 255), font=font)
-        
-        return logo
+        """Create a simple fallback logo if NCPOR logo file is not available"""
+        return _create_fallback_logo()
     
     def _add_tracking_text(self, qr_image, unique_code):
+        """Add tracking code text below the QR code"""
+        return add_tracking_text(qr_image, unique_code)
+    
+    def regenerate_qr_code(self, package_qr, base_url):
         """
-        Add tracking code text below the QR code
+        Regenerate QR code for an existing package
+        
+        The tracking URL is moved to base_url (as the bulk regeneration does)
+        and the images are rendered into the QR image cache.
         
         Args:
-            qr_image: PIL Image of QR code with logo
-            unique_code: Tracking code to display
+            package_qr: PackageQRCode instance
+            base_url: Base URL for the application (None keeps the current tracking URL)
             
         Returns:
-            PIL Image with tracking text added
+            Updated PackageQRCode instance
         """
+        from .qr_image_cache import get_qr_image_cache, qr_image_key
+        
         try:
-            # Calculate new image size with space for text
-            qr_width, qr_height = qr_image.size
-            text_height = 40
-            new_height = qr_height + text_height
-            
-            # Create new image with extra space
-            final_image = Image.new('RGB', (qr_width, new_height), (255, 255, 255))
-            
-            # Paste QR code at the top
-            final_image.paste(qr_image, (0, 0))
-            
-            # Add tracking code text
-            draw = ImageDraw.Draw(final_image)
-            
-            try:
-                font = ImageFont.truetype("arial.ttf", 12)
-            except:
-                font = ImageFont.load_default()
-            
-            # Format tracking code for display
-            display_text = f"Track: {unique_code}"
-            
-            # Calculate text position (centered)
-            bbox = draw.textbbox((0, 0), display_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_x = (qr_width - text_width) // 2
-            text_y = qr_height + 10
-            
-            # Draw text
-            draw.text((text_x, text_y), display_text, fill=(30, 63, 102), font=font)
+            if base_url:
+                package_qr.qr_code_url = package_qr.get_tracking_url(base_url)
+            
+            # Render the image again and replace the cached copy
+            cache = get_qr_image_cache()
+            for image_format in QR_IMAGE_FORMATS:
+                data = render_package_qr(package_qr.qr_code_url, package_qr.unique_code, self.logo_path, image_format)
+                cache.put(qr_image_key(package_qr, image_format, self.logo_path), image_format, data)
+            
+            # Remove the pre-rendered file of older versions if it exists
+            if package_qr.qr_image_path:
+                old_path = os.path.join(current_app.root_path, package_qr.qr_image_path)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+                package_qr.qr_image_path = None
+            
+            # Update database record
+            db.session.commit()
             
-            return final_image
+            return package_qr
             
         except Exception as e:
-            current_app.logger.error(f"Error adding tracking text: {str(e)}")
-            return qr_image  # Return QR image without text if adding text fails
+            db.session.rollback()
+            current_app.logger.error(f"Error regenerating QR code: {str(e)}")
+            return package_qr
     
-    def regenerate_qr_code(self, package_qr, base_url):
+    def regenerate_qr_codes(self, package_ids, base_url=None, progress=None):
         """
-        Regenerate QR code for an existing package
+        Regenerate the QR codes of many packages (run as a background job)
+        
+        The packages are loaded with one query per batch of
+        QR_REGENERATION_BATCH_SIZE, their tracking URLs are moved to base_url,
+        the images are pre-rendered into the QR image cache (see
+        prerender_package_qr_images) and
+        each batch is saved with a single commit. A failed commit rolls back
+        only its batch; running the job again is safe.
         
         Args:
-            package_qr: PackageQRCode instance
-            base_url: Base URL for the application
+            package_ids: PackageQRCode IDs to regenerate
+            base_url: New base URL for the tracking links (None keeps the current ones)
+            progress: Optional callback receiving the percentage done; it is
+                      called before each batch commit, so it may add to it
             
         Returns:
-            Updated PackageQRCode instance
+            List of report dictionaries in package_ids order (package_id,
+            tracking_code, invoice_number, package_number, tracking_url and
+            status - 'ok', 'render_failed' or 'not_found')
         """
-        try:
-            # Generate new QR code image
-            qr_image_path = self._create_qr_code_image(package_qr.qr_code_url, package_qr.unique_code)
-            
-            if qr_image_path:
-                # Remove old QR code file if it exists
+        from .qr_image_cache import prerender_package_qr_images
+        
+        package_ids = list(dict.fromkeys(package_ids))
+        batch_size = max(1, int(current_app.config.get('QR_REGENERATION_BATCH_SIZE', 200)))
+        workers = int(current_app.config.get('QR_RENDER_WORKERS', 1))
+        results = []
+        
+        for start in range(0, len(package_ids), batch_size):
+            batch_ids = package_ids[start:start + batch_size]
+            packages = {package_qr.id: package_qr for package_qr in
+                        PackageQRCode.query.options(joinedload(PackageQRCode.shipment)).filter(
+                            PackageQRCode.id.in_(batch_ids))}
+            package_qrs = [packages[package_id] for package_id in batch_ids if package_id in packages]
+            
+            legacy_files = []
+            for package_qr in package_qrs:
+                if base_url:
+                    package_qr.qr_code_url = package_qr.get_tracking_url(base_url)
                 if package_qr.qr_image_path:
-                    old_path = os.path.join(current_app.root_path, package_qr.qr_image_path)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
-                # Update database record
-                package_qr.qr_image_path = qr_image_path
-                db.session.commit()
+                    legacy_files.append(os.path.join(current_app.root_path, package_qr.qr_image_path))
+                    package_qr.qr_image_path = None
+            
+            rendered = dict(zip((package_qr.id for package_qr in package_qrs),
+                                prerender_package_qr_images(package_qrs, workers)))
+            
+            # Report rows are read now - the commit expires the loaded rows
+            for package_id in batch_ids:
+                package_qr = packages.get(package_id)
+                if package_qr is None:
+                    results.append({'package_id': package_id, 'status': 'not_found'})
+                    continue
+                results.append({
+                    'package_id': package_id,
+                    'tracking_code': package_qr.unique_code,
+                    'invoice_number': package_qr.shipment.invoice_number,
+                    'package_number': package_qr.package_number,
+                    'tracking_url': package_qr.qr_code_url,
+                    'status': 'ok' if rendered[package_id] else 'render_failed'
+                })
             
-            return package_qr
+            try:
+                if progress:
+                    progress(100 * (start + len(batch_ids)) // len(package_ids))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
             
-        except Exception as e:
-            current_app.logger.error(f"Error regenerating QR code: {str(e)}")
-            return package_qr
+            # Pre-rendered files of older versions are only removed once their rows no longer point at them
+            for path in legacy_files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        
+        return results
     
     def get_qr_code_url(self, package_qr):
         """
@@ -301,9 +635,8 @@ class QRCodeService:
         Returns:
             URL string for accessing QR code image
         """
-        if package_qr.qr_image_path:
-            return f"/{package_qr.qr_image_path}"
-        return None
+        from .qr_image_cache import package_qr_image_url
+        return package_qr_image_url(package_qr)
     
     def cleanup_orphaned_qr_codes(self):
         """
@@ -4,6 +4,8 @@ No authentication required - public access for package tracking
 """
 from flask import Blueprint, render_template, request, jsonify, abort, current_app
 from .models import PackageQRCode, Shipment, User
+from .services.qr_service import QR_IMAGE_FORMATS
+from .services.qr_image_cache import package_qr_image_response, package_qr_image_url
 from datetime import datetime
 import re
 
@@ -38,11 +40,7 @@ def track_package(tracking_code):
         
         # Add additional computed information
         package_info['tracking_url'] = request.url
-        package_info['qr_code_url'] = None
-        
-        # Get QR code image URL if available
-        if package.qr_image_path:
-            package_info['qr_code_url'] = f"/{package.qr_image_path}"
+        package_info['qr_code_url'] = package_qr_image_url(package, 'svg')
         
         # Format dates for display
         package_info['created_at_formatted'] = package.created_at.strftime('%B %d, %Y at %I:%M %p')
@@ -145,6 +143,30 @@ def api_track_package(tracking_code):
             'message': 'System error occurred'
         }), 500
 
+@tracking.route('/qr/<unique_code>.<image_format>')
+def package_qr_image(unique_code, image_format):
+    """
+    Public package QR code image, rendered on first request and then cached
+
+    Args:
+        unique_code: 12-character unique tracking code
+        image_format: 'png' or 'svg'
+    """
+    # Plain-text errors: this is fetched by <img> tags, not shown as a page
+    unique_code = unique_code.upper()
+    if image_format not in QR_IMAGE_FORMATS or not re.match(r'^[A-Z0-9]{12}$', unique_code):
+        return 'QR code not found', 404
+
+    package = PackageQRCode.query.filter_by(unique_code=unique_code).first()
+    if not package:
+        return 'QR code not found', 404
+
+    try:
+        return package_qr_image_response(package, image_format)
+    except Exception as e:
+        current_app.logger.error(f"Error rendering QR code image for {unique_code}: {str(e)}")
+        return 'QR code could not be rendered', 500
+
 @tracking.route('/track')
 def track_home():
     """
@@ -0,0 +1,263 @@
+"""
+Row data for the invoice, packing list and shipper tables
+
+The DOCX table builders in main.py and the native PDF renderer both work from
+these rows, so the two outputs always show the same figures.
+"""
+import logging
+
+from num2words import num2words
+
+from .helpers import package_type_display_name
+
+PL_DECLARATION = (
+    "THE ABOVE MENTIONED GOODS ARE FOR RESEARCH AND DEVELOPMENT.\n\n"
+    "Declaration:\n"
+    "We declare that all particulars given above are true and correct."
+)
+
+def format_amount_in_words(total_amount):
+    """Amount in words with every word capitalized, e.g. 'One Hundred And Five Only'"""
+    amount_words = num2words(int(total_amount), to='cardinal').split()
+    capitalized_words = []
+    for word in amount_words:
+        if word.lower() == 'and':
+            capitalized_words.append('And')
+        else:
+            capitalized_words.append(word.capitalize())
+    return " ".join(capitalized_words) + " Only"
+
+def get_invoice_declarations(total_amount):
+    """Declarations block shown under the invoice table"""
+    return (
+        f"Amount Chargeable (in words): USD {format_amount_in_words(total_amount)}\n\n"
+        "THE VALUE DECLARED ABOVE IS FOR CUSTOMS PURPOSE ONLY.\n\n"
+        "GOODS ARE FOR RESEARCH AND DEVELOPMENT.\n\n"
+        "Declaration:\n"
+        "We declare that the invoice shows the actual price of goods\n"
+        "Described and that all particulars are true and correct."
+    )
+
+def _split_requester_name(requester_name):
+    """(first_name, last_name) for a full name, or None for a single word"""
+    name_parts = requester_name.split()
+    if len(name_parts) < 2:
+        return None
+    return name_parts[0], ' '.join(name_parts[1:])  # Handle multi-word last names
+
+class PackageUsers:
+    """Package owners and requesters of a shipment, looked up by ID and by name"""
+
+    def __init__(self, by_id=None, by_name=None):
+        self.by_id = by_id or {}
+        self.by_name = by_name or {}
+
+    def owner(self, user_id):
+        return self.by_id.get(user_id) if user_id else None
+
+    def requester(self, requester_name):
+        name = _split_requester_name(requester_name)
+        return self.by_name.get(name) if name else None
+
+def resolve_package_users(shipment_data):
+    """
+    Load every user referenced by the packages up front
+
+    Owners (package_N_belongs_to) are loaded in one IN query and requesters
+    (package_N_attn full names) in another, so the table builders never hit
+    the database per package.
+
+    Args:
+        shipment_data: ParsedShipment from parse_shipment
+
+    Returns:
+        PackageUsers shared by the invoice, packing list and shipper tables
+    """
+    from ..models import User
+
+    user_ids = {package.owner_id for package in shipment_data.packages if package.owner_id}
+    names = set()
+    for package in shipment_data.packages:
+        name = _split_requester_name(package.attn) if package.attn else None
+        if name:
+            names.add(name)
+
+    users = PackageUsers()
+    try:
+        if user_ids:
+            users.by_id = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+
+        if names:
+            candidates = User.query.filter(
+                User.first_name.in_({first for first, _ in names}),
+                User.last_name.in_({last for _, last in names})
+            ).order_by(User.id).all()
+            for user in candidates:
+                name = (user.first_name, user.last_name)
+                # Keep the first match per name, like filter_by(...).first()
+                if name in names and name not in users.by_name:
+                    users.by_name[name] = user
+    except Exception as e:
+        logging.error(f"Error resolving package users: {e}")
+
+    return users
+
+def get_package_ownership_info(package, users):
+    """Owner / requester notes for a package of a combined shipment"""
+    ownership_info = []
+
+    # Combined shipment - package owner by ID
+    owner_user = users.owner(package.owner_id)
+    if owner_user:
+        owner_name = f"{owner_user.first_name} {owner_user.last_name}"
+        ownership_info.append(f"Owner: {owner_name} ({owner_user.unique_id})")
+
+    # Check if there's attention field (requester) for items
+    requester_name = package.attn
+    if requester_name:
+        # Show the requester's unique ID when the full name matches a user
+        requester_user = users.requester(requester_name)
+        if requester_user and requester_user.unique_id:
+            ownership_info.append(f"Req: {requester_name} ({requester_user.unique_id})")
+        else:
+            ownership_info.append(f"Req: {requester_name}")
+
+    return ownership_info
+
+def get_package_box_text(package, users):
+    """'Box-N (type)' plus ownership notes on a second line"""
+    box_text = f"Box-{package.number} ({package.type_display})"
+
+    ownership_info = get_package_ownership_info(package, users)
+    if ownership_info:
+        # Put ownership info on new line but in a more compact format
+        box_text += f"\n{' | '.join(ownership_info)}"
+    return box_text
+
+def _item_description(item):
+    item_desc = f"{item.description}"
+    if item.hsn_code:
+        item_desc += f" (HSN: {item.hsn_code})"
+    if item.quantity > 1:
+        item_desc += f" - {item.quantity} nos"
+    return item_desc
+
+def get_invoice_rows(shipment_data, users=None):
+    """
+    Invoice table rows, one per package with all its items combined
+
+    Args:
+        shipment_data: ParsedShipment from parse_shipment
+        users: PackageUsers from resolve_package_users (resolved here if omitted)
+
+    Returns:
+        (rows, total_amount) - rows are dicts with marks, packages, description,
+        quantity, rate and amount (all display strings)
+    """
+    users = users or resolve_package_users(shipment_data)
+    rows = []
+    total_amount = 0
+
+    for package in shipment_data.packages:
+        item_descriptions = [_item_description(item) for item in package.described_items]
+
+        # Skip if no valid items
+        if not item_descriptions:
+            continue
+
+        # Average rate for package (total value / total quantity)
+        avg_rate = package.total_value / package.total_quantity if package.total_quantity > 0 else 0
+
+        rows.append({
+            'marks': f"{package.number}.",
+            'packages': get_package_box_text(package, users),
+            'description': ", ".join(item_descriptions),
+            'quantity': f"{package.total_quantity} SET",
+            'rate': f"{avg_rate:.0f}",
+            'amount': f"{package.total_value:.0f}"
+        })
+        total_amount += package.total_value
+
+    return rows, total_amount
+
+def get_packing_list_rows(shipment_data, users=None):
+    """
+    Packing list table rows, one per package with all its items combined
+
+    Args:
+        shipment_data: ParsedShipment from parse_shipment
+        users: PackageUsers from resolve_package_users (resolved here if omitted)
+
+    Returns:
+        List of dicts with marks, packages, description, quantity, dimensions
+        and weight (all display strings)
+    """
+    users = users or resolve_package_users(shipment_data)
+    rows = []
+
+    for package in shipment_data.packages:
+        item_descriptions = [_item_description(item) for item in package.described_items]
+
+        # Skip if no valid items
+        if not item_descriptions:
+            continue
+
+        rows.append({
+            'marks': f"{package.number}.",
+            'packages': get_package_box_text(package, users),
+            'description': ", ".join(item_descriptions),
+            'quantity': f"{package.total_quantity}",
+            'dimensions': f"{package.length} x {package.width} x {package.height}",
+            'weight': f"{package.total_weight:.2f}"
+        })
+
+    return rows
+
+def get_shipper_rows(shipment_data, users=None):
+    """
+    Shipper declaration table rows, one per package
+
+    Args:
+        shipment_data: ParsedShipment from parse_shipment
+        users: PackageUsers from resolve_package_users (resolved here if omitted)
+
+    Returns:
+        List of dicts with marks, description and quantity (all display strings)
+    """
+    users = users or resolve_package_users(shipment_data)
+    rows = []
+
+    for package in shipment_data.packages:
+        # A package without a type is shown as a cardboard box here
+        package_type_display = package.type_display if package.type is not None else \
+            package_type_display_name('box')
+
+        length, width, height = package.length, package.width, package.height
+        dimensions = f"({length} x {width} x {height} cm)" if all([length, width, height]) else ""
+
+        # Get package owner name (without label)
+        owner_name = ""
+        owner_user = users.owner(package.owner_id)
+        if owner_user:
+            owner_name = f" {owner_user.first_name} {owner_user.last_name}"
+
+        # Check for requester name (combined shipment)
+        requester_info = f" {package.attn} – " if package.attn else ""
+
+        description_parts = [f"Box No.- {package.number:02d} ({package_type_display}){requester_info}{dimensions}{owner_name}"]
+
+        for item in package.described_items:
+            item_text = f"{item.description}"
+            if item.hsn_code:
+                item_text += f" (HSN: {item.hsn_code})"
+            if item.quantity_text and item.quantity_text != '0':
+                item_text += f" – {item.quantity_text} nos"
+            description_parts.append(item_text)
+
+        rows.append({
+            'marks': "As Address",
+            'description': ", ".join(description_parts),
+            'quantity': "1 set"
+        })
+
+    return rows
@@ -0,0 +1,58 @@
+"""
+Fast row construction for the generated DOCX tables
+
+Adding rows through python-docx means a proxy object per cell and a handful
+of XML edits (width, alignment, text) for every cell of every row. For the
+invoice, packing list and shipper tables all data rows share the same
+styling, so one row is styled once and its XML is cloned for each package,
+filling in only the text.
+"""
+import copy
+from typing import Iterable, Sequence
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Cm
+
+def set_cant_split(tr):
+    """Keep a table row on one page; adds the w:cantSplit flag only once"""
+    trPr = tr.get_or_add_trPr()
+    cant_split = trPr.find(qn('w:cantSplit'))
+    if cant_split is None:
+        cant_split = OxmlElement('w:cantSplit')
+        trPr.append(cant_split)
+    cant_split.set(qn('w:val'), '1')
+
+class RowTemplate:
+    """A styled data row of a table, prepared once and cloned per row"""
+
+    def __init__(self, table, widths_cm: Sequence[float], alignments: Sequence, cant_split: bool = True):
+        """
+        Args:
+            table: python-docx Table the rows are added to
+            widths_cm: Width of each cell in centimeters
+            alignments: WD_ALIGN_PARAGRAPH value for each cell
+            cant_split: Keep each row on one page
+        """
+        self._tbl = table._tbl
+
+        # Style one row through python-docx, then keep only its XML
+        row = table.add_row()
+        for cell, width, alignment in zip(row.cells, widths_cm, alignments):
+            cell.width = Cm(width)
+            cell.text = ''
+            cell.paragraphs[0].alignment = alignment
+        if cant_split:
+            set_cant_split(row._tr)
+
+        self._tr = row._tr
+        self._tbl.remove(self._tr)
+
+    def add_row(self, values: Iterable[str]):
+        """Append a copy of the template row with the given cell texts"""
+        tr = copy.deepcopy(self._tr)
+        for tc, value in zip(tr.tc_lst, values):
+            # Same as cell.text: newlines become line breaks within the run
+            tc.p_lst[0].r_lst[0].text = value
+        self._tbl.append(tr)
+        return tr
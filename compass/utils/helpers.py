@@ -3,28 +3,34 @@ from flask import flash, redirect, url_for
 from flask_login import current_user
 from datetime import datetime
 
+PACKAGE_TYPE_NAMES = {
+    'cardboard_box': 'Cardboard Box',
+    'plastic_crate': 'Plastic Crate',
+    'metal_trunk': 'Metal Trunk',
+    'zarges': 'Zarges',
+    'pelican_case': 'Pelican Case',
+    'other': 'Other',
+    # Legacy support for old values
+    'box': 'Cardboard Box',
+    'carton': 'Plastic Crate',
+    'crate': 'Metal Trunk'
+}
+
+def package_type_display_name(package_type, other_type=''):
+    """Convert package type code to display name, using the custom name for 'other'"""
+    if package_type == 'other' and other_type:
+        return other_type
+    return PACKAGE_TYPE_NAMES.get(package_type, package_type.title())
+
 def get_package_type_display_name(package_type, form_data=None, package_num=None):
     """Convert package type code to display name, handling 'other' type with custom input"""
-    package_type_mapping = {
-        'cardboard_box': 'Cardboard Box',
-        'plastic_crate': 'Plastic Crate',
-        'metal_trunk': 'Metal Trunk',
-        'zarges': 'Zarges',
-        'pelican_case': 'Pelican Case',
-        'other': 'Other',
-        # Legacy support for old values
-        'box': 'Cardboard Box',
-        'carton': 'Plastic Crate',
-        'crate': 'Metal Trunk'
-    }
+    other_type = ''
     
     # If package type is 'other' and we have form_data and package_num, get the custom type
     if package_type == 'other' and form_data and package_num:
         other_type = form_data.get(f'package_{package_num}_other_type', '')
-        if other_type:
-            return other_type
     
-    return package_type_mapping.get(package_type, package_type.title())
+    return package_type_display_name(package_type, other_type)
 
 def generate_file_reference_number(shipment, acknowledging_admin):
     """
@@ -64,6 +70,69 @@ def generate_file_reference_number(shipment, acknowledging_admin):
     
     return file_reference_number
 
+def get_unique_ids(user_ids):
+    """
+    Look up the unique IDs of several users with one query
+
+    Args:
+        user_ids: User IDs in the order they should appear (duplicates are dropped)
+
+    Returns:
+        list: Unique IDs in the same order, skipping unknown users and users without one
+    """
+    from ..models import User
+
+    ordered_ids = []
+    for user_id in user_ids:
+        try:
+            user_id = int(user_id)
+        except (ValueError, TypeError):
+            continue
+        if user_id not in ordered_ids:
+            ordered_ids.append(user_id)
+    if not ordered_ids:
+        return []
+
+    rows = User.query.with_entities(User.id, User.unique_id).filter(User.id.in_(ordered_ids)).all()
+    unique_ids = {user_id: unique_id for user_id, unique_id in rows}
+    return [unique_ids[user_id] for user_id in ordered_ids if unique_ids.get(user_id)]
+
+def build_invoice_number(shipment_type, year, month, return_type, serial_number, unique_ids, admin_unique_id=None):
+    """
+    Build a shipment invoice number
+
+    Used both when a shipment is submitted (with an allocated serial) and for
+    the form previews (with the next expected serial), so the two always agree.
+
+    Args:
+        shipment_type: 'export', 'import', 'reimport' or 'cold'
+        year: Expedition year
+        month: Expedition month (JAN, FEB, ...)
+        return_type: Return type code (exports and reimports)
+        serial_number: 4-digit serial number
+        unique_ids: Unique IDs of the package owners/requester; more than one
+                    makes a combined export
+        admin_unique_id: Unique ID of the admin creating an import
+
+    Returns:
+        str: Invoice number
+    """
+    user_unique_id = unique_ids[0] if unique_ids else 'XXXXXX'
+
+    if shipment_type == 'export':
+        if len(unique_ids) > 1:
+            # Combined export
+            return f"NCPOR/ARC/{year}/{month}/EXP/{return_type}/CMB/{'/'.join(unique_ids)}/{serial_number}"
+        return f"NCPOR/ARC/{year}/{month}/EXP/{return_type}/{user_unique_id}/{serial_number}"
+    elif shipment_type == 'import':
+        # NCPOR/ARC pattern for import shipments with admin ID and requester ID
+        return f"NCPOR/ARC/{year}/{month}/SAM/RT/{admin_unique_id or 'ADMIN'}/{user_unique_id}/{serial_number}"
+    elif shipment_type == 'reimport':
+        return f"NCPOR/REIMP/{year}/{month}/{return_type}/{user_unique_id}/{serial_number}"
+    elif shipment_type == 'cold':
+        return f"NCPOR/COLD/{year}/{month}/{user_unique_id}/{serial_number}"
+    return f"NCPOR/UNKNOWN/{year}/{month}/{return_type}/{user_unique_id}/{serial_number}"
+
 def generate_document_filename(shipment, form_data, document_type='invoice_packing'):
     """
     Generate document filename in format:
@@ -0,0 +1,333 @@
+"""
+Native ReportLab renderer for the invoice & packing list
+
+Draws the document straight to PDF without Word or LibreOffice. The page
+layout (headings, the exporter/consignee header tables, page breaks) is read
+from the same DOCX template the Word output uses, its placeholders are
+rendered with Jinja, and the invoice, packing list and shipper tables are
+drawn from the rows in document_data - so both outputs show the same content.
+"""
+import io
+import os
+import logging
+import threading
+from xml.sax.saxutils import escape
+
+from docx.oxml.ns import qn
+from jinja2 import Environment
+from num2words import num2words
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+    logging.warning("reportlab not available. Native PDF rendering is disabled.")
+
+from .template_cache import get_document_template
+from .timing import timed_stage
+from .document_data import (resolve_package_users, get_invoice_rows, get_packing_list_rows, get_shipper_rows,
+                            get_invoice_declarations, PL_DECLARATION)
+
+# Document types whose templates the native renderer can lay out
+NATIVE_DOCUMENT_TYPES = ['invoice_packing']
+
+TABLE_PLACEHOLDERS = ['[INVOICE_TABLE]', '[PL_TABLE]', '[Shipper_table]']
+
+_jinja_env = Environment()
+
+# template_path -> (mtime, layout)
+_layout_cache = {}
+_layout_lock = threading.Lock()
+
+def supports_native_pdf(document_type: str) -> bool:
+    """Whether the native renderer can produce this document type"""
+    return REPORTLAB_AVAILABLE and document_type in NATIVE_DOCUMENT_TYPES
+
+# --- Template layout ---------------------------------------------------------
+
+def _paragraph_spec(p_element):
+    """Text (as a compiled Jinja template), alignment, weight and size of a w:p"""
+    text_parts = []
+    for node in p_element.iter(qn('w:t'), qn('w:br'), qn('w:tab')):
+        if node.tag == qn('w:t'):
+            text_parts.append(node.text or '')
+        elif node.tag == qn('w:tab'):
+            text_parts.append(' ')
+        elif node.get(qn('w:type')) in (None, 'textWrapping'):
+            text_parts.append('\n')
+    text = ''.join(text_parts)
+
+    alignment = p_element.xpath('./w:pPr/w:jc/@w:val')
+    bold = bool(p_element.xpath('./w:r/w:rPr/w:b[not(@w:val="0") and not(@w:val="false")]'))
+    sizes = p_element.xpath('./w:r/w:rPr/w:sz/@w:val')
+
+    return {
+        'template': _jinja_env.from_string(text) if '{' in text else None,
+        'text': text,
+        'alignment': alignment[0] if alignment else 'left',
+        'bold': bold,
+        'size': int(sizes[0]) / 2 if sizes else 11,
+        'page_break': bool(p_element.xpath('.//w:br[@w:type="page"]') or
+                           p_element.xpath('./w:pPr/w:pageBreakBefore[not(@w:val="0")]')),
+    }
+
+def _table_spec(tbl_element):
+    """Grid widths, cells and merged ranges of a w:tbl"""
+    widths = [int(w) / 567.0 for w in tbl_element.xpath('./w:tblGrid/w:gridCol/@w:w')]  # twips -> cm
+    rows = []
+    grid = []
+
+    for tr in tbl_element.xpath('./w:tr'):
+        row = [None] * len(widths)
+        cells = {}
+        column = 0
+        for tc in tr.xpath('./w:tc'):
+            grid_span = tc.xpath('./w:tcPr/w:gridSpan/@w:val')
+            span = int(grid_span[0]) if grid_span else 1
+            vmerge = tc.xpath('./w:tcPr/w:vMerge')
+            vmerge_value = (vmerge[0].get(qn('w:val')) or 'continue') if vmerge else None
+
+            # Continuation cells of a vertical merge carry no content of their own
+            if vmerge_value != 'continue':
+                row[column] = [_paragraph_spec(p) for p in tc.xpath('./w:p')]
+            cells[column] = (span, vmerge_value)
+            column += span
+        rows.append(row)
+        grid.append(cells)
+
+    # Merged ranges: horizontal spans, extended down over vMerge continuations
+    spans = []
+    for row_index, cells in enumerate(grid):
+        for column, (span, vmerge_value) in cells.items():
+            if vmerge_value == 'continue':
+                continue
+            end_row = row_index
+            if vmerge_value == 'restart':
+                while end_row + 1 < len(grid) and grid[end_row + 1].get(column, (0, None))[1] == 'continue':
+                    end_row += 1
+            if span > 1 or end_row > row_index:
+                spans.append(((column, row_index), (column + span - 1, end_row)))
+
+    return {'widths': widths, 'rows': rows, 'spans': spans}
+
+def _build_layout(template_path):
+    """Walk the template body into paragraph, table and placeholder blocks"""
+    document = get_document_template(template_path).docx
+    blocks = []
+    for child in document.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            spec = _paragraph_spec(child)
+            placeholder = next((name for name in TABLE_PLACEHOLDERS if name in spec['text']), None)
+            if spec['page_break']:
+                blocks.append({'kind': 'page_break'})
+            if placeholder:
+                blocks.append({'kind': 'placeholder', 'name': placeholder})
+            else:
+                blocks.append({'kind': 'paragraph', 'spec': spec})
+        elif child.tag == qn('w:tbl'):
+            blocks.append({'kind': 'table', 'spec': _table_spec(child)})
+    return blocks
+
+def get_template_layout(template_path):
+    """Layout of a template, cached until the file changes on disk"""
+    mtime = os.path.getmtime(template_path)
+    with _layout_lock:
+        entry = _layout_cache.get(template_path)
+        if entry and entry[0] == mtime:
+            return entry[1]
+
+    layout = _build_layout(template_path)
+    with _layout_lock:
+        _layout_cache[template_path] = (mtime, layout)
+    return layout
+
+# --- Drawing -----------------------------------------------------------------
+
+def _style(size=10, bold=False, alignment='left', leading=None):
+    return ParagraphStyle(
+        name=f"compass_{size}_{bold}_{alignment}",
+        fontName='Helvetica-Bold' if bold else 'Helvetica',
+        fontSize=size,
+        leading=leading or size * 1.2,
+        alignment={'center': TA_CENTER, 'right': TA_RIGHT, 'end': TA_RIGHT, 'both': TA_JUSTIFY}.get(alignment, TA_LEFT),
+    )
+
+def _markup(text):
+    return escape(text).replace('\n', '<br/>')
+
+def _render_text(spec, context, replacements):
+    text = spec['template'].render(context) if spec['template'] is not None else spec['text']
+    for placeholder, value in replacements.items():
+        text = text.replace(placeholder, value)
+    return text
+
+def _flow_paragraph(spec, context, replacements, size=None):
+    text = _render_text(spec, context, replacements)
+    if not text.strip():
+        return Spacer(1, (size or spec['size']) * 0.6)
+    return Paragraph(_markup(text), _style(size or spec['size'], spec['bold'], spec['alignment']))
+
+def _header_table(spec, context, replacements):
+    """Exporter/consignee/shipping details table from the template"""
+    data = []
+    for row in spec['rows']:
+        data.append([
+            [_flow_paragraph(p, context, replacements, size=min(p['size'], 10)) for p in cell] if cell else ''
+            for cell in row
+        ])
+
+    table = Table(data, colWidths=[w * cm for w in spec['widths']])
+    style = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+    ]
+    style += [('SPAN', start, end) for start, end in spec['spans']]
+    table.setStyle(TableStyle(style))
+    return table
+
+def _cell(text, bold=False, alignment='left', size=9):
+    return Paragraph(_markup(text), _style(size, bold, alignment))
+
+def _data_table(headers, widths, body_rows, alignments, footer=None, footer_height=None):
+    """Bordered table with a repeating bold header row and an optional footer row"""
+    data = [[_cell(text, bold=True, alignment='center', size=10) for text in headers]]
+    for row in body_rows:
+        data.append([_cell(value, alignment=alignments[i]) for i, value in enumerate(row)])
+
+    style = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('LINEABOVE', (0, 0), (-1, 0), 0, colors.white),  # Sits right under the header table
+        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+        ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+    ]
+    row_heights = [None] * len(data)
+    if footer:
+        footer_row, footer_spans = footer
+        data.append(footer_row)
+        row_heights.append(footer_height)
+        last = len(data) - 1
+        style += [('SPAN', (start, last), (end, last)) for start, end in footer_spans]
+
+    table = Table(data, colWidths=[w * cm for w in widths], rowHeights=row_heights, repeatRows=1)
+    table.setStyle(TableStyle(style))
+    return table
+
+def _invoice_table(shipment_data, users, replacements):
+    rows, total_amount = get_invoice_rows(shipment_data, users)
+    replacements['[AMOUNT_IN_WORDS]'] = f"USD {num2words(int(total_amount))} Only"
+    replacements['[TOTAL_AMOUNT]'] = f"{total_amount:.0f}"
+
+    widths = [2.0, 3.0, 7.34, 2.5, 2.25, 2.25]
+    total_box = Table(
+        [[_cell('TOTAL', bold=True, size=10), _cell(f"{total_amount:.0f}", bold=True, alignment='right', size=10)],
+         [_cell('Signature & date', size=10), '']],
+        colWidths=[2.5 * cm, 4.5 * cm],
+        rowHeights=[0.8 * cm, 2.84 * cm]
+    )
+    total_box.setStyle(TableStyle([
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+        ('SPAN', (0, 1), (1, 1)),
+        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+        ('VALIGN', (0, 1), (-1, 1), 'TOP'),
+    ]))
+
+    footer_row = [_cell(get_invoice_declarations(total_amount)), '', '', total_box, '', '']
+    return _data_table(
+        ['Marks & no', 'No& kind of packages', 'Description of goods', 'Quantity', 'Rate\nUSD', 'Amount\nUSD'],
+        widths,
+        [[r['marks'], r['packages'], r['description'], r['quantity'], r['rate'], r['amount']] for r in rows],
+        ['left', 'left', 'left', 'left', 'right', 'right'],
+        footer=(footer_row, [(0, 2), (3, 5)])
+    )
+
+def _packing_list_table(shipment_data, users):
+    rows = get_packing_list_rows(shipment_data, users)
+    footer_row = [_cell(PL_DECLARATION), '', '', _cell('Signature & date'), '', '']
+    return _data_table(
+        ['Marks & no', 'No& kind of packages', 'Description of goods', 'Quantity', 'Dimension\n(L x B x H)\n(cm)', 'Weight\n(kg)'],
+        [2.0, 3.0, 7.34, 2.0, 3.0, 2.0],
+        [[r['marks'], r['packages'], r['description'], r['quantity'], r['dimensions'], r['weight']] for r in rows],
+        ['left', 'left', 'left', 'center', 'center', 'right'],
+        footer=(footer_row, [(0, 2), (3, 5)]),
+        footer_height=3.0 * cm
+    )
+
+def _shipper_table(shipment_data, users):
+    rows = get_shipper_rows(shipment_data, users)
+    return _data_table(
+        ['Marks and Number of Packages', 'Proper Description of Goods\n(Trade names not permitted)\nspecify each article separately', 'Net Quantity'],
+        [4.0, 10.0, 3.0],
+        [[r['marks'], r['description'], r['quantity']] for r in rows],
+        ['left', 'left', 'center']
+    )
+
+def render_invoice_packing_pdf(template_path: str, context: dict, shipment_data) -> bytes:
+    """
+    Render the invoice & packing list straight to PDF
+
+    Args:
+        template_path: DOCX template that defines the page layout
+        context: Template context dictionary
+        shipment_data: ParsedShipment from parse_shipment
+
+    Returns:
+        The PDF bytes
+    """
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("reportlab is not installed")
+
+    with timed_stage('template_load'):
+        layout = get_template_layout(template_path)
+
+    # Tables are built first so [AMOUNT_IN_WORDS]/[TOTAL_AMOUNT] are known for the text
+    replacements = {}
+    tables = {}
+    users = resolve_package_users(shipment_data)
+    for block in layout:
+        if block['kind'] == 'placeholder' and block['name'] not in tables:
+            if block['name'] == '[INVOICE_TABLE]':
+                tables[block['name']] = _invoice_table(shipment_data, users, replacements)
+            elif block['name'] == '[PL_TABLE]':
+                tables[block['name']] = _packing_list_table(shipment_data, users)
+            else:
+                tables[block['name']] = _shipper_table(shipment_data, users)
+
+    story = []
+    for block in layout:
+        if block['kind'] == 'page_break':
+            if story:
+                story.append(PageBreak())
+        elif block['kind'] == 'placeholder':
+            story.append(tables[block['name']])
+        elif block['kind'] == 'table':
+            story.append(_header_table(block['spec'], context, replacements))
+        else:
+            story.append(_flow_paragraph(block['spec'], context, replacements))
+
+    # The Word tables are 19.34cm wide and centred past the template margins
+    page_width, page_height = 21.0 * cm, 29.7 * cm
+    side_margin = (page_width - 19.34 * cm) / 2
+
+    buffer = io.BytesIO()
+    pdf = SimpleDocTemplate(
+        buffer,
+        pagesize=(page_width, page_height),
+        leftMargin=side_margin,
+        rightMargin=side_margin,
+        topMargin=1.5 * cm,
+        bottomMargin=1.0 * cm,
+        title=context.get('invoice_no') or 'Invoice & Packing List',
+        author='COMPASS'
+    )
+    with timed_stage('native_pdf'):
+        pdf.build(story)
+    return buffer.getvalue()
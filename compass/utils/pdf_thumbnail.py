@@ -0,0 +1,85 @@
+"""
+First-page thumbnails of generated PDFs
+
+Rasterizes page 1 with PyMuPDF when it is installed, otherwise with
+poppler's pdftoppm, and encodes the result as a small PNG or WebP image.
+"""
+import io
+import os
+import shutil
+import logging
+import subprocess
+import tempfile
+from typing import Optional
+
+from PIL import Image
+
+try:
+    import pymupdf as fitz
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    try:
+        import fitz  # PyMuPDF before 1.24
+        PYMUPDF_AVAILABLE = True
+    except ImportError:
+        PYMUPDF_AVAILABLE = False
+
+THUMBNAIL_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+def _render_with_pymupdf(pdf_path: str, width: int) -> Image.Image:
+    with fitz.open(pdf_path) as document:
+        page = document[0]
+        zoom = width / page.rect.width
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+def _render_with_pdftoppm(pdf_path: str, width: int, timeout: int) -> Optional[Image.Image]:
+    binary = shutil.which('pdftoppm')
+    if not binary:
+        return None
+
+    with tempfile.TemporaryDirectory(prefix='compass_thumb_') as temp_dir:
+        output_prefix = os.path.join(temp_dir, 'page')
+        cmd = [binary, '-png', '-f', '1', '-l', '1', '-singlefile',
+               '-scale-to-x', str(width), '-scale-to-y', '-1', pdf_path, output_prefix]
+        subprocess.run(cmd, capture_output=True, timeout=timeout, check=True)
+
+        with Image.open(output_prefix + '.png') as image:
+            return image.convert('RGB')
+
+def render_pdf_thumbnail(pdf_path: str, width: int = 320, image_format: str = 'png', timeout: int = 30) -> Optional[bytes]:
+    """
+    Render the first page of a PDF as an image
+
+    Args:
+        pdf_path: Path to the PDF file
+        width: Thumbnail width in pixels (height follows the page aspect ratio)
+        image_format: 'png' or 'webp'
+        timeout: Seconds to wait for pdftoppm
+
+    Returns:
+        Encoded image bytes, or None if no rasterizer is available or rendering failed
+    """
+    pil_format, _ = THUMBNAIL_FORMATS[image_format]
+
+    try:
+        if PYMUPDF_AVAILABLE:
+            image = _render_with_pymupdf(pdf_path, width)
+        else:
+            image = _render_with_pdftoppm(pdf_path, width, timeout)
+            if image is None:
+                logging.warning("No PDF rasterizer available - install PyMuPDF or poppler-utils (pdftoppm)")
+                return None
+    except Exception as e:
+        logging.error(f"Failed to render thumbnail of {pdf_path}: {e}")
+        return None
+
+    output = io.BytesIO()
+    if pil_format == 'WEBP':
+        image.save(output, pil_format, quality=80, method=4)
+    else:
+        image.save(output, pil_format, optimize=True)
+    return output.getvalue()
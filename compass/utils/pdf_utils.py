@@ -4,11 +4,13 @@ PDF utilities for COMPASS document generation
 import os
 import tempfile
 import logging
+import threading
 from pathlib import Path
 from typing import List, Optional
-import subprocess
 import platform
 
+from .timing import timed_stage
+
 try:
     from PyPDF2 import PdfReader, PdfWriter
     from reportlab.pdfgen import canvas
@@ -18,13 +20,14 @@ except ImportError:
     PYPDF2_AVAILABLE = False
     logging.warning("PyPDF2 or reportlab not available. PDF features will be limited.")
 
-def convert_docx_to_pdf(docx_path: str, output_path: str = None) -> Optional[str]:
+def convert_docx_to_pdf(docx_path: str, output_path: str = None, error_pdf_fallback: bool = True) -> Optional[str]:
     """
     Convert DOCX file to PDF
     
     Args:
         docx_path: Path to the DOCX file
         output_path: Optional output path for PDF. If None, uses same name with .pdf extension
+        error_pdf_fallback: Write a placeholder error PDF when no converter works
     
     Returns:
         Path to the generated PDF file, or None if conversion failed
@@ -37,47 +40,31 @@ def convert_docx_to_pdf(docx_path: str, output_path: str = None) -> Optional[str
         output_path = docx_path.replace('.docx', '.pdf')
     
     try:
-        # Method 1: Try using python-docx2pdf (works on Windows with Word installed)
-        try:
-            from docx2pdf import convert
-            convert(docx_path, output_path)
-            if os.path.exists(output_path):
-                logging.info(f"Successfully converted DOCX to PDF using docx2pdf: {output_path}")
-                return output_path
-        except Exception as e:
-            logging.warning(f"docx2pdf conversion failed: {e}")
-        
-        # Method 2: Try using LibreOffice (cross-platform)
-        if platform.system() in ['Linux', 'Darwin']:  # Linux or macOS
+        # Method 1: Try using python-docx2pdf (only works on Windows/macOS with Word installed)
+        if platform.system() in ['Windows', 'Darwin']:
             try:
-                cmd = [
-                    'libreoffice', '--headless', '--convert-to', 'pdf',
-                    '--outdir', os.path.dirname(output_path),
-                    docx_path
-                ]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-                
-                if result.returncode == 0:
-                    # LibreOffice creates PDF with same name as DOCX
-                    expected_pdf = os.path.join(
-                        os.path.dirname(output_path),
-                        os.path.basename(docx_path).replace('.docx', '.pdf')
-                    )
-                    if os.path.exists(expected_pdf) and expected_pdf != output_path:
-                        os.rename(expected_pdf, output_path)
-                    
-                    if os.path.exists(output_path):
-                        logging.info(f"Successfully converted DOCX to PDF using LibreOffice: {output_path}")
-                        return output_path
-                else:
-                    logging.error(f"LibreOffice conversion failed: {result.stderr}")
-            except subprocess.TimeoutExpired:
-                logging.error("LibreOffice conversion timed out")
+                from docx2pdf import convert
+                with timed_stage('pdf_convert'):
+                    convert(docx_path, output_path)
+                if os.path.exists(output_path):
+                    logging.info(f"Successfully converted DOCX to PDF using docx2pdf: {output_path}")
+                    return output_path
             except Exception as e:
-                logging.error(f"LibreOffice conversion error: {e}")
+                logging.warning(f"docx2pdf conversion failed: {e}")
+        
+        # Method 2: LibreOffice through the warm converter pool (cross-platform)
+        from ..services.pdf_converter import get_converter_pool
+        converter = get_converter_pool()
+        if converter.available:
+            with timed_stage('pdf_convert'):
+                converted = converter.convert(docx_path, output_path)
+            if converted:
+                logging.info(f"Successfully converted DOCX to PDF using LibreOffice: {output_path}")
+                return output_path
+            logging.error(f"LibreOffice conversion failed for {docx_path}")
         
         # Method 3: Fallback - create a simple PDF with error message
-        if PYPDF2_AVAILABLE:
+        if error_pdf_fallback and PYPDF2_AVAILABLE:
             create_error_pdf(output_path, "PDF conversion not available on this system")
             return output_path
         
@@ -154,6 +141,71 @@ def merge_pdfs(pdf_paths: List[str], output_path: str) -> bool:
         logging.error(f"PDF merge failed: {e}")
         return False
 
+class AppendixBundle:
+    """Appendix PDFs for one shipment type, parsed once and reused for every document"""
+    
+    def __init__(self, paths: List[str], signature):
+        self.paths = paths
+        self.signature = signature
+        self.pages = []
+        # PdfReader objects are not safe to copy pages from concurrently
+        self.lock = threading.Lock()
+        
+        for pdf_path in paths:
+            try:
+                self.pages.extend(PdfReader(pdf_path).pages)
+                logging.info(f"Parsed appendix PDF: {pdf_path}")
+            except Exception as e:
+                logging.error(f"Error reading PDF {pdf_path}: {e}")
+
+# (shipment_type, temperature_type) -> AppendixBundle
+_appendix_bundles = {}
+_appendix_lock = threading.Lock()
+
+def _get_extra_docs_folder(shipment_type: str, temperature_type: str = None) -> Optional[Path]:
+    """Folder holding the appendix PDFs for a shipment type, if any are configured"""
+    # Only add extra documents for Normal Sample Import
+    if shipment_type == 'import' and temperature_type == 'normal':
+        return Path(__file__).parent.parent / 'static' / 'extra_docs' / 'normal_temp_import'
+    return None
+
+def get_appendix_bundle(shipment_type: str, temperature_type: str = None) -> Optional[AppendixBundle]:
+    """
+    Get the parsed appendix PDFs for a shipment type
+    
+    The bundle is built once and rebuilt only when the folder's mtime changes
+    (a PDF was added, removed or replaced).
+    
+    Args:
+        shipment_type: Type of shipment (import, export, etc.)
+        temperature_type: Temperature type (normal, cold, etc.)
+    
+    Returns:
+        AppendixBundle, or None if there are no extra documents
+    """
+    docs_folder = _get_extra_docs_folder(shipment_type, temperature_type)
+    if docs_folder is None:
+        logging.info(f"No extra documents configured for {shipment_type}/{temperature_type}")
+        return None
+    
+    try:
+        signature = docs_folder.stat().st_mtime_ns
+    except FileNotFoundError:
+        logging.info(f"No extra documents folder found: {docs_folder}")
+        return None
+    
+    cache_key = (shipment_type, temperature_type)
+    with _appendix_lock:
+        bundle = _appendix_bundles.get(cache_key)
+        if bundle is None or bundle.signature != signature:
+            # Get all PDF files in the folder, sorted alphabetically
+            pdf_files = [str(pdf_file) for pdf_file in sorted(docs_folder.glob('*.pdf'))]
+            bundle = AppendixBundle(pdf_files, signature) if pdf_files and PYPDF2_AVAILABLE else None
+            _appendix_bundles[cache_key] = bundle
+            logging.info(f"Found {len(pdf_files)} extra documents for {shipment_type}/{temperature_type}")
+    
+    return bundle
+
 def get_extra_documents(shipment_type: str, temperature_type: str = None) -> List[str]:
     """
     Get list of extra documents to append based on shipment type
@@ -166,29 +218,49 @@ def get_extra_documents(shipment_type: str, temperature_type: str = None) -> Lis
     Returns:
         List of PDF file paths to append
     """
-    extra_docs = []
+    try:
+        bundle = get_appendix_bundle(shipment_type, temperature_type)
+        return list(bundle.paths) if bundle else []
+    except Exception as e:
+        logging.error(f"Error getting extra documents: {e}")
+        return []
+
+def append_appendix_bundle(main_pdf_path: str, bundle: AppendixBundle, output_path: str) -> bool:
+    """
+    Write the main PDF followed by the pre-parsed appendix pages
     
+    Args:
+        main_pdf_path: Freshly converted main document
+        bundle: Appendix bundle from get_appendix_bundle
+        output_path: Path for the merged PDF output
+    
+    Returns:
+        True if successful, False otherwise
+    """
     try:
-        # Only add extra documents for Normal Sample Import
-        if shipment_type == 'import' and temperature_type == 'normal':
-            docs_folder = Path(__file__).parent.parent / 'static' / 'extra_docs' / 'normal_temp_import'
+        with timed_stage('merge'):
+            writer = PdfWriter()
+            for page in PdfReader(main_pdf_path).pages:
+                writer.add_page(page)
             
-            if docs_folder.exists():
-                # Get all PDF files in the folder, sorted alphabetically
-                pdf_files = sorted(docs_folder.glob('*.pdf'))
-                extra_docs = [str(pdf_file) for pdf_file in pdf_files]
-                logging.info(f"Found {len(extra_docs)} extra documents for Normal Sample Import")
-            else:
-                logging.info(f"No extra documents folder found: {docs_folder}")
-        else:
-            logging.info(f"No extra documents configured for {shipment_type}/{temperature_type}")
+            # add_page copies the page objects into the writer, so the lock is
+            # only needed while reading from the shared readers
+            with bundle.lock:
+                for page in bundle.pages:
+                    writer.add_page(page)
+            
+            with open(output_path, 'wb') as output_file:
+                writer.write(output_file)
+        
+        logging.info(f"Appended {len(bundle.pages)} appendix pages to: {output_path}")
+        return True
     
     except Exception as e:
-        logging.error(f"Error getting extra documents: {e}")
-    
-    return extra_docs
+        logging.error(f"PDF merge failed: {e}")
+        return False
 
-def generate_pdf_with_extras(docx_path: str, shipment_type: str, temperature_type: str = None) -> Optional[str]:
+def generate_pdf_with_extras(docx_path: str, shipment_type: str, temperature_type: str = None,
+                             error_pdf_fallback: bool = True) -> Optional[str]:
     """
     Generate PDF from DOCX and append extra documents if available
     
@@ -196,30 +268,30 @@ def generate_pdf_with_extras(docx_path: str, shipment_type: str, temperature_typ
         docx_path: Path to the main DOCX document
         shipment_type: Type of shipment
         temperature_type: Temperature type
+        error_pdf_fallback: Write a placeholder error PDF when no converter works
     
     Returns:
         Path to the final PDF with extras appended, or None if failed
     """
     try:
         # Convert main document to PDF
-        main_pdf_path = convert_docx_to_pdf(docx_path)
+        main_pdf_path = convert_docx_to_pdf(docx_path, error_pdf_fallback=error_pdf_fallback)
         if not main_pdf_path:
             logging.error("Failed to convert main document to PDF")
             return None
         
-        # Get extra documents
-        extra_docs = get_extra_documents(shipment_type, temperature_type)
+        # Get the pre-parsed extra documents
+        bundle = get_appendix_bundle(shipment_type, temperature_type)
         
-        if not extra_docs:
+        if not bundle:
             # No extra documents, return the main PDF
             logging.info("No extra documents to append")
             return main_pdf_path
         
         # Create final PDF with extras
         final_pdf_path = main_pdf_path.replace('.pdf', '_with_extras.pdf')
-        pdf_list = [main_pdf_path] + extra_docs
         
-        if merge_pdfs(pdf_list, final_pdf_path):
+        if append_appendix_bundle(main_pdf_path, bundle, final_pdf_path):
             # Clean up the intermediate main PDF
             try:
                 os.remove(main_pdf_path)
@@ -236,6 +308,33 @@ def generate_pdf_with_extras(docx_path: str, shipment_type: str, temperature_typ
         logging.error(f"Error generating PDF with extras: {e}")
         return None
 
+def create_error_pdf_with_extras(output_path: str, shipment_type: str = None, temperature_type: str = None,
+                                 message: str = "PDF conversion not available on this system") -> Optional[str]:
+    """
+    Write the error placeholder PDF, with the extra documents appended when
+    shipment_type has any - what convert_docx_to_pdf/generate_pdf_with_extras
+    produce when no converter works, without attempting a conversion
+    
+    Args:
+        output_path: Path for the placeholder PDF
+        shipment_type: Type of shipment whose extra documents are appended (None for none)
+        temperature_type: Temperature type
+        message: Error message shown on the placeholder page
+    
+    Returns:
+        Path to the placeholder PDF, or None if it could not be written
+    """
+    create_error_pdf(output_path, message)
+    if not os.path.exists(output_path):
+        return None
+    
+    bundle = get_appendix_bundle(shipment_type, temperature_type) if shipment_type else None
+    if bundle:
+        final_pdf_path = output_path.replace('.pdf', '_with_extras.pdf')
+        if append_appendix_bundle(output_path, bundle, final_pdf_path):
+            return final_pdf_path
+    return output_path
+
 def install_pdf_dependencies():
     """Install required PDF dependencies"""
     try:
@@ -0,0 +1,138 @@
+"""
+Printable label sheets of package QR codes
+
+Draws every package label of one or more shipments onto A4 or Letter pages
+in a fixed grid: a vector QR code with the tracking code, package number,
+package type, attention person and invoice number below it, and light cut
+lines between the labels. Nothing is rasterized, so the sheet prints
+sharply at any label size.
+"""
+import logging
+from typing import BinaryIO, List, Dict
+
+try:
+    from reportlab.graphics import renderPDF
+    from reportlab.graphics.barcode.qr import QrCodeWidget
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, letter
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+    logging.warning("reportlab not available. QR label sheets are disabled.")
+
+LABEL_PAGE_SIZES = ['a4', 'letter']
+LABEL_COLUMNS = 3
+LABEL_ROWS = 4
+
+NCPOR_BLUE = (30 / 255, 63 / 255, 102 / 255)
+
+def _page_size(page_size: str):
+    return letter if page_size == 'letter' else A4
+
+def _printable(text) -> str:
+    """Drop characters the standard PDF fonts cannot show (e.g. emoji in type names)"""
+    return str(text or '').encode('latin-1', 'ignore').decode('latin-1').strip()
+
+def _fit_text(pdf, text: str, x: float, y: float, max_width: float, font: str, size: float, min_size: float = 5):
+    """Draw text centered on x, shrinking it (then truncating it) to fit max_width"""
+    while size > min_size and stringWidth(text, font, size) > max_width:
+        size -= 0.5
+    if stringWidth(text, font, size) > max_width:
+        while len(text) > 1 and stringWidth(text + '...', font, size) > max_width:
+            text = text[:-1]
+        text += '...'
+    pdf.setFont(font, size)
+    pdf.drawCentredString(x, y, text)
+
+def _draw_qr(pdf, value: str, x: float, y: float, size: float):
+    """Draw a vector QR code of size x size points with its lower left corner at (x, y)"""
+    widget = QrCodeWidget(value, barLevel='M', barBorder=0,
+                          barFillColor=colors.Color(*NCPOR_BLUE), barStrokeColor=colors.Color(*NCPOR_BLUE))
+    x1, y1, x2, y2 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x2 - x1), 0, 0, size / (y2 - y1), 0, 0])
+    drawing.add(widget)
+    renderPDF.draw(drawing, pdf, x, y)
+
+def _draw_label(pdf, label: Dict, x: float, y: float, width: float, height: float):
+    """Draw one label into the cell whose lower left corner is (x, y)"""
+    center = x + width / 2
+    text_width = width - 8 * mm
+    qr_size = min(width - 16 * mm, height - 30 * mm)
+
+    _draw_qr(pdf, label['tracking_url'], center - qr_size / 2, y + height - 6 * mm - qr_size, qr_size)
+
+    pdf.setFillColorRGB(*NCPOR_BLUE)
+    line_y = y + height - 6 * mm - qr_size - 5 * mm
+    _fit_text(pdf, f"Track: {label['tracking_code']}", center, line_y, text_width, 'Helvetica-Bold', 10)
+
+    pdf.setFillColorRGB(0, 0, 0)
+    details = f"Package {label['package_number']} of {label['package_count']}"
+    package_type = _printable(label.get('package_type'))
+    if package_type:
+        details += f" - {package_type}"
+    line_y -= 4.5 * mm
+    _fit_text(pdf, details, center, line_y, text_width, 'Helvetica', 8)
+
+    attention_person = _printable(label.get('attention_person'))
+    if attention_person:
+        line_y -= 4 * mm
+        _fit_text(pdf, f"Attn: {attention_person}", center, line_y, text_width, 'Helvetica', 8)
+
+    line_y -= 4 * mm
+    pdf.setFillColorRGB(0.35, 0.35, 0.35)
+    _fit_text(pdf, _printable(label.get('invoice_number')), center, line_y, text_width, 'Helvetica', 6.5)
+
+def write_label_sheet(labels: List[Dict], output: BinaryIO, page_size: str = 'a4', title: str = 'Package QR labels'):
+    """
+    Draw package labels onto a grid of LABEL_COLUMNS x LABEL_ROWS per page
+
+    Args:
+        labels: Label dictionaries in print order, each with tracking_url,
+                tracking_code, package_number, package_count, package_type,
+                attention_person and invoice_number
+        output: Binary file object the PDF is written to
+        page_size: 'a4' or 'letter'
+        title: PDF document title
+    """
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("reportlab is not installed")
+
+    page_width, page_height = _page_size(page_size)
+    margin = 10 * mm
+    cell_width = (page_width - 2 * margin) / LABEL_COLUMNS
+    cell_height = (page_height - 2 * margin) / LABEL_ROWS
+    per_page = LABEL_COLUMNS * LABEL_ROWS
+
+    pdf = canvas.Canvas(output, pagesize=(page_width, page_height), pageCompression=1)
+    pdf.setTitle(title)
+    pdf.setAuthor('COMPASS')
+
+    for start in range(0, len(labels), per_page):
+        page_labels = labels[start:start + per_page]
+
+        # Dashed cut lines around the used cells
+        used_rows = -(-len(page_labels) // LABEL_COLUMNS)
+        pdf.setStrokeColorRGB(0.75, 0.75, 0.75)
+        pdf.setLineWidth(0.4)
+        pdf.setDash(3, 3)
+        for row in range(used_rows + 1):
+            line_y = page_height - margin - row * cell_height
+            pdf.line(margin, line_y, page_width - margin, line_y)
+        for column in range(LABEL_COLUMNS + 1):
+            line_x = margin + column * cell_width
+            pdf.line(line_x, page_height - margin, line_x, page_height - margin - used_rows * cell_height)
+        pdf.setDash()
+
+        for index, label in enumerate(page_labels):
+            row, column = divmod(index, LABEL_COLUMNS)
+            cell_x = margin + column * cell_width
+            cell_y = page_height - margin - (row + 1) * cell_height
+            _draw_label(pdf, label, cell_x, cell_y, cell_width, cell_height)
+
+        pdf.showPage()
+
+    pdf.save()
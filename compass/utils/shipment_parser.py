@@ -0,0 +1,142 @@
+"""
+Structured view of a shipment's flat form data
+
+Shipment forms are stored as flat keys (package_3_item_2_quantity, ...).
+parse_shipment walks them once and builds typed package/item objects with the
+per-package totals already computed, so the document builders, the QR code
+loop and the edit/combine screens never probe string keys themselves.
+"""
+from typing import List, Optional
+
+from .helpers import package_type_display_name
+
+SAMPLE_TYPE_NAMES = {
+    'water': 'water',
+    'sediment': 'sediment',
+    'glass_fiber': 'glass fiber'
+}
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+class ParsedItem:
+    """One item of a package"""
+
+    __slots__ = ('number', 'description', 'hsn_code', 'quantity', 'quantity_text', 'unit_value',
+                 'unit_value_text', 'net_weight', 'net_weight_text', 'sample_type', 'other_sample_type',
+                 'attn', 'value', 'weight')
+
+    def __init__(self, form_data, package_num, item_num):
+        prefix = f'package_{package_num}_item_{item_num}'
+        self.number = item_num
+        self.description = form_data.get(f'{prefix}_description', '')
+        self.hsn_code = form_data.get(f'{prefix}_hsn_code', '')
+        # Raw text as entered (None if missing) - the shipper declaration and
+        # the edit forms show it verbatim
+        self.quantity_text = form_data.get(f'{prefix}_quantity')
+        self.unit_value_text = form_data.get(f'{prefix}_unit_value')
+        self.net_weight_text = form_data.get(f'{prefix}_net_weight')
+        self.quantity = _to_int(self.quantity_text)
+        self.unit_value = _to_float(self.unit_value_text)
+        self.net_weight = _to_float(self.net_weight_text)
+        self.sample_type = form_data.get(f'{prefix}_sample_type', '')
+        self.other_sample_type = form_data.get(f'{prefix}_other_sample_type', '')
+        self.attn = form_data.get(f'{prefix}_attn')
+
+        self.value = self.quantity * self.unit_value
+        self.weight = self.net_weight * self.quantity  # Total weight = unit weight * quantity
+
+    @property
+    def sample_type_name(self) -> Optional[str]:
+        """Display name of the sample type, or None if not set"""
+        if not self.sample_type:
+            return None
+        if self.sample_type == 'other':
+            other_value = (self.other_sample_type or '').strip()
+            return other_value.lower() if other_value else None
+        return SAMPLE_TYPE_NAMES.get(self.sample_type, self.sample_type)
+
+class ParsedPackage:
+    """One package with its items and totals"""
+
+    __slots__ = ('number', 'type', 'other_type', 'type_display', 'length', 'width', 'height',
+                 'description', 'weight', 'dimensions', 'belongs_to', 'owner_id', 'attn',
+                 'items', 'total_quantity', 'total_value', 'total_weight')
+
+    def __init__(self, form_data, package_num):
+        prefix = f'package_{package_num}'
+        self.number = package_num
+        self.type = form_data.get(f'{prefix}_type')
+        self.other_type = form_data.get(f'{prefix}_other_type', '')
+        self.type_display = package_type_display_name(self.type or '', self.other_type)
+        self.length = form_data.get(f'{prefix}_length', '')
+        self.width = form_data.get(f'{prefix}_width', '')
+        self.height = form_data.get(f'{prefix}_height', '')
+        self.description = form_data.get(f'{prefix}_description')
+        self.weight = form_data.get(f'{prefix}_weight')
+        self.dimensions = form_data.get(f'{prefix}_dimensions')
+        self.belongs_to = form_data.get(f'{prefix}_belongs_to')
+        self.owner_id = _to_int(self.belongs_to, None) if self.belongs_to else None
+        self.attn = form_data.get(f'{prefix}_attn')
+
+        items_count = _to_int(form_data.get(f'{prefix}_items_count', 0))
+        self.items: List[ParsedItem] = [ParsedItem(form_data, package_num, item_num)
+                                        for item_num in range(1, items_count + 1)]
+
+        self.total_quantity = sum(item.quantity for item in self.items)
+        self.total_value = sum(item.value for item in self.items)
+        self.total_weight = sum(item.weight for item in self.items)
+
+    @property
+    def described_items(self) -> List[ParsedItem]:
+        """Items that have a description (the ones listed on the documents)"""
+        return [item for item in self.items if item.description]
+
+class ParsedShipment:
+    """All packages of a shipment, in package number order"""
+
+    __slots__ = ('form_data', 'total_packages', 'packages', 'total_value')
+
+    def __init__(self, form_data):
+        self.form_data = form_data
+        self.total_packages = _to_int(form_data.get('total_packages', 0))
+        self.packages: List[ParsedPackage] = [ParsedPackage(form_data, package_num)
+                                              for package_num in range(1, self.total_packages + 1)]
+        self.total_value = sum(package.total_value for package in self.packages)
+
+    @property
+    def owner_ids(self) -> List[int]:
+        """Package owner user IDs, unique, in order of first assignment"""
+        owner_ids = []
+        for package in self.packages:
+            if package.owner_id and package.owner_id not in owner_ids:
+                owner_ids.append(package.owner_id)
+        return owner_ids
+
+    @property
+    def sample_types(self) -> List[str]:
+        """Sorted, unique display names of the sample types of all items"""
+        names = {item.sample_type_name for package in self.packages for item in package.items}
+        names.discard(None)
+        return sorted(names)
+
+def parse_shipment(form_data) -> ParsedShipment:
+    """
+    Parse shipment form data into packages and items
+
+    Args:
+        form_data: Form data dictionary (request.form.to_dict() or the stored JSON)
+
+    Returns:
+        ParsedShipment
+    """
+    return ParsedShipment(form_data)
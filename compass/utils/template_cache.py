@@ -0,0 +1,104 @@
+"""
+Parsed DOCX template cache for COMPASS document generation
+"""
+import os
+import copy
+import logging
+import threading
+from typing import Dict, Tuple
+
+from docx import Document
+from docxtpl import DocxTemplate
+
+# Root folder holding the Word templates (project_root/templates)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'templates')
+
+# Template file for each (shipment family, document type) combination
+DOCUMENT_TEMPLATES = {
+    ('import', 'invoice_packing'): os.path.join('Room Temperature Sample Import', 'invoice_packinglist_room_temperature.docx'),
+    ('import', 'custom_docs'): os.path.join('Room Temperature Sample Import', 'Room_Temperature_Import_Custom_Docs .docx'),
+    ('default', 'custom_docs'): 'export_custom_docs.docx',
+    ('default', 'invoice_packing'): 'invoice_packinglist.docx',
+}
+
+# template_path -> (mtime, pristine parsed Document)
+_template_cache: Dict[str, Tuple[float, object]] = {}
+_cache_lock = threading.Lock()
+
+def resolve_template_path(shipment_type: str, document_type: str = 'invoice_packing') -> str:
+    """
+    Get the absolute template path for a shipment type and document type
+
+    Import shipments use the Room Temperature templates, every other shipment
+    type uses the export templates (invoice & packing list is the default).
+    """
+    family = 'import' if shipment_type == 'import' else 'default'
+    if document_type != 'custom_docs':
+        document_type = 'invoice_packing'
+    return os.path.join(TEMPLATES_DIR, DOCUMENT_TEMPLATES[(family, document_type)])
+
+def _get_pristine_document(template_path: str):
+    """Return the cached parsed template, re-parsing it if the file changed on disk"""
+    mtime = os.path.getmtime(template_path)
+
+    with _cache_lock:
+        entry = _template_cache.get(template_path)
+        if entry and entry[0] == mtime:
+            return entry[1]
+
+    # Parse outside the lock so a slow parse doesn't block other templates
+    document = Document(template_path)
+
+    with _cache_lock:
+        _template_cache[template_path] = (mtime, document)
+
+    logging.info(f"Parsed DOCX template into cache: {template_path}")
+    return document
+
+def get_document_template(template_path: str) -> DocxTemplate:
+    """
+    Get a DocxTemplate ready for rendering, backed by a private copy of the cached template
+
+    The pristine parsed document is never rendered itself; every caller gets a
+    deep copy, which is much cheaper than unzipping and parsing the file again.
+
+    Args:
+        template_path: Path to the DOCX template
+
+    Returns:
+        DocxTemplate whose document is an independent copy of the cached template
+    """
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"Template file not found: {template_path}")
+
+    pristine = _get_pristine_document(template_path)
+
+    tpl = DocxTemplate(template_path)
+    tpl.docx = copy.deepcopy(pristine)
+    return tpl
+
+def warm_template_cache() -> int:
+    """
+    Parse all known document templates into the cache
+
+    Returns:
+        Number of templates loaded
+    """
+    loaded = 0
+    for relative_path in DOCUMENT_TEMPLATES.values():
+        template_path = os.path.join(TEMPLATES_DIR, relative_path)
+        try:
+            if os.path.exists(template_path):
+                _get_pristine_document(template_path)
+                loaded += 1
+            else:
+                logging.warning(f"Template not found during cache warm-up: {template_path}")
+        except Exception as e:
+            logging.error(f"Error warming template cache for {template_path}: {e}")
+
+    return loaded
+
+def clear_template_cache():
+    """Drop all cached templates (they are re-parsed on next use)"""
+    with _cache_lock:
+        _template_cache.clear()
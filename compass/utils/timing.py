@@ -0,0 +1,107 @@
+"""
+Stage timers for document generation
+
+A StageTimer is started around each document build and made current for the
+calling thread/context; the pipeline steps (template load, render, table
+build, serialization, PDF conversion, merge, ...) record themselves with
+timed_stage() without the timer being passed around. When the build
+finishes one log line with all stage durations is written, so a slow
+download shows which stage regressed.
+"""
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+_current_timer: contextvars.ContextVar = contextvars.ContextVar('compass_stage_timer', default=None)
+
+# Callbacks receiving every finished timer (used by the benchmark script)
+_listeners: List[Callable] = []
+
+class StageTimer:
+    """Accumulated wall-clock durations of the stages of one operation"""
+
+    def __init__(self, operation: str, **labels):
+        self.operation = operation
+        self.labels = labels
+        self.stages: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.total = None
+
+    def add(self, stage: str, seconds: float):
+        # A stage can run more than once (e.g. a retried conversion)
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def finish(self) -> float:
+        self.total = time.perf_counter() - self.started
+        return self.total
+
+    def summary(self) -> str:
+        labels = ' '.join(f"{key}={value}" for key, value in self.labels.items())
+        stages = ' '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        return f"{self.operation} {labels} | {stages} | total={total * 1000:.1f}ms"
+
+def current_timer() -> Optional[StageTimer]:
+    """The timer of the operation running in this context, if any"""
+    return _current_timer.get()
+
+@contextmanager
+def timed_stage(stage: str):
+    """Record the duration of the enclosed block on the current timer (no-op without one)"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage, time.perf_counter() - started)
+
+@contextmanager
+def stage_timer(operation: str, logger: logging.Logger = None, slow_ms: float = None, **labels):
+    """
+    Time an operation and log its stage breakdown when it finishes
+
+    Nested calls (e.g. a PDF build that renders the DOCX) share the outer
+    timer, so each document produces a single log line.
+
+    Args:
+        operation: Name shown in the log line, e.g. 'document_pdf'
+        logger: Logger to write to (defaults to the root logger)
+        slow_ms: Log at WARNING instead of INFO when the operation takes longer
+        **labels: Extra fields for the log line (shipment ID, document type, ...)
+
+    Yields:
+        The StageTimer
+    """
+    outer = _current_timer.get()
+    if outer is not None:
+        yield outer
+        return
+
+    timer = StageTimer(operation, **labels)
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+        timer.finish()
+        level = logging.WARNING if slow_ms is not None and timer.total * 1000 > slow_ms else logging.INFO
+        (logger or logging.getLogger()).log(level, f"Timing {timer.summary()}")
+        for listener in list(_listeners):
+            try:
+                listener(timer)
+            except Exception as e:
+                logging.error(f"Timing listener failed: {e}")
+
+def add_timing_listener(listener: Callable[[StageTimer], None]):
+    """Call listener with every finished top-level timer"""
+    _listeners.append(listener)
+
+def remove_timing_listener(listener: Callable[[StageTimer], None]):
+    if listener in _listeners:
+        _listeners.remove(listener)
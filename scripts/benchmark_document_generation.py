@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark shipment document generation stage by stage
+Run this from the project root directory: python scripts/benchmark_document_generation.py
+
+Builds synthetic shipments with 1, 10 and 20 packages for every shipment type
+in a throwaway in-memory database and times generate_shipment_document (DOCX)
+and generate_shipment_document_pdf (PDF) for both document types. The
+document cache is disabled so every run does the full work. Each stage
+(template load, render, table build, serialization, PDF conversion, merge,
+...) is reported from the same stage timers that log in production.
+
+Options:
+    --runs N          Timed runs per combination (default 3, plus one warm-up)
+    --packages 1,10   Package counts to benchmark (default 1,10,20)
+    --skip-pdf        Only benchmark the DOCX downloads
+"""
+
+import sys
+import os
+import json
+import argparse
+import statistics
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compass import create_app, db
+from compass.models import User, Role, Shipment, SigningAuthority
+from compass.utils.timing import add_timing_listener, remove_timing_listener
+
+SHIPMENT_TYPES = ['export', 'import', 'reimport', 'cold']
+DOCUMENT_TYPES = ['invoice_packing', 'custom_docs']
+
+def create_benchmark_data():
+    """Create the users and signing authority the documents refer to"""
+    admin_role = Role(name='Admin')
+    db.session.add(admin_role)
+
+    owner = User(email='bench1@ncpor.gov.in', password='x', first_name='Alice', last_name='Johnson', unique_id='AL1CE1')
+    requester = User(email='bench2@ncpor.gov.in', password='x', first_name='Bob', last_name='Smith', unique_id='BOB2SM')
+    owner.roles.append(admin_role)
+    db.session.add_all([owner, requester])
+    db.session.commit()
+
+    db.session.add(SigningAuthority(
+        name='Benchmark Authority', designation='Director', department='Logistics',
+        organisation='NCPOR', is_default=True, created_by=owner.id
+    ))
+    db.session.commit()
+    return owner, requester
+
+def build_form_data(shipment_type, total_packages, owner, requester, items_per_package=3):
+    """Synthetic form data in the same flat format the shipment forms submit"""
+    form_data = {
+        'shipment_type': shipment_type,
+        'total_packages': str(total_packages),
+        'requester_name': f"{owner.first_name} {owner.last_name}",
+        'expedition_year': '2025',
+        'expedition_month': 'JAN',
+        'return_type': 'RET',
+        'batch_number': 'BENCH1',
+        'invoice_date': '2025-01-15',
+    }
+    for package_num in range(1, total_packages + 1):
+        prefix = f'package_{package_num}'
+        form_data[f'{prefix}_type'] = 'cardboard_box' if package_num % 2 else 'pelican_case'
+        form_data[f'{prefix}_items_count'] = str(items_per_package)
+        form_data[f'{prefix}_length'] = '60'
+        form_data[f'{prefix}_width'] = '40'
+        form_data[f'{prefix}_height'] = '40'
+        # Alternate owners so the tables show a combined shipment
+        form_data[f'{prefix}_belongs_to'] = str(owner.id if package_num % 2 else requester.id)
+        form_data[f'{prefix}_attn'] = f"{requester.first_name} {requester.last_name}"
+        for item_num in range(1, items_per_package + 1):
+            item_prefix = f'{prefix}_item_{item_num}'
+            form_data[f'{item_prefix}_description'] = f'Sediment core section {package_num}.{item_num}'
+            form_data[f'{item_prefix}_hsn_code'] = '25309099'
+            form_data[f'{item_prefix}_quantity'] = str(item_num)
+            form_data[f'{item_prefix}_unit_value'] = '25'
+            form_data[f'{item_prefix}_net_weight'] = '1.5'
+            form_data[f'{item_prefix}_sample_type'] = 'sediment' if item_num % 2 else 'water'
+    return form_data
+
+def create_shipment(shipment_type, total_packages, owner, requester, serial):
+    form_data = build_form_data(shipment_type, total_packages, owner, requester)
+    shipment = Shipment(
+        invoice_number=f"NCPOR/ARC/2025/JAN/BENCH/{owner.unique_id}/{serial:04d}",
+        serial_number=f"{serial:04d}",
+        shipment_type=shipment_type,
+        created_by=owner.id,
+        requester_name=form_data['requester_name'],
+        expedition_year='2025',
+        batch_number='BENCH1',
+        total_packages=total_packages,
+        form_data=json.dumps(form_data),
+        status='Acknowledged'
+    )
+    db.session.add(shipment)
+    db.session.commit()
+    return shipment, form_data
+
+def run_benchmark(runs, package_counts, skip_pdf):
+    app = create_app('testing')
+    app.config['DOCUMENT_CACHE_ENABLED'] = False
+
+    from compass.main import generate_shipment_document, generate_shipment_document_pdf
+
+    generators = [('docx', generate_shipment_document)]
+    if not skip_pdf:
+        generators.append(('pdf', generate_shipment_document_pdf))
+
+    timers = []
+    add_timing_listener(timers.append)
+    results = []
+
+    try:
+        with app.app_context():
+            db.create_all()
+            owner, requester = create_benchmark_data()
+
+            serial = 0
+            for shipment_type in SHIPMENT_TYPES:
+                for total_packages in package_counts:
+                    serial += 1
+                    shipment, form_data = create_shipment(shipment_type, total_packages, owner, requester, serial)
+
+                    for document_type in DOCUMENT_TYPES:
+                        for output_format, generate in generators:
+                            samples = []
+                            # First run warms the template caches and is not counted
+                            for run in range(runs + 1):
+                                del timers[:]
+                                with app.test_request_context('/'):
+                                    response = generate(shipment, form_data, document_type)
+                                    response.close()
+                                if run and timers:
+                                    samples.append(timers[-1])
+
+                            results.append((shipment_type, total_packages, document_type, output_format, samples))
+                            print_result(*results[-1])
+    finally:
+        remove_timing_listener(timers.append)
+
+    return results
+
+def print_result(shipment_type, total_packages, document_type, output_format, samples):
+    if not samples:
+        print(f"{shipment_type:<9} {total_packages:>3} pkg  {document_type:<16} {output_format:<4}  no timings recorded")
+        return
+
+    stages = []
+    for sample in samples:
+        for stage in sample.stages:
+            if stage not in stages:
+                stages.append(stage)
+
+    median_ms = lambda values: statistics.median(values) * 1000
+    stage_text = '  '.join(
+        f"{stage}={median_ms([sample.stages.get(stage, 0.0) for sample in samples]):.1f}"
+        for stage in stages
+    )
+    total = median_ms([sample.total for sample in samples])
+    print(f"{shipment_type:<9} {total_packages:>3} pkg  {document_type:<16} {output_format:<4}  "
+          f"total={total:7.1f}ms  {stage_text}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shipment document generation')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per combination')
+    parser.add_argument('--packages', default='1,10,20', help='Comma separated package counts')
+    parser.add_argument('--skip-pdf', action='store_true', help='Only benchmark DOCX generation')
+    args = parser.parse_args()
+
+    package_counts = [int(count) for count in args.packages.split(',') if count.strip()]
+
+    print("📊 Document generation benchmark (median milliseconds per stage)")
+    print("=" * 70)
+    run_benchmark(max(args.runs, 1), package_counts, args.skip_pdf)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the serial number counters
+Run this from the project root directory: python scripts/test_serial_allocation.py
+
+Starts several worker processes (like gunicorn workers), each with several
+threads, that all allocate shipment serials, combined shipment numbers and
+file reference serials at the same time against one shared database, then
+checks that no value was handed out twice. With a block size of 1 the values
+must also be exactly 1..N without gaps.
+
+Uses a throwaway SQLite file unless --database-url is given (the counter
+tables of that database are reset, use a scratch database).
+
+Options:
+    --processes N     Worker processes (default 4)
+    --threads N       Threads per process (default 4)
+    --per-thread N    Values each thread allocates per counter (default 25)
+    --block-size N    COUNTER_BLOCK_SIZE for the workers (default 1)
+    --database-url    SQLAlchemy URL of the database to test against
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COUNTERS = ['serial', 'combined', 'file_reference']
+
+def create_test_app(database_url, block_size):
+    os.environ['DEV_DATABASE_URL'] = database_url
+    os.environ['TEMPLATE_CACHE_WARMUP'] = 'false'
+
+    from compass import create_app
+    app = create_app('development')
+    app.config['COUNTER_BLOCK_SIZE'] = block_size
+    return app
+
+def allocate(counter_name):
+    from compass.models import ShipmentSerialCounter, CombinedShipmentCounter, FileReferenceCounter
+
+    if counter_name == 'serial':
+        return int(ShipmentSerialCounter.get_next_serial())
+    if counter_name == 'combined':
+        return CombinedShipmentCounter.get_next_number()
+    return int(FileReferenceCounter.get_next_file_reference_serial())
+
+def run_worker(database_url, block_size, threads, per_thread, start_event):
+    """Worker process: allocate from every counter on several threads at once"""
+    app = create_test_app(database_url, block_size)
+    results = {name: [] for name in COUNTERS}
+    errors = []
+    lock = threading.Lock()
+
+    def run_thread():
+        from compass import db
+        with app.app_context():
+            try:
+                for _ in range(per_thread):
+                    for name in COUNTERS:
+                        value = allocate(name)
+                        with lock:
+                            results[name].append(value)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            finally:
+                db.session.remove()
+
+    start_event.wait()
+    workers = [threading.Thread(target=run_thread) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results, errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress test concurrent serial number allocation')
+    parser.add_argument('--processes', type=int, default=4, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per process')
+    parser.add_argument('--per-thread', type=int, default=25, help='Values per thread and counter')
+    parser.add_argument('--block-size', type=int, default=1, help='COUNTER_BLOCK_SIZE for the workers')
+    parser.add_argument('--database-url', help='Database to test against (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    temp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.mkdtemp(prefix='compass_serials_')
+        database_url = 'sqlite:///' + os.path.join(temp_dir, 'serials.db')
+
+    print("🧪 Serial number allocation stress test")
+    print("=" * 50)
+    print(f"Database: {database_url}")
+    print(f"{args.processes} processes x {args.threads} threads x {args.per_thread} values, block size {args.block_size}")
+
+    # Start from empty counters
+    app = create_test_app(database_url, args.block_size)
+    with app.app_context():
+        from compass import db
+        from compass.models import ShipmentSerialCounter, CombinedShipmentCounter, FileReferenceCounter
+        db.create_all()
+        for model in (ShipmentSerialCounter, CombinedShipmentCounter, FileReferenceCounter):
+            model.query.delete()
+        db.session.commit()
+
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    start_event = manager.Event()
+    with context.Pool(args.processes) as pool:
+        pending = [pool.apply_async(run_worker, (database_url, args.block_size, args.threads, args.per_thread, start_event))
+                   for _ in range(args.processes)]
+        # Release all workers at once so their allocations overlap
+        time.sleep(2)
+        started = time.perf_counter()
+        start_event.set()
+        outcomes = [result.get() for result in pending]
+    elapsed = time.perf_counter() - started
+
+    expected = args.processes * args.threads * args.per_thread
+    failed = False
+    errors = [error for _, worker_errors in outcomes for error in worker_errors]
+    if errors:
+        failed = True
+        print(f"❌ {len(errors)} allocation errors, first: {errors[0]}")
+
+    for name in COUNTERS:
+        values = [value for results, _ in outcomes for value in results[name]]
+        duplicates = [value for value, count in Counter(values).items() if count > 1]
+        gap_free = sorted(values) == list(range(1, len(values) + 1))
+
+        if duplicates:
+            failed = True
+            print(f"❌ {name}: {len(duplicates)} duplicate values, e.g. {sorted(duplicates)[:5]}")
+        elif len(values) != expected:
+            failed = True
+            print(f"❌ {name}: {len(values)} of {expected} values allocated")
+        elif args.block_size == 1 and not gap_free:
+            failed = True
+            print(f"❌ {name}: values are unique but not 1..{expected}")
+        else:
+            print(f"✅ {name}: {len(values)} unique values")
+
+    print(f"⏱️  {expected * len(COUNTERS)} allocations in {elapsed:.1f}s")
+
+    if temp_dir:
+        import shutil
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()